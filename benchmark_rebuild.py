@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import rebuild_history_stats_and_storage as rebuild
+from generate_synthetic_recorder_db import generate
+
+# =========================
+# Defaults (edit if needed)
+# =========================
+SHORT_TERM_DAYS_DEFAULT = rebuild.SHORT_TERM_DAYS_DEFAULT
+RSS_SAMPLE_INTERVAL_S = 0.005
+
+@dataclass
+class PhaseResult:
+    phase: str
+    seconds: float
+    rows: int
+    peak_rss_mb: float | None
+    rss_growth_mb: float | None
+    py_peak_mb: float | None
+
+def current_rss_mb() -> float | None:
+    # ru_maxrss would be the process peak so far, which never drops and so cannot
+    # be split by phase; the current resident size is only in /proc (Linux).
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+class RssSampler:
+    # Peak resident memory while one phase runs, sampled from a background thread.
+    # sqlite releases the GIL while it works, so its own allocations are seen too.
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self.start = self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        return False
+
+    @property
+    def growth(self) -> float | None:
+        # What the phase added on top of what earlier phases left resident
+        # (sqlite's page cache and freed Python memory are not returned).
+        return self.peak - self.start if self.peak is not None else None
+
+    def _sample(self) -> None:
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+class PhaseTimer:
+    # Phase hook for the rebuild's compute_rebuild/write_outputs. write_outputs
+    # reports delete/insert phases once per output; repeats add up under one name.
+    def __init__(self, trace_python: bool):
+        self.trace_python = trace_python
+        self.results: dict[str, PhaseResult] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        box = {"rows": 0}
+        if self.trace_python:
+            tracemalloc.reset_peak()
+        with RssSampler() as rss:
+            t0 = time.perf_counter()
+            yield box
+            elapsed = time.perf_counter() - t0
+        py_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if self.trace_python else None
+        prev = self.results.get(name)
+        if prev is None:
+            self.results[name] = PhaseResult(name, elapsed, int(box["rows"]), rss.peak, rss.growth, py_peak)
+            return
+        prev.seconds += elapsed
+        prev.rows += int(box["rows"])
+        if rss.peak is not None:
+            prev.peak_rss_mb = max(prev.peak_rss_mb, rss.peak)
+            prev.rss_growth_mb += rss.growth
+        if py_peak is not None:
+            prev.py_peak_mb = max(prev.py_peak_mb, py_peak)
+
+def copy_workspace(db_path: str, storage_file: str, work_dir: str):
+    dst_db = os.path.join(work_dir, Path(db_path).name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            shutil.copy2(db_path + suffix, dst_db + suffix)
+    dst_storage = os.path.join(work_dir, Path(storage_file).name)
+    shutil.copy2(storage_file, dst_storage)
+    return dst_db, dst_storage
+
+def run_benchmark(db_path: str, storage_file: str, engine: str = "python", since_ts: float | None = None,
+                  short_term_days: int = SHORT_TERM_DAYS_DEFAULT, trace_python: bool = False,
+                  verbose: bool = False) -> list[PhaseResult]:
+    # Runs the rebuild's own compute_rebuild/write_outputs/patch_storage with a
+    # timing phase hook, so the numbers are those of the real write path.
+    inputs = dict(rebuild.DEFAULT_INPUTS)
+    outputs = dict(rebuild.DEFAULT_OUTPUTS)
+    unit, source_tag = rebuild.UNIT_DEFAULT, rebuild.SOURCE_TAG_DEFAULT
+    timer = PhaseTimer(trace_python)
+    if trace_python:
+        tracemalloc.start()
+
+    out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with out:
+        con = rebuild.connect_db(db_path)
+        cur = con.cursor()
+        meta_cols = rebuild.table_cols(cur, "statistics_meta")
+        stats_cols = rebuild.table_cols(cur, "statistics")
+        sts_cols = rebuild.table_cols(cur, "statistics_short_term")
+        have_sts = ("metadata_id" in sts_cols and "start_ts" in sts_cols)
+
+        computed = rebuild.compute_rebuild(
+            con, inputs, outputs, stats_cols, since_ts=since_ts, engine=engine, phase=timer.phase,
+        )
+        # A fresh checkpoint (not open_checkpoint, which would offer to resume one
+        # left in place) so its writes are timed as part of the write phases.
+        checkpoint = rebuild.RebuildCheckpoint(
+            db_path + rebuild.CHECKPOINT_SUFFIX,
+            rebuild.checkpoint_signature(inputs, outputs, computed, since_ts, short_term_days, unit, source_tag),
+        )
+        checkpoint.save()
+        rebuild.write_outputs(
+            con, outputs, computed, meta_cols, have_sts, short_term_days, unit, source_tag,
+            since_ts=since_ts, checkpoint=checkpoint, phase=timer.phase,
+        )
+        with timer.phase("storage_patch") as box:
+            rebuild.patch_storage(storage_file, computed)
+            box["rows"] = len(computed.storage_totals)
+        checkpoint.remove()
+        con.close()
+
+    if trace_python:
+        tracemalloc.stop()
+    return list(timer.results.values())
+
+def print_results(results: list[PhaseResult], label: str) -> None:
+    total = sum(r.seconds for r in results)
+    print(f"\n=== Rebuild benchmark: {label} ===\n")
+    print(f"{'PHASE':<15}{'SECONDS':>10}{'ROWS':>12}{'ROWS/S':>14}{'PEAK RSS MB':>14}{'RSS +MB':>10}{'PY PEAK MB':>12}")
+    for r in results:
+        rss = f"{r.peak_rss_mb:.1f}" if r.peak_rss_mb is not None else "-"
+        growth = f"{r.rss_growth_mb:.1f}" if r.rss_growth_mb is not None else "-"
+        py = f"{r.py_peak_mb:.1f}" if r.py_peak_mb is not None else "-"
+        print(
+            f"{r.phase:<15}{r.seconds:>10.3f}{r.rows:>12}{rebuild.rows_per_sec(r.rows, r.seconds):>14}"
+            f"{rss:>14}{growth:>10}{py:>12}"
+        )
+    print(f"{'total':<15}{total:>10.3f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Time each phase of the statistics rebuild, non-interactively.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--db", help="existing recorder DB to benchmark (a copy is used unless --in-place)")
+    src.add_argument("--generate-years", type=float, metavar="N", help="generate a synthetic DB with N years of data first")
+    ap.add_argument("--storage-file", help="integration storage file (default: discovered next to the DB in .storage)")
+    ap.add_argument("--engine", choices=("python", "sql"), default="python")
+    ap.add_argument("--since", type=rebuild.parse_since, default=None, metavar="ISO_TIME")
+    ap.add_argument("--short-term-days", type=int, default=SHORT_TERM_DAYS_DEFAULT)
+    ap.add_argument("--in-place", action="store_true", help="run against --db directly instead of a copy")
+    ap.add_argument("--trace-python", action="store_true", help="also report the Python heap peak per phase (slower)")
+    ap.add_argument("--json", metavar="PATH", help="write results as JSON for comparing runs")
+    ap.add_argument("--verbose", action="store_true", help="show the rebuild's own progress output")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="nibe_rebuild_bench_") as work_dir:
+        if args.generate_years is not None:
+            t0 = time.perf_counter()
+            info = generate(
+                os.path.join(work_dir, "home-assistant_v2.db"), os.path.join(work_dir, ".storage"),
+                args.generate_years, args.short_term_days, 40, "bench", 1,
+            )
+            print(f"Generated {info['hours']} hours ({info['lts_rows']} LTS rows) in {time.perf_counter() - t0:.1f}s")
+            db_path, storage_file = info["db_path"], info["storage_file"]
+        else:
+            storage_file = args.storage_file
+            if not storage_file:
+                cands = rebuild.storage_candidates(os.path.join(os.path.dirname(os.path.abspath(args.db)), ".storage"))
+                if not cands:
+                    raise SystemExit("No storage file found; pass --storage-file.")
+                storage_file = cands[0][0]
+            db_path = args.db
+            if not args.in_place:
+                db_path, storage_file = copy_workspace(args.db, storage_file, work_dir)
+
+        results = run_benchmark(
+            db_path, storage_file, engine=args.engine, since_ts=args.since, short_term_days=args.short_term_days,
+            trace_python=args.trace_python, verbose=args.verbose,
+        )
+
+    label = f"engine={args.engine} compute={rebuild.compute_engine_name() if args.engine == 'python' else 'sql'}"
+    if args.since is not None:
+        label += f" since={rebuild.utc_iso(args.since)}"
+    print_results(results, label)
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps({"label": label, "phases": [asdict(r) for r in results]}, indent=2) + "\n", encoding="utf-8",
+        )
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -1,59 +1,71 @@
 from __future__ import annotations
 
 import logging
+import time
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.event import async_track_time_change
-from homeassistant.util import dt as dt_util
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
 from .const import (
-    CONF_RUN_ON_START,
-    CONF_UPDATE_MINUTE,
-    DEFAULT_RUN_ON_START,
-    DEFAULT_UPDATE_MINUTE,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_FLEET_SENSORS,
+    DATA_SCHEDULER,
+    DEFAULT_EXTERNAL_STATISTICS,
+    DEFAULT_FLEET_SENSORS,
     DOMAIN,
     PLATFORMS,
 )
 from .coordinator import NibeEnergyCoordinator
+from .scheduler import NibeEnergyScheduler
+from .services import async_register_services
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    coordinator = NibeEnergyCoordinator(hass, entry)
-    await coordinator.async_initialize()
+# Options that change which entities exist or how they are set up.
+RELOAD_OPTIONS = {
+    CONF_FLEET_SENSORS: DEFAULT_FLEET_SENSORS,
+    CONF_EXTERNAL_STATISTICS: DEFAULT_EXTERNAL_STATISTICS,
+}
 
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
-        "coordinator": coordinator,
-        "unsub_time": None,
-    }
 
-    async def _run_tick(now):
-        await coordinator.async_process_tick()
+def _reload_options(entry: ConfigEntry) -> dict:
+    return {key: entry.options.get(key, default) for key, default in RELOAD_OPTIONS.items()}
 
-    def _schedule_time_listener() -> None:
-        minute = int(entry.options.get(CONF_UPDATE_MINUTE, DEFAULT_UPDATE_MINUTE))
-        unsub = async_track_time_change(hass, _run_tick, minute=minute, second=0)
-        hass.data[DOMAIN][entry.entry_id]["unsub_time"] = unsub
 
-    _schedule_time_listener()
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    async_register_services(hass)
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    started = time.monotonic()
+    coordinator = NibeEnergyCoordinator(hass, entry)
+    # The stored state is read in the background; nothing below waits for it.
+    coordinator.async_start_loading()
+    coordinator.async_start_tracking()
+    entry.async_on_unload(coordinator.async_stop_tracking)
 
-    async def _on_start(event):
-        run_on_start = entry.options.get(CONF_RUN_ON_START, DEFAULT_RUN_ON_START)
-        minute = int(entry.options.get(CONF_UPDATE_MINUTE, DEFAULT_UPDATE_MINUTE))
-        if not run_on_start:
-            return
-        if dt_util.now().minute < minute:
-            return
-        await coordinator.async_process_tick()
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    domain_data[entry.entry_id] = {
+        "coordinator": coordinator,
+        "reload_options": _reload_options(entry),
+    }
 
-    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STARTED, _on_start)
+    # All entries share one scheduler: their ticks run as one batch.
+    scheduler: NibeEnergyScheduler | None = domain_data.get(DATA_SCHEDULER)
+    if scheduler is None:
+        scheduler = domain_data[DATA_SCHEDULER] = NibeEnergyScheduler(hass)
+    scheduler.async_add_coordinator(coordinator)
 
     entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    coordinator.metrics.setup_ms = (time.monotonic() - started) * 1000
+    coordinator.async_update_listeners()
     return True
 
 
@@ -62,22 +74,32 @@ async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> Non
     if not data:
         return
 
-    unsub = data.get("unsub_time")
-    if unsub:
-        unsub()
+    if _reload_options(entry) != data["reload_options"]:
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
 
     coordinator: NibeEnergyCoordinator = data["coordinator"]
-
-    async def _run_tick(now):
-        await coordinator.async_process_tick()
-
-    minute = int(entry.options.get(CONF_UPDATE_MINUTE, DEFAULT_UPDATE_MINUTE))
-    data["unsub_time"] = async_track_time_change(hass, _run_tick, minute=minute, second=0)
+    coordinator.async_start_tracking()
+    hass.data[DOMAIN][DATA_SCHEDULER].async_reschedule()
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    data = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
-    if data and data.get("unsub_time"):
-        data["unsub_time"]()
-
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    # Platforms first: if this entry hosts the fleet sensors, they must be gone
+    # before the scheduler hands them to another entry.
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if not unload_ok:
+        return False
+
+    domain_data = hass.data.get(DOMAIN, {})
+    data = domain_data.pop(entry.entry_id, None)
+    scheduler: NibeEnergyScheduler | None = domain_data.get(DATA_SCHEDULER)
+    if scheduler is not None:
+        scheduler.async_remove_coordinator(entry.entry_id)
+        if scheduler.is_empty:
+            scheduler.async_shutdown()
+            domain_data.pop(DATA_SCHEDULER)
+    if data is not None:
+        # Out of the scheduler, so no new tick can schedule another save.
+        coordinator: NibeEnergyCoordinator = data["coordinator"]
+        await coordinator.async_flush()
+    return True
@@ -8,15 +8,25 @@ from homeassistant.helpers import selector
 from .const import (
     CONF_AUX_USED_HEATING,
     CONF_AUX_USED_HOT_WATER,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_FLEET_SENSORS,
+    CONF_LIVE_UPDATE_INTERVAL,
+    CONF_POWER_PRODUCED,
+    CONF_POWER_USED,
     CONF_PROD_COOLING,
     CONF_PROD_HEATING,
     CONF_PROD_HOT_WATER,
     CONF_RUN_ON_START,
+    CONF_TICK_JITTER,
     CONF_UPDATE_MINUTE,
     CONF_USED_COOLING,
     CONF_USED_HEATING,
     CONF_USED_HOT_WATER,
+    DEFAULT_EXTERNAL_STATISTICS,
+    DEFAULT_FLEET_SENSORS,
+    DEFAULT_LIVE_UPDATE_INTERVAL,
     DEFAULT_RUN_ON_START,
+    DEFAULT_TICK_JITTER,
     DEFAULT_UPDATE_MINUTE,
     DOMAIN,
 )
@@ -74,6 +84,20 @@ class NibeEnergyConversionOptionsFlow(config_entries.OptionsFlow):
         run_on_start = self.config_entry.options.get(
             CONF_RUN_ON_START, DEFAULT_RUN_ON_START
         )
+        live_update_interval = self.config_entry.options.get(
+            CONF_LIVE_UPDATE_INTERVAL, DEFAULT_LIVE_UPDATE_INTERVAL
+        )
+        tick_jitter = self.config_entry.options.get(
+            CONF_TICK_JITTER, DEFAULT_TICK_JITTER
+        )
+        fleet_sensors = self.config_entry.options.get(
+            CONF_FLEET_SENSORS, DEFAULT_FLEET_SENSORS
+        )
+        external_statistics = self.config_entry.options.get(
+            CONF_EXTERNAL_STATISTICS, DEFAULT_EXTERNAL_STATISTICS
+        )
+        power_produced = self.config_entry.options.get(CONF_POWER_PRODUCED)
+        power_used = self.config_entry.options.get(CONF_POWER_USED)
 
         data_schema = vol.Schema(
             {
@@ -90,6 +114,42 @@ class NibeEnergyConversionOptionsFlow(config_entries.OptionsFlow):
                 vol.Required(
                     CONF_RUN_ON_START, default=run_on_start
                 ): selector.BooleanSelector(),
+                vol.Required(
+                    CONF_TICK_JITTER, default=tick_jitter
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0,
+                        max=300,
+                        step=1,
+                        unit_of_measurement="s",
+                        mode=selector.NumberSelectorMode.BOX,
+                    )
+                ),
+                vol.Required(
+                    CONF_FLEET_SENSORS, default=fleet_sensors
+                ): selector.BooleanSelector(),
+                vol.Required(
+                    CONF_EXTERNAL_STATISTICS, default=external_statistics
+                ): selector.BooleanSelector(),
+                vol.Optional(
+                    CONF_POWER_PRODUCED,
+                    description={"suggested_value": power_produced},
+                ): SENSOR_SELECTOR,
+                vol.Optional(
+                    CONF_POWER_USED,
+                    description={"suggested_value": power_used},
+                ): SENSOR_SELECTOR,
+                vol.Required(
+                    CONF_LIVE_UPDATE_INTERVAL, default=live_update_interval
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=5,
+                        max=3600,
+                        step=1,
+                        unit_of_measurement="s",
+                        mode=selector.NumberSelectorMode.BOX,
+                    )
+                ),
             }
         )
 
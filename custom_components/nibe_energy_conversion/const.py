@@ -12,14 +12,32 @@ CONF_USED_HOT_WATER = "used_hot_water_sensor"
 CONF_AUX_USED_HEATING = "aux_used_heating_sensor"
 CONF_AUX_USED_HOT_WATER = "aux_used_hot_water_sensor"
 
+CONF_POWER_PRODUCED = "power_produced_sensor"
+CONF_POWER_USED = "power_used_sensor"
+
 CONF_UPDATE_MINUTE = "update_minute"
 CONF_RUN_ON_START = "run_on_start"
+CONF_LIVE_UPDATE_INTERVAL = "live_update_interval"
+CONF_TICK_JITTER = "tick_jitter"
+CONF_FLEET_SENSORS = "fleet_sensors"
+CONF_EXTERNAL_STATISTICS = "external_statistics"
 
 DEFAULT_UPDATE_MINUTE = 15
 DEFAULT_RUN_ON_START = True
+DEFAULT_LIVE_UPDATE_INTERVAL = 30
+DEFAULT_TICK_JITTER = 0
+DEFAULT_FLEET_SENSORS = False
+DEFAULT_EXTERNAL_STATISTICS = False
+
+DATA_SCHEDULER = "scheduler"
 
-STORAGE_VERSION = 1
+SERVICE_REBUILD_HISTORY = "rebuild_history"
+SERVICE_VERIFY_HISTORY = "verify_history"
+
+STORAGE_VERSION = 2
 STORAGE_KEY = f"{DOMAIN}_data"
+STORAGE_SAVE_DELAY = 10
+VERIFY_STORAGE_KEY = f"{DOMAIN}_verify"
 
 TOTAL_PROD_COOLING = "prod_cooling_total"
 TOTAL_PROD_HEATING = "prod_heating_total"
@@ -39,3 +57,30 @@ COP_TOTAL = "cop_total"
 COP_HOT_WATER = "cop_hot_water"
 COP_HEATING = "cop_heating"
 COP_COOLING = "cop_cooling"
+
+ROLLING_WINDOW_24H = "24h"
+ROLLING_WINDOW_7D = "7d"
+ROLLING_WINDOW_30D = "30d"
+ROLLING_WINDOW_SEASONAL = "seasonal"
+
+PERIOD_DAY = "day"
+PERIOD_MONTH = "month"
+PERIOD_YEAR = "year"
+PERIOD_PRODUCED = "produced"
+PERIOD_USED = "used"
+
+SUM_PRODUCED_LIVE = "produced_total_live"
+SUM_USED_LIVE = "used_total_live"
+COP_LIVE = "cop_live"
+
+FLEET_PRODUCED = "fleet_produced_total"
+FLEET_USED = "fleet_used_total"
+FLEET_COP_24H = "fleet_cop_24h"
+FLEET_COP_SEASONAL = "fleet_cop_seasonal"
+
+DIAG_TICK_DURATION = "tick_duration"
+DIAG_STORE_SAVE_DURATION = "store_save_duration"
+DIAG_UNAVAILABLE_INPUTS = "unavailable_inputs"
+DIAG_INPUT_AGE = "input_age"
+DIAG_SKIPPED_TICKS = "skipped_ticks"
+DIAG_SETUP_DURATION = "setup_duration"
@@ -1,10 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from dataclasses import dataclass
+import time
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import MappingProxyType
 from typing import Any
 
-from homeassistant.core import HomeAssistant
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.db_schema import StatisticsMeta
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    statistics_during_period,
+)
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, State, callback
+from homeassistant.helpers.event import (
+    async_call_later,
+    async_track_state_change_event,
+    async_track_time_interval,
+)
 from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from homeassistant.util import dt as dt_util
@@ -12,9 +30,16 @@ from homeassistant.util import dt as dt_util
 from .const import (
     CONF_AUX_USED_HEATING,
     CONF_AUX_USED_HOT_WATER,
+    CONF_EXTERNAL_STATISTICS,
+    CONF_LIVE_UPDATE_INTERVAL,
+    CONF_POWER_PRODUCED,
+    CONF_POWER_USED,
     CONF_PROD_COOLING,
     CONF_PROD_HEATING,
     CONF_PROD_HOT_WATER,
+    CONF_RUN_ON_START,
+    CONF_TICK_JITTER,
+    CONF_UPDATE_MINUTE,
     CONF_USED_COOLING,
     CONF_USED_HEATING,
     CONF_USED_HOT_WATER,
@@ -22,11 +47,21 @@ from .const import (
     COP_HEATING,
     COP_HOT_WATER,
     COP_LAST_HOUR,
+    COP_LIVE,
     COP_TOTAL,
+    DEFAULT_EXTERNAL_STATISTICS,
+    DEFAULT_LIVE_UPDATE_INTERVAL,
+    DEFAULT_RUN_ON_START,
+    DEFAULT_TICK_JITTER,
+    DEFAULT_UPDATE_MINUTE,
+    DOMAIN,
     STORAGE_KEY,
+    STORAGE_SAVE_DELAY,
     STORAGE_VERSION,
     SUM_PRODUCED,
+    SUM_PRODUCED_LIVE,
     SUM_USED,
+    SUM_USED_LIVE,
     TOTAL_AUX_USED_HEATING,
     TOTAL_AUX_USED_HOT_WATER,
     TOTAL_PROD_COOLING,
@@ -36,20 +71,31 @@ from .const import (
     TOTAL_USED_HEATING,
     TOTAL_USED_HOT_WATER,
 )
+from .energy import (
+    PRODUCED_KEYS,
+    TOTAL_KEYS,
+    USED_KEYS,
+    add_hour,
+    compose,
+    cop,
+    cop_row,
+    cop_values,
+    output_values,
+    totals_to_wh,
+)
+from .metrics import NibeEnergyMetrics
+from .rolling import CalendarRollup, RollingCop
 
-_LOGGER = logging.getLogger(__name__)
+try:
+    from homeassistant.components.recorder.models import StatisticMeanType
+except ImportError:  # Home Assistant < 2025.6: no mean_type in statistics metadata
+    StatisticMeanType = None
 
+# unit_class came later (2025.10) than mean_type; releases in between build the
+# metadata row with StatisticsMeta(**metadata) and reject the unknown key.
+STATISTICS_UNIT_CLASS = hasattr(StatisticsMeta, "unit_class")
 
-TOTAL_KEYS = [
-    TOTAL_PROD_COOLING,
-    TOTAL_PROD_HEATING,
-    TOTAL_PROD_HOT_WATER,
-    TOTAL_USED_COOLING,
-    TOTAL_USED_HEATING,
-    TOTAL_USED_HOT_WATER,
-    TOTAL_AUX_USED_HEATING,
-    TOTAL_AUX_USED_HOT_WATER,
-]
+_LOGGER = logging.getLogger(__name__)
 
 
 INPUT_TO_TOTAL = {
@@ -64,15 +110,184 @@ INPUT_TO_TOTAL = {
 }
 
 
+POWER_KEYS = [CONF_POWER_PRODUCED, CONF_POWER_USED]
+
+POWER_UNIT_TO_KW = {"W": 0.001, "kW": 1.0, "MW": 1000.0}
+
+# Longer outages are left to the offline rebuild script.
+CATCH_UP_MAX_HOURS = 366 * 24
+# Short-term statistics cover the hours not yet compiled to long-term ones.
+SHORT_TERM_CATCH_UP_HOURS = 24
+
+# Names of the external statistics mirrored from the energy sensors.
+STATISTIC_NAMES = {
+    TOTAL_PROD_COOLING: "Produced cooling",
+    TOTAL_PROD_HEATING: "Produced heating",
+    TOTAL_PROD_HOT_WATER: "Produced hot water",
+    TOTAL_USED_COOLING: "Used cooling",
+    TOTAL_USED_HEATING: "Used heating",
+    TOTAL_USED_HOT_WATER: "Used hot water",
+    TOTAL_AUX_USED_HEATING: "Auxiliary heating",
+    TOTAL_AUX_USED_HOT_WATER: "Auxiliary hot water",
+    SUM_PRODUCED: "Produced total",
+    SUM_USED: "Used total",
+}
+
+LIVE_SOURCE_HOURLY = "hourly"
+LIVE_SOURCE_INPUTS = "inputs"
+LIVE_SOURCE_POWER = "power"
+
+
+def _parse_float(state: State | None) -> float | None:
+    if state is None:
+        return None
+    try:
+        return float(state.state)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_power_kw(state: State | None) -> float | None:
+    if state is None:
+        return None
+    try:
+        value = float(state.state)
+    except (TypeError, ValueError):
+        return None
+    factor = POWER_UNIT_TO_KW.get(state.attributes.get(ATTR_UNIT_OF_MEASUREMENT), 0.001)
+    return max(0.0, value * factor)
+
+
+def utc_hour(moment: datetime) -> datetime:
+    return dt_util.as_utc(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def stat_start(row: dict[str, Any]) -> datetime:
+    start = row["start"]
+    if isinstance(start, (int, float)):
+        return dt_util.utc_from_timestamp(start)
+    return dt_util.as_utc(start)
+
+
+def fill_hours(
+    by_start: dict[datetime, dict[str, float]],
+    seen: set[datetime],
+    keys_by_entity: dict[str, list[str]],
+    stats: dict[str, list[dict[str, Any]]],
+    latest: bool,
+) -> None:
+    # Rows arrive in time order, so with latest=True the last row of an hour wins.
+    for entity_id, rows in stats.items():
+        for row in rows:
+            start = utc_hour(stat_start(row)) if latest else stat_start(row)
+            inputs = by_start.get(start)
+            if inputs is None:
+                continue
+            value = row.get("mean")
+            if value is None:
+                value = row.get("state")
+            if value is None or value < 0:
+                continue
+            for total_key in keys_by_entity.get(entity_id, []):
+                inputs[total_key] = float(value)
+            seen.add(start)
+
+
+def statistic_metadata(statistic_id: str, source: str, name: str | None) -> StatisticMetaData:
+    metadata = StatisticMetaData(
+        has_mean=False,
+        has_sum=True,
+        name=name,
+        source=source,
+        statistic_id=statistic_id,
+        unit_of_measurement="kWh",
+    )
+    if StatisticMeanType is not None:
+        metadata["mean_type"] = StatisticMeanType.NONE
+    if STATISTICS_UNIT_CLASS:
+        metadata["unit_class"] = "energy"
+    return metadata
+
+
+def _hour_floor(moment: datetime) -> datetime:
+    # Same hour boundary the hourly tick uses for last_processed (local hour, as UTC).
+    return dt_util.as_utc(
+        dt_util.as_local(moment).replace(minute=0, second=0, microsecond=0)
+    )
+
+
 @dataclass
 class NibeEnergyData:
-    totals: dict[str, float]
+    # Integer Wh; output_values() gives the kWh the sensors show.
+    totals: dict[str, int]
     last_processed: str | None
     last_cop: float
     last_cop_total: float
     last_cop_hot_water: float
     last_cop_heating: float
     last_cop_cooling: float
+    rolling_cop: dict[str, float] = field(default_factory=dict)
+    periods: dict[str, float] = field(default_factory=dict)
+
+
+# Everything the sensors show, derived once per update instead of per read.
+@dataclass(frozen=True, slots=True)
+class NibeEnergySnapshot:
+    values: Mapping[str, float]
+    attributes: Mapping[str, str] | None
+
+
+def last_hour_cops(inputs: dict[str, float]) -> dict[str, float]:
+    cops = cop_values(inputs)
+    return {
+        "last_cop": cops[COP_TOTAL],
+        "last_cop_total": cops[COP_TOTAL],
+        "last_cop_hot_water": cops[COP_HOT_WATER],
+        "last_cop_heating": cops[COP_HEATING],
+        "last_cop_cooling": cops[COP_COOLING],
+    }
+
+
+def _build_snapshot(data: NibeEnergyData) -> NibeEnergySnapshot:
+    values = output_values(data.totals)
+    values[COP_LAST_HOUR] = float(data.last_cop)
+    values[COP_TOTAL] = float(data.last_cop_total)
+    values[COP_HOT_WATER] = float(data.last_cop_hot_water)
+    values[COP_HEATING] = float(data.last_cop_heating)
+    values[COP_COOLING] = float(data.last_cop_cooling)
+    values.update(data.rolling_cop)
+    values.update(data.periods)
+
+    attributes = None
+    if data.last_processed:
+        processed = dt_util.parse_datetime(data.last_processed)
+        if processed is not None:
+            attributes = MappingProxyType(
+                {"last_processed_hour_end": dt_util.as_local(processed).isoformat()}
+            )
+    return NibeEnergySnapshot(values=MappingProxyType(values), attributes=attributes)
+
+
+# Store has no public hook for its delayed saves, so the write itself is timed.
+class NibeEnergyStore(Store):
+    def __init__(
+        self, hass: HomeAssistant, version: int, key: str, on_write: Callable[[float], None]
+    ) -> None:
+        super().__init__(hass, version, key)
+        self._on_write = on_write
+
+    async def _async_write_data(self, path: str, data: dict) -> None:
+        started = time.monotonic()
+        await super()._async_write_data(path, data)
+        self._on_write(time.monotonic() - started)
+
+    async def _async_migrate_func(
+        self, old_major_version: int, old_minor_version: int, old_data: dict
+    ) -> dict:
+        # Version 1 stored the totals as kWh floats; version 2 as integer Wh.
+        if old_major_version == 1:
+            old_data = {**old_data, "totals": totals_to_wh(old_data.get("totals", {}))}
+        return old_data
 
 
 class NibeEnergyCoordinator(DataUpdateCoordinator[NibeEnergyData]):
@@ -84,9 +299,12 @@ class NibeEnergyCoordinator(DataUpdateCoordinator[NibeEnergyData]):
             update_interval=None,
         )
         self.entry = entry
-        self.store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}_{entry.entry_id}")
+        self.metrics = NibeEnergyMetrics()
+        self.store = NibeEnergyStore(
+            hass, STORAGE_VERSION, f"{STORAGE_KEY}_{entry.entry_id}", self._on_store_write
+        )
         self.data = NibeEnergyData(
-            totals={key: 0.0 for key in TOTAL_KEYS},
+            totals={key: 0 for key in TOTAL_KEYS},
             last_processed=None,
             last_cop=0.0,
             last_cop_total=0.0,
@@ -94,11 +312,42 @@ class NibeEnergyCoordinator(DataUpdateCoordinator[NibeEnergyData]):
             last_cop_heating=0.0,
             last_cop_cooling=0.0,
         )
+        self.snapshot = _build_snapshot(self.data)
+        self.rolling = RollingCop()
+        self.periods = CalendarRollup()
+        self._tick_lock = asyncio.Lock()
+        self.rebuild_lock = asyncio.Lock()
+        # A delayed save is scheduled and has not been written yet.
+        self._save_pending = False
+        # Set once the stored state has been read (or failed to be read).
+        self._loaded = asyncio.Event()
+        self.load_failed = False
+
+        # Latest parsed input values, kept current by state change events.
+        self._input_entities: dict[str, str] = {}
+        self._inputs: dict[str, float] = {key: 0.0 for key in TOTAL_KEYS}
+        self._inputs_updated: datetime | None = None
+        # Per input entity: whether its state is a number, and when it last changed.
+        self._input_available: dict[str, bool] = {}
+        self._input_changed: dict[str, datetime | None] = {}
+
+        # Optional instantaneous power (kW), integrated into the current hour.
+        self._power_entities: dict[str, str] = {}
+        self._power: dict[str, float | None] = {key: None for key in POWER_KEYS}
+        self._power_at: datetime | None = None
+        self._live_hour: datetime | None = None
+        self._live_energy: dict[str, float] = {key: 0.0 for key in POWER_KEYS}
+        self._prev_energy: dict[str, float] = {key: 0.0 for key in POWER_KEYS}
+
+        self._unsub_tracking: list[CALLBACK_TYPE] = []
+        self._live_listeners: list[CALLBACK_TYPE] = []
+        self._live_published = 0.0
+        self._unsub_live_call: CALLBACK_TYPE | None = None
 
     async def async_initialize(self) -> None:
         stored: dict[str, Any] | None = await self.store.async_load()
         if stored:
-            totals = {key: float(stored.get("totals", {}).get(key, 0.0)) for key in TOTAL_KEYS}
+            totals = {key: int(stored.get("totals", {}).get(key, 0)) for key in TOTAL_KEYS}
             self.data = NibeEnergyData(
                 totals=totals,
                 last_processed=stored.get("last_processed"),
@@ -108,130 +357,532 @@ class NibeEnergyCoordinator(DataUpdateCoordinator[NibeEnergyData]):
                 last_cop_heating=float(stored.get("last_cop_heating", 0.0)),
                 last_cop_cooling=float(stored.get("last_cop_cooling", 0.0)),
             )
-        self.async_set_updated_data(self.data)
+            self.rolling = RollingCop.from_dict(stored.get("rolling"))
+            self.data.rolling_cop = self.rolling.cop_values()
+            self.periods = CalendarRollup.from_dict(stored.get("periods"))
+            self.data.periods = self.periods.values()
+
+    @callback
+    def async_start_loading(self) -> None:
+        # Setup does not wait for the file: sensors show their restored states
+        # until it is read, and ticks wait for it.
+        self.entry.async_create_background_task(
+            self.hass, self._async_load(), f"{DOMAIN} load {self.entry.entry_id}"
+        )
 
-    def _state_as_float(self, entity_id: str) -> float:
-        state = self.hass.states.get(entity_id)
-        if state is None:
-            return 0.0
+    async def _async_load(self) -> None:
+        started = time.monotonic()
         try:
-            return float(state.state)
-        except (TypeError, ValueError):
-            return 0.0
+            await self.async_initialize()
+        except Exception:
+            # Ticking from zero totals would overwrite the file; pause instead.
+            self.load_failed = True
+            self.last_update_success = False
+            _LOGGER.exception(
+                "Could not load the stored state of %s; hourly processing is paused",
+                self.entry.title,
+            )
+        self.metrics.store_load_ms = (time.monotonic() - started) * 1000
+        self._loaded.set()
+        if self.load_failed:
+            self.async_update_listeners()
+        else:
+            self.async_set_updated_data(self.data)
 
-    def _get_inputs(self) -> dict[str, float]:
-        inputs: dict[str, float] = {}
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set() and not self.load_failed
+
+    async def async_wait_loaded(self) -> bool:
+        await self._loaded.wait()
+        return not self.load_failed
+
+    @callback
+    def async_set_updated_data(self, data: NibeEnergyData) -> None:
+        self.snapshot = _build_snapshot(data)
+        super().async_set_updated_data(data)
+
+    @callback
+    def async_start_tracking(self) -> None:
+        self.async_stop_tracking()
+
+        self._input_entities = {}
         for conf_key, total_key in INPUT_TO_TOTAL.items():
             entity_id = self.entry.data.get(conf_key)
-            if not entity_id:
-                inputs[total_key] = 0.0
-                continue
-            inputs[total_key] = self._state_as_float(entity_id)
-        return inputs
+            if entity_id:
+                self._input_entities[entity_id] = total_key
+        self._inputs = {key: 0.0 for key in TOTAL_KEYS}
+        self._inputs_updated = None
+        self._input_available = {}
+        self._input_changed = {}
+
+        self._power_entities = {}
+        for conf_key in POWER_KEYS:
+            entity_id = self.entry.options.get(conf_key)
+            if entity_id:
+                self._power_entities[entity_id] = conf_key
+        self._power = {key: None for key in POWER_KEYS}
+        self._power_at = None
+        self._live_energy = {key: 0.0 for key in POWER_KEYS}
+        self._prev_energy = {key: 0.0 for key in POWER_KEYS}
+
+        now = dt_util.utcnow()
+        for entity_id in self._input_entities:
+            self._cache_input(entity_id, self.hass.states.get(entity_id))
+        for entity_id in self._power_entities:
+            self._cache_power(entity_id, self.hass.states.get(entity_id), now)
+
+        entity_ids = list({*self._input_entities, *self._power_entities})
+        if entity_ids:
+            self._unsub_tracking.append(
+                async_track_state_change_event(self.hass, entity_ids, self._async_on_state_change)
+            )
+        if self._power_entities:
+            # Power can stay flat for a long time; keep the estimate moving anyway.
+            self._unsub_tracking.append(
+                async_track_time_interval(
+                    self.hass, self._async_on_live_interval, timedelta(seconds=self._live_interval())
+                )
+            )
+
+    @callback
+    def async_stop_tracking(self) -> None:
+        while self._unsub_tracking:
+            self._unsub_tracking.pop()()
+        if self._unsub_live_call is not None:
+            self._unsub_live_call()
+            self._unsub_live_call = None
+
+    @callback
+    def _async_on_state_change(self, event: Event) -> None:
+        entity_id = event.data["entity_id"]
+        new_state = event.data["new_state"]
+        if entity_id in self._input_entities:
+            self._cache_input(entity_id, new_state)
+        if entity_id in self._power_entities:
+            self._cache_power(entity_id, new_state, dt_util.utcnow())
+        self._schedule_live_update()
+
+    @callback
+    def _async_on_live_interval(self, now: datetime) -> None:
+        self._schedule_live_update()
+
+    def _cache_input(self, entity_id: str, state: State | None) -> None:
+        value = _parse_float(state)
+        # An unavailable input adds nothing to the hour; the metrics count it.
+        self._inputs[self._input_entities[entity_id]] = value if value is not None else 0.0
+        self._input_available[entity_id] = value is not None
+        self._input_changed[entity_id] = state.last_updated if state is not None else None
+        if state is not None and (
+            self._inputs_updated is None or state.last_updated > self._inputs_updated
+        ):
+            self._inputs_updated = state.last_updated
+
+    def _cache_power(self, entity_id: str, state: State | None, now: datetime) -> None:
+        self._integrate_power(now)
+        self._power[self._power_entities[entity_id]] = _parse_power_kw(state)
+
+    def _integrate_power(self, now: datetime) -> None:
+        # Left Riemann sum: the last known power holds until the next change.
+        hour_start = _hour_floor(now)
+        if self._power_at is None or self._live_hour is None:
+            self._power_at = now
+            self._live_hour = hour_start
+            return
+        if hour_start != self._live_hour:
+            if hour_start - self._live_hour == timedelta(hours=1):
+                self._add_power_energy(self._live_energy, self._power_at, hour_start)
+                self._prev_energy = self._live_energy
+            else:
+                self._prev_energy = {key: (self._power[key] or 0.0) for key in POWER_KEYS}
+            self._live_energy = {key: 0.0 for key in POWER_KEYS}
+            self._live_hour = hour_start
+            self._power_at = max(self._power_at, hour_start)
+        self._add_power_energy(self._live_energy, self._power_at, now)
+        self._power_at = now
+
+    def _add_power_energy(self, energy: dict[str, float], start: datetime, end: datetime) -> None:
+        hours = (end - start).total_seconds() / 3600
+        if hours <= 0:
+            return
+        for key in POWER_KEYS:
+            power = self._power[key]
+            if power is not None:
+                energy[key] += power * hours
+
+    @property
+    def update_minute(self) -> int:
+        return int(self.entry.options.get(CONF_UPDATE_MINUTE, DEFAULT_UPDATE_MINUTE))
+
+    @property
+    def run_on_start(self) -> bool:
+        return bool(self.entry.options.get(CONF_RUN_ON_START, DEFAULT_RUN_ON_START))
+
+    @property
+    def external_statistics(self) -> bool:
+        return bool(self.entry.options.get(CONF_EXTERNAL_STATISTICS, DEFAULT_EXTERNAL_STATISTICS))
+
+    @property
+    def tick_jitter(self) -> int:
+        return int(self.entry.options.get(CONF_TICK_JITTER, DEFAULT_TICK_JITTER))
+
+    def _live_interval(self) -> int:
+        return int(self.entry.options.get(CONF_LIVE_UPDATE_INTERVAL, DEFAULT_LIVE_UPDATE_INTERVAL))
+
+    @callback
+    def async_add_live_listener(self, update_callback: CALLBACK_TYPE) -> Callable[[], None]:
+        self._live_listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._live_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _schedule_live_update(self) -> None:
+        # Throttle: at most one publish per interval, with a trailing publish so
+        # the last change in a burst is never lost.
+        if self._unsub_live_call is not None:
+            return
+        delay = self._live_interval() - (time.monotonic() - self._live_published)
+        if delay <= 0:
+            self._publish_live()
+            return
+        self._unsub_live_call = async_call_later(self.hass, delay, self._async_on_live_call)
+
+    @callback
+    def _async_on_live_call(self, now: datetime) -> None:
+        self._unsub_live_call = None
+        self._publish_live()
+
+    @callback
+    def _publish_live(self) -> None:
+        self._live_published = time.monotonic()
+        if self._power_entities:
+            self._integrate_power(dt_util.utcnow())
+        for update_callback in list(self._live_listeners):
+            update_callback()
+
+    def input_keys_by_entity(self) -> dict[str, list[str]]:
+        keys_by_entity: dict[str, list[str]] = {}
+        for conf_key, total_key in INPUT_TO_TOTAL.items():
+            entity_id = self.entry.data.get(conf_key)
+            if entity_id:
+                keys_by_entity.setdefault(entity_id, []).append(total_key)
+        return keys_by_entity
+
+    def _get_inputs(self) -> dict[str, float]:
+        return dict(self._inputs)
+
+    def _has_pending_inputs(self) -> bool:
+        # The input sensors report the past hour; once they change after the
+        # last processed hour end they hold the next hour the tick will add.
+        if self._inputs_updated is None:
+            return False
+        last_processed = self.data.last_processed
+        if not last_processed:
+            return True
+        processed = dt_util.parse_datetime(last_processed)
+        if processed is None:
+            return True
+        return _hour_floor(self._inputs_updated) > processed
 
     async def async_process_tick(self) -> None:
+        if not await self.async_wait_loaded():
+            return
         hour_end_local = dt_util.now().replace(minute=0, second=0, microsecond=0)
         hour_end_utc = dt_util.as_utc(hour_end_local)
         hour_end_key = hour_end_utc.isoformat()
 
-        if self.data.last_processed == hour_end_key:
+        async with self._tick_lock:
+            if self.data.last_processed == hour_end_key:
+                self.metrics.ticks_skipped += 1
+                self.async_update_listeners()
+                return
+
+            started = time.monotonic()
+            self.metrics.ticks += 1
+            self.metrics.record_inputs(
+                dt_util.utcnow(), self._input_available, self._input_changed
+            )
+            hours = await self._async_missed_hours(hour_end_utc)
+            self.metrics.hours_caught_up += len(hours)
+            hours.append((hour_end_utc, self._get_inputs()))
+            await self._async_apply_hours(hours)
+            # The diagnostic sensors pick this up with the store write that follows.
+            self.metrics.tick.record(time.monotonic() - started)
+
+    async def async_catch_up(self) -> None:
+        # Apply only hours the recorder already has; the current hour is left to
+        # the scheduled tick, which reads it from the live input states.
+        if not await self.async_wait_loaded():
             return
+        hour_end_local = dt_util.now().replace(minute=0, second=0, microsecond=0)
+        hour_end_utc = dt_util.as_utc(hour_end_local)
 
-        inputs = self._get_inputs()
-        totals = {**self.data.totals}
-        for key, value in inputs.items():
-            totals[key] = round(totals.get(key, 0.0) + value, 3)
-
-        prod_cooling = inputs[TOTAL_PROD_COOLING]
-        prod_heating = inputs[TOTAL_PROD_HEATING]
-        prod_hot_water = inputs[TOTAL_PROD_HOT_WATER]
-        used_cooling = inputs[TOTAL_USED_COOLING]
-        used_heating = inputs[TOTAL_USED_HEATING]
-        used_hot_water = inputs[TOTAL_USED_HOT_WATER]
-        used_aux_heating = inputs[TOTAL_AUX_USED_HEATING]
-        used_aux_hot_water = inputs[TOTAL_AUX_USED_HOT_WATER]
-
-        produced_last = prod_cooling + prod_heating + prod_hot_water
-        used_last = (
-            used_cooling
-            + used_heating
-            + used_hot_water
-            + used_aux_heating
-            + used_aux_hot_water
-        )
-        last_cop = round(produced_last / used_last, 2) if used_last > 0 else 0.0
-        last_cop_total = last_cop
-        last_cop_hot_water = (
-            round(prod_hot_water / (used_hot_water + used_aux_hot_water), 2)
-            if (used_hot_water + used_aux_hot_water) > 0
-            else 0.0
-        )
-        last_cop_heating = (
-            round(prod_heating / (used_heating + used_aux_heating), 2)
-            if (used_heating + used_aux_heating) > 0
-            else 0.0
-        )
-        last_cop_cooling = (
-            round(prod_cooling / used_cooling, 2) if used_cooling > 0 else 0.0
-        )
+        async with self._tick_lock:
+            hours = await self._async_missed_hours(hour_end_utc)
+            if hours:
+                self.metrics.catch_ups += 1
+                self.metrics.hours_caught_up += len(hours)
+                await self._async_apply_hours(hours)
 
-        data = NibeEnergyData(
-            totals=totals,
-            last_processed=hour_end_key,
-            last_cop=last_cop,
-            last_cop_total=last_cop_total,
-            last_cop_hot_water=last_cop_hot_water,
-            last_cop_heating=last_cop_heating,
-            last_cop_cooling=last_cop_cooling,
+    async def _async_apply_hours(self, hours: list[tuple[datetime, dict[str, float]]]) -> None:
+        data = self.data
+        # Starts with the totals before this batch: re-writing the previous hour
+        # is a no-op normally and gives a new series a baseline, so its first
+        # hour does not count the whole lifetime total.
+        applied = [(hours[0][0] - timedelta(hours=1), data.totals)]
+        for hour_end, inputs in hours:
+            data = self._apply_hour(data, hour_end, inputs)
+            applied.append((hour_end, data.totals))
+        data.rolling_cop = self.rolling.cop_values()
+        data.periods = self.periods.values()
+
+        self.async_set_updated_data(data)
+        if self.external_statistics:
+            self._add_external_statistics(applied)
+        # Coalesced: a burst of ticks or catch-up writes the file once. Anything
+        # lost to a crash inside the delay is recovered by the catch-up.
+        self.store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+        self._save_pending = True
+
+    def statistic_id(self, key: str) -> str:
+        return f"{DOMAIN}:{self.entry.entry_id.lower()}_{key}"
+
+    def statistic_name(self, key: str) -> str:
+        return f"{self.entry.title} {STATISTIC_NAMES[key]}"
+
+    @callback
+    def _add_external_statistics(self, applied: list[tuple[datetime, dict[str, int]]]) -> None:
+        # Each processed hour end K carries the energy of the hour before it, so
+        # the row starts at K - 1h: the hour in which the energy was produced.
+        # One call per statistic covers every hour applied in this tick.
+        if "recorder" not in self.hass.config.components:
+            return
+        rows: dict[str, list[StatisticData]] = {key: [] for key in STATISTIC_NAMES}
+        for hour_end, totals in applied:
+            start = utc_hour(hour_end - timedelta(hours=1))
+            values = output_values(totals)
+            for key, key_rows in rows.items():
+                key_rows.append(StatisticData(start=start, state=values[key], sum=values[key]))
+        for key, key_rows in rows.items():
+            metadata = statistic_metadata(self.statistic_id(key), DOMAIN, self.statistic_name(key))
+            async_add_external_statistics(self.hass, metadata, key_rows)
+
+    async def async_replace_state(
+        self, data: NibeEnergyData, rolling: RollingCop, periods: CalendarRollup
+    ) -> None:
+        # Swap in rebuilt totals and rolling history in one step, saved right away.
+        # This also recovers an entry whose stored state could not be loaded.
+        await self._loaded.wait()
+        async with self._tick_lock:
+            self.load_failed = False
+            self.rolling = rolling
+            self.periods = periods
+            data.rolling_cop = rolling.cop_values()
+            data.periods = periods.values()
+            self.async_set_updated_data(data)
+            await self.store.async_save(self._data_to_store())
+
+    async def async_flush(self) -> None:
+        # Write a pending delayed save now, so a reload reads current totals and
+        # the old Store's timer cannot fire after the new coordinator's saves.
+        async with self._tick_lock:
+            if self._save_pending:
+                await self.store.async_save(self._data_to_store())
+
+    @callback
+    def _on_store_write(self, seconds: float) -> None:
+        self._save_pending = False
+        self.metrics.store_save.record(seconds)
+        self.async_update_listeners()
+
+    @callback
+    def _data_to_store(self) -> dict[str, Any]:
+        data = self.data
+        return {
+            "totals": data.totals,
+            "last_processed": data.last_processed,
+            "last_cop": data.last_cop,
+            "last_cop_total": data.last_cop_total,
+            "last_cop_hot_water": data.last_cop_hot_water,
+            "last_cop_heating": data.last_cop_heating,
+            "last_cop_cooling": data.last_cop_cooling,
+            "rolling": self.rolling.as_dict(),
+            "periods": self.periods.as_dict(),
+        }
+
+    def _apply_hour(
+        self, previous: NibeEnergyData, hour_end: datetime, inputs: dict[str, float]
+    ) -> NibeEnergyData:
+        row = cop_row(inputs)
+        time_zone = dt_util.get_default_time_zone()
+        self.rolling.add_hour(hour_end, row, time_zone)
+        self.periods.add_hour(hour_end, row, time_zone)
+
+        return NibeEnergyData(
+            totals=add_hour(previous.totals, inputs),
+            last_processed=hour_end.isoformat(),
+            **last_hour_cops(inputs),
         )
 
-        await self.store.async_save(
-            {
-                "totals": data.totals,
-                "last_processed": data.last_processed,
-                "last_cop": data.last_cop,
-                "last_cop_total": data.last_cop_total,
-                "last_cop_hot_water": data.last_cop_hot_water,
-                "last_cop_heating": data.last_cop_heating,
-                "last_cop_cooling": data.last_cop_cooling,
-            }
+    async def _async_missed_hours(
+        self, hour_end: datetime
+    ) -> list[tuple[datetime, dict[str, float]]]:
+        # Hours between last_processed and hour_end (exclusive) that no tick saw.
+        # The tick for hour end K adds the input values current at K, which the
+        # recorder keeps as the statistics row starting at K.
+        last_processed = self.data.last_processed
+        if not last_processed:
+            return []
+        last = dt_util.parse_datetime(last_processed)
+        if last is None:
+            return []
+        first = last + timedelta(hours=1)
+        if first >= hour_end:
+            return []
+        if "recorder" not in self.hass.config.components:
+            _LOGGER.warning(
+                "Recorder not loaded; %s missed hours since %s cannot be caught up",
+                int((hour_end - first).total_seconds() // 3600),
+                last_processed,
+            )
+            return []
+        oldest = hour_end - timedelta(hours=CATCH_UP_MAX_HOURS)
+        if first < oldest:
+            _LOGGER.warning(
+                "Only the last %s missed hours are caught up; run the rebuild script for older history",
+                CATCH_UP_MAX_HOURS,
+            )
+            first = oldest
+
+        if not self.input_keys_by_entity():
+            return []
+
+        hour_ends: list[datetime] = []
+        hour_end_at = first
+        while hour_end_at < hour_end:
+            hour_ends.append(hour_end_at)
+            hour_end_at += timedelta(hours=1)
+        hours, missing = await self.async_recorded_inputs(hour_ends)
+        if missing:
+            _LOGGER.warning(
+                "No recorder statistics for %s of %s missed hours; counted as zero",
+                missing,
+                len(hours),
+            )
+        _LOGGER.info("Catching up %s missed hours since %s", len(hour_ends), last_processed)
+        return hours
+
+    async def async_recorded_inputs(
+        self, hour_ends: list[datetime]
+    ) -> tuple[list[tuple[datetime, dict[str, float]]], int]:
+        # The inputs of each hour end (in time order) from recorder statistics, and
+        # how many hours had none (left at zero).
+        keys_by_entity = self.input_keys_by_entity()
+        if not hour_ends or not keys_by_entity:
+            return [], len(hour_ends)
+        # Statistics are on UTC hours; local hours can be offset by 30/45 minutes.
+        by_start = {utc_hour(at): {key: 0.0 for key in TOTAL_KEYS} for at in hour_ends}
+        seen: set[datetime] = set()
+        hour_end = hour_ends[-1] + timedelta(hours=1)
+
+        recorder = get_instance(self.hass)
+        stats = await recorder.async_add_executor_job(
+            statistics_during_period,
+            self.hass,
+            utc_hour(hour_ends[0]),
+            utc_hour(hour_end),
+            set(keys_by_entity),
+            "hour",
+            None,
+            {"mean", "state"},
         )
+        fill_hours(by_start, seen, keys_by_entity, stats, latest=False)
 
-        self.async_set_updated_data(data)
+        # The newest hours may not be compiled into long-term statistics yet;
+        # take the last 5-minute value inside each of those hours instead.
+        recent = hour_end - timedelta(hours=SHORT_TERM_CATCH_UP_HOURS)
+        tail = {
+            start: inputs
+            for start, inputs in by_start.items()
+            if start not in seen and start >= recent
+        }
+        if tail:
+            stats = await recorder.async_add_executor_job(
+                statistics_during_period,
+                self.hass,
+                min(tail),
+                utc_hour(hour_end),
+                set(keys_by_entity),
+                "5minute",
+                None,
+                {"mean", "state"},
+            )
+            fill_hours(tail, seen, keys_by_entity, stats, latest=True)
+
+        hours = [(at, by_start[utc_hour(at)]) for at in hour_ends]
+        return hours, len(by_start) - len(seen)
 
     def get_total(self, key: str) -> float:
-        return float(self.data.totals.get(key, 0.0))
+        return self.snapshot.values.get(key, 0.0)
 
     def get_sum(self, key: str) -> float:
-        totals = self.data.totals
-        if key == SUM_PRODUCED:
-            return round(
-                totals.get(TOTAL_PROD_COOLING, 0.0)
-                + totals.get(TOTAL_PROD_HEATING, 0.0)
-                + totals.get(TOTAL_PROD_HOT_WATER, 0.0),
-                3,
-            )
-        if key == SUM_USED:
-            return round(
-                totals.get(TOTAL_USED_COOLING, 0.0)
-                + totals.get(TOTAL_USED_HEATING, 0.0)
-                + totals.get(TOTAL_USED_HOT_WATER, 0.0)
-                + totals.get(TOTAL_AUX_USED_HEATING, 0.0)
-                + totals.get(TOTAL_AUX_USED_HOT_WATER, 0.0),
-                3,
-            )
+        return self.snapshot.values.get(key, 0.0)
+
+    def get_live_source(self) -> str:
+        if self._power_entities:
+            return LIVE_SOURCE_POWER
+        if self._has_pending_inputs():
+            return LIVE_SOURCE_INPUTS
+        return LIVE_SOURCE_HOURLY
+
+    def get_live(self, key: str) -> float:
+        produced = self.get_sum(SUM_PRODUCED)
+        used = self.get_sum(SUM_USED)
+        live_cop = float(self.data.last_cop)
+
+        if self._has_pending_inputs():
+            # Exactly what the next tick will add, so the estimate converges on it.
+            hour_produced = compose(self._inputs, PRODUCED_KEYS)
+            hour_used = compose(self._inputs, USED_KEYS)
+            produced += hour_produced
+            used += hour_used
+            live_cop = cop(hour_produced, hour_used)
+        elif self._power_entities and self._live_hour is not None:
+            last_processed = self.data.last_processed
+            if last_processed != self._live_hour.isoformat():
+                produced += self._prev_energy[CONF_POWER_PRODUCED]
+                used += self._prev_energy[CONF_POWER_USED]
+
+        if self._power_entities and self._power_at is not None:
+            energy = dict(self._live_energy)
+            now = dt_util.utcnow()
+            if _hour_floor(now) == self._live_hour:
+                self._add_power_energy(energy, self._power_at, now)
+            hour_produced = energy[CONF_POWER_PRODUCED]
+            hour_used = energy[CONF_POWER_USED]
+            produced += hour_produced
+            used += hour_used
+            if hour_used > 0:
+                live_cop = cop(hour_produced, hour_used)
+
+        if key == SUM_PRODUCED_LIVE:
+            return round(produced, 3)
+        if key == SUM_USED_LIVE:
+            return round(used, 3)
+        if key == COP_LIVE:
+            return live_cop
         return 0.0
 
+    def get_rolling_cop(self, key: str) -> float:
+        return self.snapshot.values.get(key, 0.0)
+
     def get_cop(self) -> float:
-        return float(self.data.last_cop)
+        return self.snapshot.values[COP_LAST_HOUR]
 
     def get_cop_kind(self, key: str) -> float:
-        if key == COP_TOTAL:
-            return float(self.data.last_cop_total)
-        if key == COP_HOT_WATER:
-            return float(self.data.last_cop_hot_water)
-        if key == COP_HEATING:
-            return float(self.data.last_cop_heating)
-        if key == COP_COOLING:
-            return float(self.data.last_cop_cooling)
-        return float(self.data.last_cop)
+        values = self.snapshot.values
+        return values.get(key, values[COP_LAST_HOUR])
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DATA_SCHEDULER, DOMAIN
+from .coordinator import NibeEnergyCoordinator
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    domain_data = hass.data.get(DOMAIN, {})
+    coordinator: NibeEnergyCoordinator = domain_data[entry.entry_id]["coordinator"]
+    scheduler = domain_data.get(DATA_SCHEDULER)
+    now = dt_util.utcnow()
+
+    inputs = {}
+    for entity_id, total_keys in coordinator.input_keys_by_entity().items():
+        state = hass.states.get(entity_id)
+        inputs[entity_id] = {
+            "inputs": total_keys,
+            "state": state.state if state else None,
+            "last_updated": state.last_updated.isoformat() if state else None,
+            "age_s": round((now - state.last_updated).total_seconds()) if state else None,
+        }
+
+    data = coordinator.data
+    return {
+        "entry": {
+            "title": entry.title,
+            "data": dict(entry.data),
+            "options": dict(entry.options),
+        },
+        "state": {
+            "last_processed": data.last_processed,
+            "totals": dict(data.totals),
+            "last_cop": data.last_cop,
+            "rolling_cop": dict(data.rolling_cop),
+            "rolling_last_hour": (
+                coordinator.rolling.last_hour.isoformat() if coordinator.rolling.last_hour else None
+            ),
+            "live_source": coordinator.get_live_source(),
+            "loaded": coordinator.loaded,
+            "load_failed": coordinator.load_failed,
+            "rebuild_running": coordinator.rebuild_lock.locked(),
+        },
+        "inputs": inputs,
+        "metrics": coordinator.metrics.as_dict(),
+        "fleet_size": scheduler.fleet_size if scheduler is not None else None,
+    }
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Mapping, Sequence
+from itertools import accumulate
+from math import floor
+from operator import add
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .const import (
+    COP_COOLING,
+    COP_HEATING,
+    COP_HOT_WATER,
+    COP_TOTAL,
+    SUM_PRODUCED,
+    SUM_USED,
+    TOTAL_AUX_USED_HEATING,
+    TOTAL_AUX_USED_HOT_WATER,
+    TOTAL_PROD_COOLING,
+    TOTAL_PROD_HEATING,
+    TOTAL_PROD_HOT_WATER,
+    TOTAL_USED_COOLING,
+    TOTAL_USED_HEATING,
+    TOTAL_USED_HOT_WATER,
+)
+
+# Channel tables and the kernels evaluating them, shared by the integration and
+# the offline rebuild script. Only `.const` is imported here: the script loads
+# this module without Home Assistant.
+
+# Cumulative totals are integer Wh: adding them is exact, so the hourly tick,
+# the rebuild (in Python or SQL) and the replay all arrive at the same numbers.
+# kWh is produced only for the sensors and the statistics.
+WH_PER_KWH = 1000
+
+# One cumulative total per hourly input sensor.
+TOTAL_KEYS = [
+    TOTAL_PROD_COOLING,
+    TOTAL_PROD_HEATING,
+    TOTAL_PROD_HOT_WATER,
+    TOTAL_USED_COOLING,
+    TOTAL_USED_HEATING,
+    TOTAL_USED_HOT_WATER,
+    TOTAL_AUX_USED_HEATING,
+    TOTAL_AUX_USED_HOT_WATER,
+]
+
+PRODUCED_KEYS = (TOTAL_PROD_COOLING, TOTAL_PROD_HEATING, TOTAL_PROD_HOT_WATER)
+USED_KEYS = (
+    TOTAL_USED_COOLING,
+    TOTAL_USED_HEATING,
+    TOTAL_USED_HOT_WATER,
+    TOTAL_AUX_USED_HEATING,
+    TOTAL_AUX_USED_HOT_WATER,
+)
+
+# Output energy sensor -> input totals summed into it, in this order. The
+# per-input sensors are the raw totals: used heating/hot water exclude aux.
+OUTPUT_PARTS: dict[str, tuple[str, ...]] = {
+    **{key: (key,) for key in TOTAL_KEYS},
+    SUM_PRODUCED: PRODUCED_KEYS,
+    SUM_USED: USED_KEYS,
+}
+
+# COP channel -> (produced inputs, used inputs). Aux heaters count as used.
+COP_PARTS: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    COP_TOTAL: (PRODUCED_KEYS, USED_KEYS),
+    COP_HEATING: ((TOTAL_PROD_HEATING,), (TOTAL_USED_HEATING, TOTAL_AUX_USED_HEATING)),
+    COP_HOT_WATER: (
+        (TOTAL_PROD_HOT_WATER,),
+        (TOTAL_USED_HOT_WATER, TOTAL_AUX_USED_HOT_WATER),
+    ),
+    COP_COOLING: ((TOTAL_PROD_COOLING,), (TOTAL_USED_COOLING,)),
+}
+COP_CHANNELS = list(COP_PARTS)
+
+# The tables flattened once for the per-hour kernels, which run on every tick
+# and, in the replay harness, for years of hours in a row.
+_COP_ROW_PARTS = tuple(parts for pair in COP_PARTS.values() for parts in pair)
+_OUTPUT_ITEMS = tuple(OUTPUT_PARTS.items())
+
+
+def compose(values: Mapping[str, float], parts: Iterable[str]) -> float:
+    # Plain left-to-right addition: sum() is compensated on Python 3.12+, which
+    # would make the result depend on the interpreter.
+    total = 0.0
+    for key in parts:
+        total += values.get(key, 0.0)
+    return total
+
+
+def cop(produced: float, used: float) -> float:
+    return round(produced / used, 2) if used > 0 else 0.0
+
+
+def to_wh(kwh: float) -> int:
+    # Half up, written out so the SQL engine can do the same with a CAST.
+    return floor(kwh * WH_PER_KWH + 0.5)
+
+
+def to_kwh(wh: int) -> float:
+    return wh / WH_PER_KWH
+
+
+def totals_to_wh(totals: Mapping[str, float]) -> dict[str, int]:
+    # Storage version 1 kept the totals as kWh rounded to 3 decimals.
+    return {key: to_wh(float(value)) for key, value in totals.items()}
+
+
+# =========================
+# Per hour
+# =========================
+def add_hour(totals: Mapping[str, int], inputs: Mapping[str, float]) -> dict[str, int]:
+    # Totals in Wh, inputs in kWh: each input is rounded to Wh once, as it is added.
+    get_total = totals.get
+    get_input = inputs.get
+    return {key: get_total(key, 0) + to_wh(get_input(key, 0.0)) for key in TOTAL_KEYS}
+
+
+def output_values(totals: Mapping[str, int]) -> dict[str, float]:
+    # Wh totals -> kWh sensor values.
+    values = {}
+    for key, parts in _OUTPUT_ITEMS:
+        wh = 0
+        for part in parts:
+            wh += totals.get(part, 0)
+        values[key] = wh / WH_PER_KWH
+    return values
+
+
+def cop_row(inputs: Mapping[str, float]) -> list[float]:
+    # (produced, used) per COP channel, the unit the rolling and period sums add up.
+    get = inputs.get
+    row = []
+    for parts in _COP_ROW_PARTS:
+        total = 0.0
+        for key in parts:
+            total += get(key, 0.0)
+        row.append(total)
+    return row
+
+
+def cop_values(inputs: Mapping[str, float]) -> dict[str, float]:
+    row = cop_row(inputs)
+    values = {}
+    for index, channel in enumerate(COP_CHANNELS):
+        used = row[2 * index + 1]
+        values[channel] = round(row[2 * index] / used, 2) if used > 0 else 0.0
+    return values
+
+
+# =========================
+# Batch over hourly columns
+# =========================
+def compute_engine_name() -> str:
+    return "numpy" if np is not None else "array"
+
+
+def _cumulate_numpy(columns: Mapping[str, Sequence[float]], parts_list, seeds):
+    hourly_wh = {}
+    cums = {}
+    for parts in parts_list:
+        if parts in cums:
+            continue
+        for p in parts:
+            if p not in hourly_wh:
+                clipped = np.clip(np.frombuffer(columns[p], dtype=np.float64), 0.0, None)
+                hourly_wh[p] = np.floor(clipped * WH_PER_KWH + 0.5).astype(np.int64)
+        hourly = hourly_wh[parts[0]]
+        for p in parts[1:]:
+            hourly = hourly + hourly_wh[p]
+        cums[parts] = np.cumsum(hourly) + seeds.get(parts, 0)
+    return cums
+
+
+def _cumulate_array(columns: Mapping[str, Sequence[float]], parts_list, seeds):
+    cums = {}
+    for parts in parts_list:
+        if parts in cums:
+            continue
+        hourly = (to_wh(max(0.0, v)) for v in columns[parts[0]])
+        for p in parts[1:]:
+            hourly = map(add, hourly, (to_wh(max(0.0, v)) for v in columns[p]))
+        cum = array("q", accumulate(hourly, initial=seeds.get(parts, 0)))
+        cums[parts] = cum[1:]
+    return cums
+
+
+def cumulate(
+    columns: Mapping[str, Sequence[float]],
+    parts_list: Iterable[tuple[str, ...]],
+    seeds: Mapping[tuple[str, ...], int] | None = None,
+):
+    # Running Wh sums of the clipped, composed hourly columns, like add_hour():
+    # one pass per distinct parts tuple, numpy when available. `columns` are
+    # array('d') of kWh per input key; seeds are Wh.
+    parts_list = list(parts_list)
+    if np is not None:
+        return _cumulate_numpy(columns, parts_list, seeds or {})
+    return _cumulate_array(columns, parts_list, seeds or {})
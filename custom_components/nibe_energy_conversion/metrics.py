@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any
+
+from .const import (
+    DIAG_INPUT_AGE,
+    DIAG_SETUP_DURATION,
+    DIAG_SKIPPED_TICKS,
+    DIAG_STORE_SAVE_DURATION,
+    DIAG_TICK_DURATION,
+    DIAG_UNAVAILABLE_INPUTS,
+)
+
+# Upper bucket bounds in milliseconds; the last bucket takes everything slower.
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# Fixed-bucket histogram: constant memory however long HA runs.
+class LatencyHistogram:
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms: float | None = None
+
+    def record(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.last_ms = ms
+
+    def quantile(self, q: float) -> float | None:
+        # Upper bound of the bucket holding the quantile (max for the last one).
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank and bucket:
+                if index == len(LATENCY_BUCKETS_MS):
+                    return round(self.max_ms, 1)
+                return float(LATENCY_BUCKETS_MS[index])
+        return round(self.max_ms, 1)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [
+            f">{LATENCY_BUCKETS_MS[-1]}ms"
+        ]
+        return {
+            **self.summary(),
+            "last_ms": round(self.last_ms, 1) if self.last_ms is not None else None,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+# Counters and latencies of the hot paths since the entry was set up.
+class NibeEnergyMetrics:
+    def __init__(self) -> None:
+        self.tick = LatencyHistogram()
+        self.store_save = LatencyHistogram()
+        self.ticks = 0
+        self.ticks_skipped = 0
+        self.catch_ups = 0
+        self.hours_caught_up = 0
+        self.last_tick: datetime | None = None
+        # Per input sensor: ticks that found it unavailable, and its age then.
+        self.unavailable: dict[str, int] = {}
+        self.input_age: dict[str, float | None] = {}
+        # Time spent in async_setup_entry, and reading the store in the background.
+        self.setup_ms: float | None = None
+        self.store_load_ms: float | None = None
+
+    def record_inputs(
+        self,
+        now: datetime,
+        available: dict[str, bool],
+        updated: dict[str, datetime | None],
+    ) -> None:
+        self.last_tick = now
+        for entity_id, is_available in available.items():
+            if not is_available:
+                self.unavailable[entity_id] = self.unavailable.get(entity_id, 0) + 1
+            else:
+                self.unavailable.setdefault(entity_id, 0)
+            last_updated = updated.get(entity_id)
+            self.input_age[entity_id] = (
+                round((now - last_updated).total_seconds()) if last_updated else None
+            )
+
+    def sensor_value(self, key: str) -> float | int | None:
+        if key == DIAG_TICK_DURATION:
+            return round(self.tick.last_ms, 1) if self.tick.last_ms is not None else None
+        if key == DIAG_STORE_SAVE_DURATION:
+            last_ms = self.store_save.last_ms
+            return round(last_ms, 1) if last_ms is not None else None
+        if key == DIAG_UNAVAILABLE_INPUTS:
+            return sum(self.unavailable.values())
+        if key == DIAG_INPUT_AGE:
+            ages = [age for age in self.input_age.values() if age is not None]
+            return max(ages) if ages else None
+        if key == DIAG_SKIPPED_TICKS:
+            return self.ticks_skipped
+        if key == DIAG_SETUP_DURATION:
+            return round(self.setup_ms, 1) if self.setup_ms is not None else None
+        return None
+
+    def sensor_attributes(self, key: str) -> dict[str, Any]:
+        if key == DIAG_TICK_DURATION:
+            return {**self.tick.summary(), "hours_caught_up": self.hours_caught_up}
+        if key == DIAG_STORE_SAVE_DURATION:
+            return self.store_save.summary()
+        if key == DIAG_UNAVAILABLE_INPUTS:
+            return dict(self.unavailable)
+        if key == DIAG_INPUT_AGE:
+            return dict(self.input_age)
+        if key == DIAG_SKIPPED_TICKS:
+            return {"ticks": self.ticks}
+        if key == DIAG_SETUP_DURATION:
+            return {
+                "store_load_ms": (
+                    round(self.store_load_ms, 1) if self.store_load_ms is not None else None
+                )
+            }
+        return {}
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "ticks": self.ticks,
+            "ticks_skipped": self.ticks_skipped,
+            "catch_ups": self.catch_ups,
+            "hours_caught_up": self.hours_caught_up,
+            "last_tick": self.last_tick.isoformat() if self.last_tick else None,
+            "tick_latency": self.tick.as_dict(),
+            "store_save_latency": self.store_save.as_dict(),
+            "unavailable_inputs": dict(self.unavailable),
+            "input_age_s": dict(self.input_age),
+            "setup_ms": round(self.setup_ms, 1) if self.setup_ms is not None else None,
+            "store_load_ms": (
+                round(self.store_load_ms, 1) if self.store_load_ms is not None else None
+            ),
+        }
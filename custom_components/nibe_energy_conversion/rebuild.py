@@ -0,0 +1,508 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from homeassistant.components import persistent_notification
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    async_import_statistics,
+    statistics_during_period,
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, VERIFY_STORAGE_KEY
+from .coordinator import (
+    STATISTIC_NAMES,
+    NibeEnergyCoordinator,
+    NibeEnergyData,
+    last_hour_cops,
+    stat_start,
+    statistic_metadata,
+    utc_hour,
+)
+from .energy import OUTPUT_PARTS, TOTAL_KEYS, add_hour, cop_row, output_values, to_kwh, to_wh
+from .rolling import CalendarRollup, RollingCop
+from .verify import (
+    VERIFY_STATE_VERSION,
+    VERIFY_TOLERANCE,
+    day_ranges,
+    days_to_check,
+    first_divergence,
+    signature,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_DAYS = 30
+# Hours replayed into the rolling COP rings and calendar periods even when
+# rebuilding only from `since`: the rolling year, or back to the last year's start.
+ROLLING_HISTORY = timedelta(days=366)
+HISTORY_START = datetime(2000, 1, 1, tzinfo=timezone.utc)
+# Days of daily statistics read per step when computing the day signatures.
+VERIFY_SIGNATURE_DAYS = 90
+# How far back the store check looks for the last output row.
+STORE_CHECK_HOURS = 48
+
+
+# Where rebuilt outputs go. Entity statistics follow the recorder convention of
+# the offline script (row K includes the inputs recorded at K); the external
+# statistics put the energy in the hour it was produced (K - 1h).
+def _output_targets(
+    hass: HomeAssistant, coordinator: NibeEnergyCoordinator
+) -> dict[str, tuple[str, str, timedelta]]:
+    if coordinator.external_statistics:
+        return {
+            key: (coordinator.statistic_id(key), DOMAIN, timedelta(hours=-1))
+            for key in STATISTIC_NAMES
+        }
+    registry = er.async_get(hass)
+    targets = {}
+    for key in STATISTIC_NAMES:
+        entity_id = registry.async_get_entity_id(
+            "sensor", DOMAIN, f"{coordinator.entry.entry_id}_{key}"
+        )
+        if entity_id:
+            targets[key] = (entity_id, "recorder", timedelta(0))
+    return targets
+
+
+def _hour_inputs(
+    stats: dict[str, list[dict]], keys_by_entity: dict[str, list[str]]
+) -> list[tuple[datetime, dict[str, float]]]:
+    # Same value rules as the offline script: mean, else state; negatives skipped.
+    by_start: dict[datetime, dict[str, float]] = {}
+    for entity_id, rows in stats.items():
+        for row in rows:
+            value = row.get("mean")
+            if value is None:
+                value = row.get("state")
+            if value is None or value < 0:
+                continue
+            inputs = by_start.setdefault(stat_start(row), {key: 0.0 for key in TOTAL_KEYS})
+            for total_key in keys_by_entity.get(entity_id, []):
+                inputs[total_key] = float(value)
+    return sorted(by_start.items())
+
+
+async def _async_first_hour(
+    hass: HomeAssistant, keys_by_entity: dict[str, list[str]], end: datetime
+) -> datetime | None:
+    # Monthly statistics are a cheap way to find where the hourly history begins.
+    stats = await get_instance(hass).async_add_executor_job(
+        statistics_during_period,
+        hass,
+        HISTORY_START,
+        end,
+        set(keys_by_entity),
+        "month",
+        None,
+        {"mean"},
+    )
+    starts = [stat_start(rows[0]) for rows in stats.values() if rows]
+    return min(starts) if starts else None
+
+
+async def _async_seed_totals(
+    hass: HomeAssistant,
+    coordinator: NibeEnergyCoordinator,
+    targets: dict[str, tuple[str, str, timedelta]],
+    start: datetime,
+) -> dict[str, int]:
+    # Totals (Wh) already stored for the hour before `start`, like seed_before()
+    # in the offline script.
+    seeds = {}
+    for key in TOTAL_KEYS:
+        if key not in targets:
+            raise HomeAssistantError(f"No output statistic found for {key}")
+        statistic_id, _, shift = targets[key]
+        seed_start = start - timedelta(hours=1) + shift
+        stats = await get_instance(hass).async_add_executor_job(
+            statistics_during_period,
+            hass,
+            seed_start,
+            seed_start + timedelta(hours=1),
+            {statistic_id},
+            "hour",
+            None,
+            {"sum"},
+        )
+        rows = stats.get(statistic_id)
+        if not rows or rows[-1].get("sum") is None:
+            raise HomeAssistantError(
+                f"No statistics for {statistic_id} before {start.isoformat()}; rebuild without 'since'"
+            )
+        seeds[key] = to_wh(float(rows[-1]["sum"]))
+    return seeds
+
+
+def notify_rebuild(hass: HomeAssistant, coordinator: NibeEnergyCoordinator, message: str) -> None:
+    persistent_notification.async_create(
+        hass,
+        message,
+        title=f"{coordinator.entry.title}: history rebuild",
+        notification_id=f"{DOMAIN}_rebuild_{coordinator.entry.entry_id}",
+    )
+
+
+async def async_rebuild_history(
+    hass: HomeAssistant,
+    coordinator: NibeEnergyCoordinator,
+    since: datetime | None = None,
+    chunk_days: int = DEFAULT_CHUNK_DAYS,
+) -> None:
+    if "recorder" not in hass.config.components:
+        raise HomeAssistantError("The recorder is not loaded")
+    keys_by_entity = coordinator.input_keys_by_entity()
+    targets = _output_targets(hass, coordinator)
+    if not keys_by_entity or not targets:
+        raise HomeAssistantError("No input sensors or output statistics to rebuild")
+
+    end = utc_hour(dt_util.utcnow())
+    if since is None:
+        start = await _async_first_hour(hass, keys_by_entity, end)
+        if start is None:
+            raise HomeAssistantError("No input statistics found in the recorder")
+        totals = {key: 0 for key in TOTAL_KEYS}
+    else:
+        start = utc_hour(since)
+        totals = await _async_seed_totals(hass, coordinator, targets, start)
+
+    chunk = timedelta(days=chunk_days)
+    year_start = dt_util.start_of_local_day(dt_util.now().date().replace(month=1, day=1))
+    last_year_start = utc_hour(year_start.replace(year=year_start.year - 1))
+    read_from = min(start, end - ROLLING_HISTORY, last_year_start)
+    n_chunks = max(1, -(-int((end - read_from).total_seconds()) // int(chunk.total_seconds())))
+    rolling = RollingCop()
+    periods = CalendarRollup()
+    time_zone = dt_util.get_default_time_zone()
+    last: tuple[datetime, dict[str, float]] | None = None
+    n_hours = 0
+
+    notify_rebuild(hass, coordinator, f"Rebuilding history from {start.isoformat()}...")
+    chunk_start = read_from
+    for index in range(n_chunks):
+        chunk_end = min(end, chunk_start + chunk)
+        stats = await get_instance(hass).async_add_executor_job(
+            statistics_during_period,
+            hass,
+            chunk_start,
+            chunk_end,
+            set(keys_by_entity),
+            "hour",
+            None,
+            {"mean", "state"},
+        )
+        rows: dict[str, list[StatisticData]] = {key: [] for key in targets}
+        for hour_start, inputs in _hour_inputs(stats, keys_by_entity):
+            row = cop_row(inputs)
+            rolling.add_hour(hour_start, row, time_zone)
+            periods.add_hour(hour_start, row, time_zone)
+            if hour_start < start:
+                continue
+            totals = add_hour(totals, inputs)
+            values = output_values(totals)
+            for key, (_, _, shift) in targets.items():
+                rows[key].append(
+                    StatisticData(start=hour_start + shift, state=values[key], sum=values[key])
+                )
+            last = (hour_start, inputs)
+            n_hours += 1
+
+        # Queued on the recorder thread; imports upsert by start time.
+        for key, key_rows in rows.items():
+            if not key_rows:
+                continue
+            statistic_id, source, _ = targets[key]
+            if source == DOMAIN:
+                metadata = statistic_metadata(statistic_id, source, coordinator.statistic_name(key))
+                async_add_external_statistics(hass, metadata, key_rows)
+            else:
+                async_import_statistics(hass, statistic_metadata(statistic_id, source, None), key_rows)
+
+        notify_rebuild(
+            hass,
+            coordinator,
+            f"Rebuilding history: chunk {index + 1}/{n_chunks} done, {n_hours} hours rebuilt so far.",
+        )
+        chunk_start = chunk_end
+        await asyncio.sleep(0)
+
+    if last is None:
+        raise HomeAssistantError("No input statistics in the selected range")
+
+    last_start, last_inputs = last
+    data = NibeEnergyData(
+        totals=dict(totals),
+        last_processed=last_start.isoformat(),
+        **last_hour_cops(last_inputs),
+    )
+    await coordinator.async_replace_state(data, rolling, periods)
+    notify_rebuild(
+        hass,
+        coordinator,
+        f"History rebuilt: {n_hours} hours from {start.isoformat()} to {last_start.isoformat()}. "
+        "Later hours are caught up by the next tick.",
+    )
+    _LOGGER.info("Rebuilt %s hours of history for %s", n_hours, coordinator.entry.title)
+
+
+# Verification: the recorder reduces hourly statistics to days in its executor,
+# and those daily rows are the day signatures. Only days whose signature changed
+# since the last run (or that diverged then) are compared hour by hour.
+def _local_day(moment: datetime) -> str:
+    return dt_util.as_local(moment).date().isoformat()
+
+
+def _day_bounds(day: str) -> tuple[datetime, datetime]:
+    date = dt_util.parse_date(day)
+    return (
+        dt_util.as_utc(dt_util.start_of_local_day(date)),
+        dt_util.as_utc(dt_util.start_of_local_day(date + timedelta(days=1))),
+    )
+
+
+def _is_next_day(day: str, other: str) -> bool:
+    return dt_util.parse_date(other) - dt_util.parse_date(day) == timedelta(days=1)
+
+
+async def _async_day_signatures(
+    hass: HomeAssistant, input_ids: list[str], output_ids: list[str], start: datetime, end: datetime
+) -> dict[str, list]:
+    by_day: dict[str, dict[str, list]] = {}
+    date = dt_util.as_local(start).date()
+    while (chunk_start := dt_util.start_of_local_day(date)) < end:
+        date += timedelta(days=VERIFY_SIGNATURE_DAYS)
+        stats = await get_instance(hass).async_add_executor_job(
+            statistics_during_period,
+            hass,
+            chunk_start,
+            min(end, dt_util.start_of_local_day(date)),
+            {*input_ids, *output_ids},
+            "day",
+            None,
+            {"mean", "state", "change"},
+        )
+        for statistic_id, rows in stats.items():
+            for row in rows:
+                if statistic_id in output_ids:
+                    values = (row.get("change"),)
+                else:
+                    values = (row.get("mean"), row.get("state"))
+                by_day.setdefault(_local_day(stat_start(row)), {})[statistic_id] = signature(values)
+    ids = [*input_ids, *output_ids]
+    return {day: [sigs.get(statistic_id) for statistic_id in ids] for day, sigs in by_day.items()}
+
+
+async def _async_check_days(
+    hass: HomeAssistant,
+    keys_by_entity: dict[str, list[str]],
+    targets: dict[str, tuple[str, str, timedelta]],
+    days: list[str],
+    tolerance: float,
+) -> dict[str, dict[str, Any] | None]:
+    # First divergent hour per day. Hours are UTC statistics hours; the output row
+    # of input hour K starts at K + shift.
+    start = _day_bounds(days[0])[0]
+    end = _day_bounds(days[-1])[1]
+    shift = next(iter(targets.values()))[2]
+    recorder = get_instance(hass)
+    stats = await recorder.async_add_executor_job(
+        statistics_during_period,
+        hass,
+        start,
+        end,
+        set(keys_by_entity),
+        "hour",
+        None,
+        {"mean", "state"},
+    )
+    by_day: dict[str, list[tuple[datetime, dict[str, float]]]] = {}
+    for hour, inputs in _hour_inputs(stats, keys_by_entity):
+        by_day.setdefault(_local_day(hour), []).append((hour, inputs))
+
+    stats = await recorder.async_add_executor_job(
+        statistics_during_period,
+        hass,
+        start + shift - timedelta(hours=1),
+        end + shift,
+        {statistic_id for statistic_id, _, _ in targets.values()},
+        "hour",
+        None,
+        {"sum"},
+    )
+    recorded = {
+        key: {
+            stat_start(row) - shift: float(row["sum"])
+            for row in stats.get(statistic_id, [])
+            if row.get("sum") is not None
+        }
+        for key, (statistic_id, _, _) in targets.items()
+    }
+    parts_by_key = {key: OUTPUT_PARTS[key] for key in targets}
+
+    results = {}
+    for day in days:
+        before = _day_bounds(day)[0] - timedelta(hours=1)
+        divergence = first_divergence(
+            by_day.get(day, []),
+            recorded,
+            {key: rows.get(before) for key, rows in recorded.items()},
+            parts_by_key,
+            tolerance,
+        )
+        if divergence is not None:
+            divergence["statistic_id"] = targets[divergence["key"]][0]
+            divergence["hour"] = divergence["hour"].isoformat()
+        results[day] = divergence
+    return results
+
+
+async def _async_check_store(
+    hass: HomeAssistant,
+    coordinator: NibeEnergyCoordinator,
+    targets: dict[str, tuple[str, str, timedelta]],
+    tolerance: float,
+) -> list[dict[str, Any]]:
+    # Stored totals against the last recorded output state plus the recorded
+    # inputs of the hours processed after it.
+    data = coordinator.data
+    processed = dt_util.parse_datetime(data.last_processed) if data.last_processed else None
+    keys = [key for key in TOTAL_KEYS if key in targets]
+    if processed is None or not keys:
+        return []
+    last = utc_hour(processed)
+    shift = targets[keys[0]][2]
+    stats = await get_instance(hass).async_add_executor_job(
+        statistics_during_period,
+        hass,
+        last + shift - timedelta(hours=STORE_CHECK_HOURS),
+        last + shift + timedelta(hours=1),
+        {targets[key][0] for key in keys},
+        "hour",
+        None,
+        {"state"},
+    )
+    latest: dict[str, tuple[datetime, int]] = {}
+    for key in keys:
+        for row in stats.get(targets[key][0], []):
+            if row.get("state") is not None and stat_start(row) - shift <= last:
+                latest[key] = (stat_start(row) - shift, to_wh(float(row["state"])))
+    if not latest:
+        return []
+
+    hour_ends = []
+    hour = min(row_hour for row_hour, _ in latest.values()) + timedelta(hours=1)
+    while hour <= last:
+        hour_ends.append(hour)
+        hour += timedelta(hours=1)
+    hours, missing = await coordinator.async_recorded_inputs(hour_ends)
+
+    results = []
+    # In Wh, like the tick adds them, so a store in step with the statistics
+    # matches exactly.
+    for key, (row_hour, state) in latest.items():
+        expected = state
+        for hour, inputs in hours:
+            if hour > row_hour:
+                expected += to_wh(inputs.get(key, 0.0))
+        stored = data.totals.get(key, 0)
+        delta = to_kwh(stored - expected)
+        results.append(
+            {
+                "key": key,
+                "store": to_kwh(stored),
+                "expected": to_kwh(expected),
+                "delta": delta,
+                "recorded_hour": row_hour.isoformat(),
+                "missing_hours": missing,
+                "diverged": missing == 0 and abs(delta) > tolerance,
+            }
+        )
+    return results
+
+
+def notify_verify(hass: HomeAssistant, coordinator: NibeEnergyCoordinator, message: str) -> None:
+    persistent_notification.async_create(
+        hass,
+        message,
+        title=f"{coordinator.entry.title}: history check",
+        notification_id=f"{DOMAIN}_verify_{coordinator.entry.entry_id}",
+    )
+
+
+async def async_verify_history(
+    hass: HomeAssistant,
+    coordinator: NibeEnergyCoordinator,
+    full: bool = False,
+    tolerance: float = VERIFY_TOLERANCE,
+) -> dict[str, Any]:
+    if "recorder" not in hass.config.components:
+        raise HomeAssistantError("The recorder is not loaded")
+    keys_by_entity = coordinator.input_keys_by_entity()
+    targets = _output_targets(hass, coordinator)
+    if not keys_by_entity or not targets:
+        raise HomeAssistantError("No input sensors or output statistics to verify")
+
+    store = Store(hass, VERIFY_STATE_VERSION, f"{VERIFY_STORAGE_KEY}_{coordinator.entry.entry_id}")
+    state = await store.async_load() or {}
+    config = {
+        "inputs": keys_by_entity,
+        "outputs": {key: statistic_id for key, (statistic_id, _, _) in targets.items()},
+    }
+    if state.get("config") != config:
+        state = {}
+    days: dict[str, dict[str, Any]] = state.get("days", {})
+
+    end = utc_hour(dt_util.utcnow())
+    start = dt_util.parse_datetime(state["start"]) if state.get("start") else None
+    if start is None:
+        start = await _async_first_hour(hass, keys_by_entity, end)
+        if start is None:
+            raise HomeAssistantError("No input statistics found in the recorder")
+
+    signatures = await _async_day_signatures(
+        hass, list(keys_by_entity), list(config["outputs"].values()), start, end
+    )
+    check = days_to_check(signatures, days, full)
+    for run in day_ranges(check, _is_next_day, DEFAULT_CHUNK_DAYS):
+        results = await _async_check_days(hass, keys_by_entity, targets, run, tolerance)
+        for day in run:
+            days[day] = {"sig": signatures[day], "diverged": results[day]}
+        await asyncio.sleep(0)
+    days = {day: days[day] for day in sorted(signatures) if day in days}
+    await store.async_save({"config": config, "start": start.isoformat(), "days": days})
+
+    diverged = [day for day, result in days.items() if result["diverged"]]
+    store_check = await _async_check_store(hass, coordinator, targets, tolerance)
+    report = {
+        "days": len(days),
+        "checked_days": len(check),
+        "divergent_days": len(diverged),
+        "first_divergence": days[diverged[0]]["diverged"] if diverged else None,
+        "store": store_check,
+    }
+    problems = []
+    if diverged:
+        first = report["first_divergence"]
+        problems.append(
+            f"{len(diverged)} day(s) differ from the inputs, first at {first['hour']} "
+            f"({first['statistic_id']}: {first['delta']:+.3f} kWh)."
+        )
+    problems.extend(
+        f"Stored {item['key']} differs by {item['delta']:+.3f} kWh from the recorded statistics."
+        for item in store_check
+        if item["diverged"]
+    )
+    if problems:
+        _LOGGER.warning("History check of %s: %s", coordinator.entry.title, " ".join(problems))
+        notify_verify(hass, coordinator, "\n".join(problems))
+    return report
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import base64
+import sys
+from array import array
+from datetime import date, datetime, timedelta, tzinfo
+from typing import Any
+
+from .const import (
+    PERIOD_DAY,
+    PERIOD_MONTH,
+    PERIOD_PRODUCED,
+    PERIOD_USED,
+    PERIOD_YEAR,
+    ROLLING_WINDOW_7D,
+    ROLLING_WINDOW_24H,
+    ROLLING_WINDOW_30D,
+    ROLLING_WINDOW_SEASONAL,
+)
+from .energy import COP_CHANNELS, cop
+
+# Each ring row holds (produced, used) per COP channel, as built by cop_row().
+ROW_WIDTH = 2 * len(COP_CHANNELS)
+
+HOURLY_WINDOWS = {
+    ROLLING_WINDOW_24H: 24,
+    ROLLING_WINDOW_7D: 7 * 24,
+    ROLLING_WINDOW_30D: 30 * 24,
+}
+HOURLY_CAPACITY = 30 * 24
+
+# The seasonal window is a rolling year, kept per day so the ring stays small:
+# the last 364 closed days plus the day in progress.
+DAILY_CAPACITY = 365
+SEASONAL_DAYS = DAILY_CAPACITY - 1
+
+ROLLING_WINDOWS = [*HOURLY_WINDOWS, ROLLING_WINDOW_SEASONAL]
+
+CALENDAR_PERIODS = [PERIOD_DAY, PERIOD_MONTH, PERIOD_YEAR]
+
+
+# Fixed-size ring of rows with running sums over the newest N rows.
+class RingSums:
+    def __init__(self, capacity: int, windows: list[int]) -> None:
+        self.capacity = capacity
+        self.values = array("d", bytes(8 * ROW_WIDTH * capacity))
+        self.head = 0
+        self.count = 0
+        self.sums = {window: [0.0] * ROW_WIDTH for window in windows}
+
+    def push(self, row: list[float]) -> None:
+        values = self.values
+        base = self.head * ROW_WIDTH
+        for window, sums in self.sums.items():
+            if self.count >= window:
+                old = ((self.head - window) % self.capacity) * ROW_WIDTH
+                for i in range(ROW_WIDTH):
+                    sums[i] -= values[old + i]
+            for i in range(ROW_WIDTH):
+                sums[i] += row[i]
+        values[base : base + ROW_WIDTH] = array("d", row)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        if self.head == 0:
+            # Once per lap, drop the rounding drift of the running sums.
+            self.recompute()
+
+    def window_sum(self, window: int) -> list[float]:
+        return self.sums[window]
+
+    def recompute(self) -> None:
+        values = self.values
+        for window, sums in self.sums.items():
+            sums[:] = [0.0] * ROW_WIDTH
+            for back in range(1, min(window, self.count) + 1):
+                base = ((self.head - back) % self.capacity) * ROW_WIDTH
+                for i in range(ROW_WIDTH):
+                    sums[i] += values[base + i]
+
+    def as_dict(self) -> dict[str, Any]:
+        values = array("d", self.values)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return {
+            "head": self.head,
+            "count": self.count,
+            "values": base64.b64encode(values.tobytes()).decode("ascii"),
+        }
+
+    def load(self, stored: dict[str, Any]) -> None:
+        values = array("d", base64.b64decode(stored["values"]))
+        if sys.byteorder == "big":
+            values.byteswap()
+        if len(values) != ROW_WIDTH * self.capacity:
+            raise ValueError("ring size mismatch")
+        self.values = values
+        self.head = int(stored["head"]) % self.capacity
+        self.count = min(int(stored["count"]), self.capacity)
+        self.recompute()
+
+
+# Hourly produced/used history for rolling-window COP, O(1) per processed hour.
+class RollingCop:
+    def __init__(self) -> None:
+        self.hourly = RingSums(HOURLY_CAPACITY, list(HOURLY_WINDOWS.values()))
+        self.daily = RingSums(DAILY_CAPACITY, [SEASONAL_DAYS])
+        self.last_hour: datetime | None = None
+        self.day: date | None = None
+        self.day_row = [0.0] * ROW_WIDTH
+
+    def add_hour(self, hour_end: datetime, row: list[float], time_zone: tzinfo) -> None:
+        if self.last_hour is not None:
+            if hour_end <= self.last_hour:
+                return
+            # Hours that were never processed count as zero, so windows stay in time.
+            missing = int((hour_end - self.last_hour).total_seconds() // 3600) - 1
+            for _ in range(min(missing, HOURLY_CAPACITY)):
+                self._push_hour(self.last_hour + timedelta(hours=1), [0.0] * ROW_WIDTH, time_zone)
+        self._push_hour(hour_end, row, time_zone)
+
+    def _push_hour(self, hour_end: datetime, row: list[float], time_zone: tzinfo) -> None:
+        day = (hour_end - timedelta(hours=1)).astimezone(time_zone).date()
+        if self.day is not None and day != self.day:
+            self.daily.push(self.day_row)
+            for _ in range(min((day - self.day).days - 1, DAILY_CAPACITY)):
+                self.daily.push([0.0] * ROW_WIDTH)
+            self.day_row = [0.0] * ROW_WIDTH
+        self.day = day
+        for i in range(ROW_WIDTH):
+            self.day_row[i] += row[i]
+        self.hourly.push(row)
+        self.last_hour = hour_end
+
+    def window_sums(self, window: str) -> list[float]:
+        if window == ROLLING_WINDOW_SEASONAL:
+            closed = self.daily.window_sum(SEASONAL_DAYS)
+            return [closed[i] + self.day_row[i] for i in range(ROW_WIDTH)]
+        return self.hourly.window_sum(HOURLY_WINDOWS[window])
+
+    def channel_energy(self, window: str, channel: str) -> tuple[float, float]:
+        sums = self.window_sums(window)
+        index = 2 * COP_CHANNELS.index(channel)
+        return sums[index], sums[index + 1]
+
+    def cop(self, window: str, channel: str) -> float:
+        return cop(*self.channel_energy(window, channel))
+
+    def cop_values(self) -> dict[str, float]:
+        return {
+            f"{channel}_{window}": self.cop(window, channel)
+            for window in ROLLING_WINDOWS
+            for channel in COP_CHANNELS
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "last_hour": self.last_hour.isoformat() if self.last_hour else None,
+            "day": self.day.isoformat() if self.day else None,
+            "day_row": list(self.day_row),
+            "hourly": self.hourly.as_dict(),
+            "daily": self.daily.as_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, stored: dict[str, Any] | None) -> RollingCop:
+        rolling = cls()
+        if not stored:
+            return rolling
+        try:
+            rolling.hourly.load(stored["hourly"])
+            rolling.daily.load(stored["daily"])
+            if stored.get("last_hour"):
+                rolling.last_hour = datetime.fromisoformat(stored["last_hour"])
+            if stored.get("day"):
+                rolling.day = date.fromisoformat(stored["day"])
+            day_row = [float(value) for value in stored.get("day_row", [])]
+            if len(day_row) == ROW_WIDTH:
+                rolling.day_row = day_row
+        except (KeyError, TypeError, ValueError):
+            return cls()
+        return rolling
+
+
+def period_start(day: date, period: str) -> date:
+    if period == PERIOD_MONTH:
+        return day.replace(day=1)
+    if period == PERIOD_YEAR:
+        return day.replace(month=1, day=1)
+    return day
+
+
+def _next_period_start(start: date, period: str) -> date:
+    if period == PERIOD_MONTH:
+        return (start + timedelta(days=32)).replace(day=1)
+    if period == PERIOD_YEAR:
+        return start.replace(year=start.year + 1)
+    return start + timedelta(days=1)
+
+
+def _row_values(row: list[float], period: str) -> dict[str, float]:
+    produced, used = row[0], row[1]
+    values = {
+        f"{PERIOD_PRODUCED}_{period}": round(produced, 3),
+        f"{PERIOD_USED}_{period}": round(used, 3),
+    }
+    for index, channel in enumerate(COP_CHANNELS):
+        values[f"{channel}_{period}"] = cop(row[2 * index], row[2 * index + 1])
+    return values
+
+
+# Produced/used of the current and the last calendar day, month and year in
+# local time, updated with every processed hour.
+class CalendarRollup:
+    def __init__(self) -> None:
+        self.last_hour: datetime | None = None
+        self.start: dict[str, date | None] = {period: None for period in CALENDAR_PERIODS}
+        self.current = {period: [0.0] * ROW_WIDTH for period in CALENDAR_PERIODS}
+        self.previous = {period: [0.0] * ROW_WIDTH for period in CALENDAR_PERIODS}
+
+    def add_hour(self, hour_end: datetime, row: list[float], time_zone: tzinfo) -> None:
+        if self.last_hour is not None and hour_end <= self.last_hour:
+            return
+        day = (hour_end - timedelta(hours=1)).astimezone(time_zone).date()
+        for period in CALENDAR_PERIODS:
+            start = period_start(day, period)
+            old_start = self.start[period]
+            if start != old_start:
+                if old_start is not None and start == _next_period_start(old_start, period):
+                    self.previous[period] = self.current[period]
+                else:
+                    # The last period was never processed: nothing is known of it.
+                    self.previous[period] = [0.0] * ROW_WIDTH
+                self.current[period] = [0.0] * ROW_WIDTH
+                self.start[period] = start
+            current = self.current[period]
+            for i in range(ROW_WIDTH):
+                current[i] += row[i]
+        self.last_hour = hour_end
+
+    def values(self) -> dict[str, float]:
+        # Current periods under their sensor keys, the last ones with "_previous".
+        values = {}
+        for period in CALENDAR_PERIODS:
+            values.update(_row_values(self.current[period], period))
+            values.update(
+                {
+                    f"{key}_previous": value
+                    for key, value in _row_values(self.previous[period], period).items()
+                }
+            )
+        return values
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "last_hour": self.last_hour.isoformat() if self.last_hour else None,
+            "start": {
+                period: start.isoformat() if start else None
+                for period, start in self.start.items()
+            },
+            "current": {period: list(row) for period, row in self.current.items()},
+            "previous": {period: list(row) for period, row in self.previous.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, stored: dict[str, Any] | None) -> CalendarRollup:
+        rollup = cls()
+        if not stored:
+            return rollup
+        try:
+            if stored.get("last_hour"):
+                rollup.last_hour = datetime.fromisoformat(stored["last_hour"])
+            for period in CALENDAR_PERIODS:
+                start = stored["start"].get(period)
+                rollup.start[period] = date.fromisoformat(start) if start else None
+                for name in ("current", "previous"):
+                    row = [float(value) for value in stored[name][period]]
+                    if len(row) != ROW_WIDTH:
+                        raise ValueError("row size mismatch")
+                    getattr(rollup, name)[period] = row
+        except (KeyError, TypeError, ValueError):
+            return cls()
+        return rollup
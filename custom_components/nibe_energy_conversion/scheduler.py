@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from collections.abc import Callable, Mapping
+from datetime import datetime
+from types import MappingProxyType
+
+from homeassistant.config_entries import (
+    SIGNAL_CONFIG_ENTRY_CHANGED,
+    ConfigEntry,
+    ConfigEntryChange,
+)
+from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_call_later, async_track_time_change
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    COP_TOTAL,
+    DOMAIN,
+    FLEET_COP_24H,
+    FLEET_COP_SEASONAL,
+    FLEET_PRODUCED,
+    FLEET_USED,
+    ROLLING_WINDOW_24H,
+    ROLLING_WINDOW_SEASONAL,
+    SUM_PRODUCED,
+    SUM_USED,
+)
+from .coordinator import NibeEnergyCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Integrations are still settling when HA reports it has started; the
+# run-on-start tick and the catch-up wait this long so they don't add to it.
+START_TICK_DELAY = 60
+
+
+# One time listener per distinct update minute for all config entries, so each
+# batch of ticks runs together and the fleet aggregate is derived once per batch.
+class NibeEnergyScheduler:
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._coordinators: dict[str, NibeEnergyCoordinator] = {}
+        self._unsub_minutes: dict[int, CALLBACK_TYPE] = {}
+        self._unsub_start: CALLBACK_TYPE | None = None
+        self._listeners: list[CALLBACK_TYPE] = []
+        # Entries with the fleet option on, in setup order; the first one hosts
+        # the fleet entities, so they exist once however many entries ask for them.
+        self._fleet_platforms: dict[str, Callable[[], None]] = {}
+        self._fleet_host: str | None = None
+        self.fleet: Mapping[str, float] = MappingProxyType({})
+        self.fleet_size = 0
+        self.fleet_loaded = False
+        self.fleet_members: frozenset[str] = frozenset()
+
+        if not hass.is_running:
+            self._unsub_start = hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_STARTED, self._async_on_start
+            )
+        # Removing or disabling an entry changes the fleet without a tick.
+        self._unsub_entries = async_dispatcher_connect(
+            hass, SIGNAL_CONFIG_ENTRY_CHANGED, self._async_on_entry_changed
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._coordinators
+
+    @callback
+    def async_add_coordinator(self, coordinator: NibeEnergyCoordinator) -> None:
+        self._coordinators[coordinator.entry.entry_id] = coordinator
+        self.async_reschedule()
+        self._update_fleet()
+        if not coordinator.loaded:
+            coordinator.entry.async_create_background_task(
+                self.hass,
+                self._async_update_fleet_when_loaded(coordinator),
+                f"{DOMAIN} fleet {coordinator.entry.entry_id}",
+            )
+
+    @callback
+    def async_remove_coordinator(self, entry_id: str) -> None:
+        self._coordinators.pop(entry_id, None)
+        self._fleet_platforms.pop(entry_id, None)
+        if self._fleet_host == entry_id:
+            # Its platform is already unloaded; the next entry takes the entities over.
+            self._fleet_host = None
+            self._async_host_fleet()
+        self.async_reschedule()
+        self._update_fleet()
+
+    @callback
+    def async_add_fleet_platform(self, entry_id: str, add_entities: Callable[[], None]) -> None:
+        self._fleet_platforms[entry_id] = add_entities
+        self._async_host_fleet()
+
+    @callback
+    def _async_host_fleet(self) -> None:
+        if self._fleet_host is not None or not self._fleet_platforms:
+            return
+        self._fleet_host, add_entities = next(iter(self._fleet_platforms.items()))
+        add_entities()
+
+    @callback
+    def async_reschedule(self) -> None:
+        minutes = {coordinator.update_minute for coordinator in self._coordinators.values()}
+        for minute in list(self._unsub_minutes):
+            if minute not in minutes:
+                self._unsub_minutes.pop(minute)()
+        for minute in minutes:
+            if minute not in self._unsub_minutes:
+                self._unsub_minutes[minute] = async_track_time_change(
+                    self.hass, self._async_on_time, minute=minute, second=0
+                )
+
+    @callback
+    def async_shutdown(self) -> None:
+        while self._unsub_minutes:
+            self._unsub_minutes.popitem()[1]()
+        if self._unsub_start is not None:
+            self._unsub_start()
+            self._unsub_start = None
+        self._unsub_entries()
+
+    async def _async_on_time(self, now: datetime) -> None:
+        batch = [c for c in self._coordinators.values() if c.update_minute == now.minute]
+        jitter = max((c.tick_jitter for c in batch), default=0)
+        if jitter > 0:
+            # Spread the recorder/disk work of many installs across the minute.
+            await asyncio.sleep(random.uniform(0, jitter))
+            batch = [c for c in batch if c.entry.entry_id in self._coordinators]
+        await self._async_run_batch([c.async_process_tick() for c in batch], batch)
+
+    async def _async_update_fleet_when_loaded(self, coordinator: NibeEnergyCoordinator) -> None:
+        if await coordinator.async_wait_loaded():
+            self._update_fleet()
+
+    @callback
+    def _async_on_entry_changed(self, change: ConfigEntryChange, entry: ConfigEntry) -> None:
+        if entry.domain == DOMAIN:
+            self._update_fleet()
+
+    @callback
+    def _async_on_start(self, event: Event) -> None:
+        self._unsub_start = async_call_later(
+            self.hass, START_TICK_DELAY, self._async_on_start_delay
+        )
+
+    async def _async_on_start_delay(self, now: datetime) -> None:
+        self._unsub_start = None
+        minute_now = dt_util.now().minute
+        batch = list(self._coordinators.values())
+        jobs = []
+        for coordinator in batch:
+            if coordinator.run_on_start and minute_now >= coordinator.update_minute:
+                jobs.append(coordinator.async_process_tick())
+            else:
+                # Hours missed while HA was down are still applied right away.
+                jobs.append(coordinator.async_catch_up())
+        await self._async_run_batch(jobs, batch)
+
+    async def _async_run_batch(self, jobs: list, batch: list[NibeEnergyCoordinator]) -> None:
+        if not jobs:
+            return
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for coordinator, result in zip(batch, results):
+            if isinstance(result, Exception):
+                _LOGGER.error(
+                    "Hourly processing failed for %s: %s", coordinator.entry.title, result
+                )
+        self._update_fleet()
+
+    @callback
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> Callable[[], None]:
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _update_fleet(self) -> None:
+        produced = used = 0.0
+        produced_24h = used_24h = 0.0
+        produced_seasonal = used_seasonal = 0.0
+        for coordinator in self._coordinators.values():
+            produced += coordinator.get_sum(SUM_PRODUCED)
+            used += coordinator.get_sum(SUM_USED)
+            hour_produced, hour_used = coordinator.rolling.channel_energy(ROLLING_WINDOW_24H, COP_TOTAL)
+            produced_24h += hour_produced
+            used_24h += hour_used
+            day_produced, day_used = coordinator.rolling.channel_energy(
+                ROLLING_WINDOW_SEASONAL, COP_TOTAL
+            )
+            produced_seasonal += day_produced
+            used_seasonal += day_used
+
+        self.fleet_size = len(self._coordinators)
+        # Entries still loading, reloading or failed would count as zero (and
+        # look like a meter reset); the fleet waits until every enabled entry is in.
+        self.fleet_members = frozenset(
+            entry.entry_id
+            for entry in self.hass.config_entries.async_entries(DOMAIN)
+            if entry.disabled_by is None
+        )
+        self.fleet_loaded = bool(self.fleet_members) and all(
+            entry_id in self._coordinators and self._coordinators[entry_id].loaded
+            for entry_id in self.fleet_members
+        )
+        self.fleet = MappingProxyType(
+            {
+                FLEET_PRODUCED: round(produced, 3),
+                FLEET_USED: round(used, 3),
+                FLEET_COP_24H: round(produced_24h / used_24h, 2) if used_24h > 0 else 0.0,
+                FLEET_COP_SEASONAL: (
+                    round(produced_seasonal / used_seasonal, 2) if used_seasonal > 0 else 0.0
+                ),
+            }
+        )
+        for update_callback in list(self._listeners):
+            update_callback()
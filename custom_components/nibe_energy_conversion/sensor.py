@@ -1,27 +1,57 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from datetime import datetime
 
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorDeviceClass,
     SensorEntity,
     SensorEntityDescription,
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.restore_state import ExtraStoredData, RestoreEntity
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
 from .const import (
+    CONF_FLEET_SENSORS,
     COP_COOLING,
     COP_HEATING,
     COP_HOT_WATER,
+    COP_LIVE,
     COP_TOTAL,
+    DATA_SCHEDULER,
+    DEFAULT_FLEET_SENSORS,
+    DIAG_INPUT_AGE,
+    DIAG_SETUP_DURATION,
+    DIAG_SKIPPED_TICKS,
+    DIAG_STORE_SAVE_DURATION,
+    DIAG_TICK_DURATION,
+    DIAG_UNAVAILABLE_INPUTS,
     DOMAIN,
+    FLEET_COP_24H,
+    FLEET_COP_SEASONAL,
+    FLEET_PRODUCED,
+    FLEET_USED,
+    PERIOD_DAY,
+    PERIOD_MONTH,
+    PERIOD_PRODUCED,
+    PERIOD_USED,
+    PERIOD_YEAR,
+    ROLLING_WINDOW_7D,
+    ROLLING_WINDOW_24H,
+    ROLLING_WINDOW_30D,
+    ROLLING_WINDOW_SEASONAL,
     SUM_PRODUCED,
+    SUM_PRODUCED_LIVE,
     SUM_USED,
+    SUM_USED_LIVE,
     TOTAL_AUX_USED_HEATING,
     TOTAL_AUX_USED_HOT_WATER,
     TOTAL_PROD_COOLING,
@@ -32,12 +62,15 @@ from .const import (
     TOTAL_USED_HOT_WATER,
 )
 from .coordinator import NibeEnergyCoordinator
+from .rolling import CALENDAR_PERIODS, COP_CHANNELS, ROLLING_WINDOWS
+from .scheduler import NibeEnergyScheduler
 
 
 @dataclass(frozen=True, kw_only=True)
 class NibeEnergySensorDescription(SensorEntityDescription):
     data_key: str
     kind: str
+    period: str | None = None
 
 
 SENSOR_DESCRIPTIONS = [
@@ -181,6 +214,239 @@ SENSOR_DESCRIPTIONS = [
         icon="mdi:alpha-c-circle",
         state_class=SensorStateClass.MEASUREMENT,
     ),
+    # Provisional values: they include the hour in progress and are replaced by
+    # the hourly aggregation, so they are kept out of long-term statistics.
+    NibeEnergySensorDescription(
+        key=SUM_PRODUCED_LIVE,
+        translation_key=SUM_PRODUCED_LIVE,
+        data_key=SUM_PRODUCED_LIVE,
+        kind="live",
+        name="Produced total (live estimate)",
+        native_unit_of_measurement="kWh",
+        device_class=SensorDeviceClass.ENERGY,
+    ),
+    NibeEnergySensorDescription(
+        key=SUM_USED_LIVE,
+        translation_key=SUM_USED_LIVE,
+        data_key=SUM_USED_LIVE,
+        kind="live",
+        name="Used total (live estimate)",
+        native_unit_of_measurement="kWh",
+        device_class=SensorDeviceClass.ENERGY,
+    ),
+    NibeEnergySensorDescription(
+        key=COP_LIVE,
+        translation_key=COP_LIVE,
+        data_key=COP_LIVE,
+        kind="live",
+        name="COP (current hour estimate)",
+        native_unit_of_measurement="COP",
+        icon="mdi:alpha-c-circle",
+    ),
+]
+
+
+COP_CHANNEL_NAMES = {
+    COP_TOTAL: "COP total",
+    COP_HEATING: "COP heating",
+    COP_HOT_WATER: "COP hot water",
+    COP_COOLING: "COP cooling",
+}
+
+ROLLING_WINDOW_NAMES = {
+    ROLLING_WINDOW_24H: "24 hours",
+    ROLLING_WINDOW_7D: "7 days",
+    ROLLING_WINDOW_30D: "30 days",
+    ROLLING_WINDOW_SEASONAL: "seasonal",
+}
+
+# Only the overall rolling COP is enabled by default; per-channel ones are opt-in.
+SENSOR_DESCRIPTIONS += [
+    NibeEnergySensorDescription(
+        key=f"{channel}_{window}",
+        translation_key=f"{channel}_{window}",
+        data_key=f"{channel}_{window}",
+        kind="rolling_cop",
+        name=f"{COP_CHANNEL_NAMES[channel]} ({ROLLING_WINDOW_NAMES[window]})",
+        native_unit_of_measurement="COP",
+        icon="mdi:alpha-c-circle",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_registry_enabled_default=channel == COP_TOTAL,
+    )
+    for window in ROLLING_WINDOWS
+    for channel in COP_CHANNELS
+]
+
+
+PERIOD_NAMES = {
+    PERIOD_DAY: "today",
+    PERIOD_MONTH: "this month",
+    PERIOD_YEAR: "this year",
+}
+
+PERIOD_ENERGY_NAMES = {
+    PERIOD_PRODUCED: "Produced energy",
+    PERIOD_USED: "Used energy",
+}
+
+# Calendar periods in local time; they replace utility_meter helpers on the sums.
+SENSOR_DESCRIPTIONS += [
+    NibeEnergySensorDescription(
+        key=f"{metric}_{period}",
+        translation_key=f"{metric}_{period}",
+        data_key=f"{metric}_{period}",
+        kind="period",
+        period=period,
+        name=f"{PERIOD_ENERGY_NAMES[metric]} ({PERIOD_NAMES[period]})",
+        native_unit_of_measurement="kWh",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL,
+    )
+    for period in CALENDAR_PERIODS
+    for metric in PERIOD_ENERGY_NAMES
+]
+SENSOR_DESCRIPTIONS += [
+    NibeEnergySensorDescription(
+        key=f"{channel}_{period}",
+        translation_key=f"{channel}_{period}",
+        data_key=f"{channel}_{period}",
+        kind="period_cop",
+        period=period,
+        name=f"{COP_CHANNEL_NAMES[channel]} ({PERIOD_NAMES[period]})",
+        native_unit_of_measurement="COP",
+        icon="mdi:alpha-c-circle",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_registry_enabled_default=channel == COP_TOTAL,
+    )
+    for period in CALENDAR_PERIODS
+    for channel in COP_CHANNELS
+]
+
+
+# Instrumentation of the hourly tick, disabled by default.
+SENSOR_DESCRIPTIONS += [
+    NibeEnergySensorDescription(
+        key=DIAG_TICK_DURATION,
+        translation_key=DIAG_TICK_DURATION,
+        data_key=DIAG_TICK_DURATION,
+        kind="diagnostic",
+        name="Tick duration",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    NibeEnergySensorDescription(
+        key=DIAG_STORE_SAVE_DURATION,
+        translation_key=DIAG_STORE_SAVE_DURATION,
+        data_key=DIAG_STORE_SAVE_DURATION,
+        kind="diagnostic",
+        name="Store save duration",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    NibeEnergySensorDescription(
+        key=DIAG_UNAVAILABLE_INPUTS,
+        translation_key=DIAG_UNAVAILABLE_INPUTS,
+        data_key=DIAG_UNAVAILABLE_INPUTS,
+        kind="diagnostic",
+        name="Unavailable inputs",
+        icon="mdi:alert-circle-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    NibeEnergySensorDescription(
+        key=DIAG_INPUT_AGE,
+        translation_key=DIAG_INPUT_AGE,
+        data_key=DIAG_INPUT_AGE,
+        kind="diagnostic",
+        name="Oldest input age",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    NibeEnergySensorDescription(
+        key=DIAG_SKIPPED_TICKS,
+        translation_key=DIAG_SKIPPED_TICKS,
+        data_key=DIAG_SKIPPED_TICKS,
+        kind="diagnostic",
+        name="Skipped ticks",
+        icon="mdi:debug-step-over",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    NibeEnergySensorDescription(
+        key=DIAG_SETUP_DURATION,
+        translation_key=DIAG_SETUP_DURATION,
+        data_key=DIAG_SETUP_DURATION,
+        kind="diagnostic",
+        name="Setup duration",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+]
+
+# Kinds that show their last state while the stored state is still loading.
+# Period energy is left unavailable instead: its last_reset is not restored.
+RESTORE_KINDS = ("total", "sum", "cop", "rolling_cop", "period_cop", "live")
+
+
+# Aggregates over every config entry. They exist once per domain, hosted by the
+# scheduler on the platform of one of the entries with the fleet option on.
+# The energy totals are TOTAL, not TOTAL_INCREASING: removing an entry lowers
+# them, so last_reset moves whenever the set of summed entries changes.
+FLEET_SENSOR_DESCRIPTIONS = [
+    NibeEnergySensorDescription(
+        key=FLEET_PRODUCED,
+        translation_key=FLEET_PRODUCED,
+        data_key=FLEET_PRODUCED,
+        kind="fleet",
+        name="Fleet produced total (kWh)",
+        native_unit_of_measurement="kWh",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL,
+    ),
+    NibeEnergySensorDescription(
+        key=FLEET_USED,
+        translation_key=FLEET_USED,
+        data_key=FLEET_USED,
+        kind="fleet",
+        name="Fleet used total (kWh)",
+        native_unit_of_measurement="kWh",
+        device_class=SensorDeviceClass.ENERGY,
+        state_class=SensorStateClass.TOTAL,
+    ),
+    NibeEnergySensorDescription(
+        key=FLEET_COP_24H,
+        translation_key=FLEET_COP_24H,
+        data_key=FLEET_COP_24H,
+        kind="fleet",
+        name="Fleet COP (24 hours)",
+        native_unit_of_measurement="COP",
+        icon="mdi:alpha-c-circle",
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    NibeEnergySensorDescription(
+        key=FLEET_COP_SEASONAL,
+        translation_key=FLEET_COP_SEASONAL,
+        data_key=FLEET_COP_SEASONAL,
+        kind="fleet",
+        name="Fleet COP (seasonal)",
+        native_unit_of_measurement="COP",
+        icon="mdi:alpha-c-circle",
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
 ]
 
 
@@ -188,13 +454,37 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities
 ) -> None:
     coordinator: NibeEnergyCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
-    async_add_entities(
+    entities: list[SensorEntity] = [
         NibeEnergySensor(coordinator, entry, description) for description in SENSOR_DESCRIPTIONS
-    )
+    ]
+    async_add_entities(entities)
 
+    # Fleet sensors used to be added per entry; drop those registry entries.
+    registry = er.async_get(hass)
+    for description in FLEET_SENSOR_DESCRIPTIONS:
+        entity_id = registry.async_get_entity_id(
+            "sensor", DOMAIN, f"{entry.entry_id}_{description.key}"
+        )
+        if entity_id is not None:
+            registry.async_remove(entity_id)
 
-class NibeEnergySensor(CoordinatorEntity[NibeEnergyCoordinator], SensorEntity):
+    if entry.options.get(CONF_FLEET_SENSORS, DEFAULT_FLEET_SENSORS):
+        scheduler: NibeEnergyScheduler = hass.data[DOMAIN][DATA_SCHEDULER]
+
+        @callback
+        def async_add_fleet_entities() -> None:
+            async_add_entities(
+                NibeFleetSensor(scheduler, description)
+                for description in FLEET_SENSOR_DESCRIPTIONS
+            )
+
+        scheduler.async_add_fleet_platform(entry.entry_id, async_add_fleet_entities)
+
+
+class NibeEnergySensor(CoordinatorEntity[NibeEnergyCoordinator], RestoreSensor):
     _attr_has_entity_name = True
+    _written_state = None
+    _restored_value = None
 
     def __init__(
         self,
@@ -209,21 +499,192 @@ class NibeEnergySensor(CoordinatorEntity[NibeEnergyCoordinator], SensorEntity):
             identifiers={(DOMAIN, entry.entry_id)},
             name="Energy Conversion",
         )
+        if coordinator.external_statistics and description.kind in ("total", "sum"):
+            # Hourly statistics come from the coordinator instead; without a
+            # state_class the recorder stops compiling mis-timed ones from states.
+            self._attr_state_class = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        if not self.coordinator.loaded and self.entity_description.kind in RESTORE_KINDS:
+            # Restored states are already in memory, unlike the store file.
+            last = await self.async_get_last_sensor_data()
+            if last is not None:
+                self._restored_value = last.native_value
+        # The platform writes the initial state right after this.
+        self._written_state = self._state_key()
+        if self.entity_description.kind == "live":
+            self.async_on_remove(
+                self.coordinator.async_add_live_listener(self._handle_coordinator_update)
+            )
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Most sensors keep their value across ticks (cooling in winter, COP with
+        # no usage); skip the state write only when neither value nor attributes moved.
+        state_key = self._state_key()
+        if state_key == self._written_state:
+            return
+        self._written_state = state_key
+        self.async_write_ha_state()
+
+    def _state_key(self):
+        if not self.available:
+            return None
+        if self._restored_value is not None and not self.coordinator.loaded:
+            return ("restored", self._restored_value)
+        if self.entity_description.kind == "diagnostic":
+            return (self.native_value, tuple(self.extra_state_attributes.items()))
+        # last_processed_hour_end moves every tick even when the value does not.
+        attributes = self.coordinator.snapshot.attributes
+        if self.entity_description.kind == "live":
+            return (self.native_value, attributes, self.coordinator.get_live_source())
+        if self.entity_description.kind in ("period", "period_cop"):
+            return (self.native_value, attributes, self._last_period())
+        return (self.native_value, attributes)
+
+    def _last_period(self):
+        return self.coordinator.snapshot.values.get(f"{self.entity_description.data_key}_previous")
+
+    @property
+    def available(self) -> bool:
+        if (
+            not self.coordinator.loaded
+            and self._restored_value is None
+            and self.entity_description.kind != "diagnostic"
+        ):
+            return False
+        return super().available
 
     @property
     def native_value(self):
-        if self.entity_description.kind == "total":
-            return self.coordinator.get_total(self.entity_description.data_key)
-        if self.entity_description.kind == "sum":
-            return self.coordinator.get_sum(self.entity_description.data_key)
-        return self.coordinator.get_cop_kind(self.entity_description.data_key)
+        key = self.entity_description.data_key
+        if self._restored_value is not None and not self.coordinator.loaded:
+            return self._restored_value
+        if self.entity_description.kind == "live":
+            return self.coordinator.get_live(key)
+        if self.entity_description.kind == "cop":
+            return self.coordinator.get_cop_kind(key)
+        if self.entity_description.kind == "diagnostic":
+            return self.coordinator.metrics.sensor_value(key)
+        return self.coordinator.snapshot.values.get(key, 0.0)
 
     @property
-    def extra_state_attributes(self):
-        last_processed = self.coordinator.data.last_processed
-        if not last_processed:
+    def last_reset(self):
+        if self.entity_description.kind != "period":
             return None
-        dt = dt_util.parse_datetime(last_processed)
-        if dt is None:
+        start = self.coordinator.periods.start[self.entity_description.period]
+        return dt_util.start_of_local_day(start) if start is not None else None
+
+    @property
+    def extra_state_attributes(self):
+        kind = self.entity_description.kind
+        if kind == "diagnostic":
+            return self.coordinator.metrics.sensor_attributes(self.entity_description.data_key)
+        attrs = self.coordinator.snapshot.attributes
+        if kind in ("period", "period_cop"):
+            return {**(attrs or {}), "last_period": self._last_period()}
+        if attrs is None or kind != "live":
+            return attrs
+        return {**attrs, "estimate_source": self.coordinator.get_live_source()}
+
+
+@dataclass
+class NibeFleetExtraStoredData(ExtraStoredData):
+    members: frozenset[str] | None
+    last_reset: datetime | None
+
+    def as_dict(self) -> dict:
+        return {
+            "members": sorted(self.members) if self.members is not None else None,
+            "last_reset": self.last_reset.isoformat() if self.last_reset else None,
+        }
+
+    @classmethod
+    def from_dict(cls, restored: dict) -> NibeFleetExtraStoredData:
+        members = restored.get("members")
+        last_reset = restored.get("last_reset")
+        return cls(
+            members=frozenset(members) if members is not None else None,
+            last_reset=dt_util.parse_datetime(last_reset) if last_reset else None,
+        )
+
+
+class NibeFleetSensor(SensorEntity, RestoreEntity):
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _written_state = None
+    # Entries summed into the published value, and when that set last changed.
+    _members: frozenset[str] | None = None
+    _last_reset: datetime | None = None
+
+    def __init__(
+        self,
+        scheduler: NibeEnergyScheduler,
+        description: NibeEnergySensorDescription,
+    ) -> None:
+        self.scheduler = scheduler
+        self.entity_description = description
+        self._attr_unique_id = f"{DOMAIN}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, f"{DOMAIN}_fleet")},
+            name="Energy Conversion fleet",
+        )
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        last = await self.async_get_last_extra_data()
+        if last is not None:
+            restored = NibeFleetExtraStoredData.from_dict(last.as_dict())
+            self._members, self._last_reset = restored.members, restored.last_reset
+        self._sync_members()
+        # The platform writes the initial state right after this.
+        self._written_state = self._state_key()
+        self.async_on_remove(self.scheduler.async_add_listener(self._handle_fleet_update))
+
+    @property
+    def extra_restore_state_data(self) -> NibeFleetExtraStoredData:
+        return NibeFleetExtraStoredData(members=self._members, last_reset=self._last_reset)
+
+    def _sync_members(self) -> None:
+        # Only a complete fleet is published, so membership is compared then.
+        if not self.scheduler.fleet_loaded:
+            return
+        if self.scheduler.fleet_members != self._members:
+            self._members = self.scheduler.fleet_members
+            self._last_reset = dt_util.utcnow()
+
+    @callback
+    def _handle_fleet_update(self) -> None:
+        self._sync_members()
+        state_key = self._state_key()
+        if state_key == self._written_state:
+            return
+        self._written_state = state_key
+        self.async_write_ha_state()
+
+    def _state_key(self):
+        return (
+            self.scheduler.fleet_loaded,
+            self.native_value,
+            self.scheduler.fleet_size,
+            self.last_reset,
+        )
+
+    @property
+    def available(self) -> bool:
+        return self.scheduler.fleet_loaded
+
+    @property
+    def native_value(self):
+        return self.scheduler.fleet.get(self.entity_description.data_key, 0.0)
+
+    @property
+    def last_reset(self):
+        if self.entity_description.state_class != SensorStateClass.TOTAL:
             return None
-        return {"last_processed_hour_end": dt_util.as_local(dt).isoformat()}
+        return self._last_reset
+
+    @property
+    def extra_state_attributes(self):
+        return {"entries": self.scheduler.fleet_size}
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import logging
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_CONFIG_ENTRY_ID
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, SERVICE_REBUILD_HISTORY, SERVICE_VERIFY_HISTORY
+from .coordinator import NibeEnergyCoordinator
+from .rebuild import (
+    DEFAULT_CHUNK_DAYS,
+    async_rebuild_history,
+    async_verify_history,
+    notify_rebuild,
+)
+from .verify import VERIFY_TOLERANCE
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_SINCE = "since"
+ATTR_CHUNK_DAYS = "chunk_days"
+ATTR_FULL = "full"
+ATTR_TOLERANCE = "tolerance"
+
+REBUILD_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_SINCE): cv.datetime,
+        vol.Optional(ATTR_CHUNK_DAYS, default=DEFAULT_CHUNK_DAYS): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=365)
+        ),
+    }
+)
+
+VERIFY_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_FULL, default=False): cv.boolean,
+        vol.Optional(ATTR_TOLERANCE, default=VERIFY_TOLERANCE): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+
+
+def _coordinator(hass: HomeAssistant, entry_id: str) -> NibeEnergyCoordinator:
+    data = hass.data.get(DOMAIN, {}).get(entry_id)
+    if not data:
+        raise ServiceValidationError(f"Config entry {entry_id} is not a loaded {DOMAIN} entry")
+    return data["coordinator"]
+
+
+def async_register_services(hass: HomeAssistant) -> None:
+    async def _async_rebuild_history(call: ServiceCall) -> None:
+        coordinator = _coordinator(hass, call.data[ATTR_CONFIG_ENTRY_ID])
+        if coordinator.rebuild_lock.locked():
+            raise HomeAssistantError("A history rebuild is already running for this entry")
+        # Acquiring a free lock does not yield, so no second call can slip in.
+        await coordinator.rebuild_lock.acquire()
+
+        since = call.data.get(ATTR_SINCE)
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=dt_util.get_default_time_zone())
+
+        async def _run() -> None:
+            try:
+                await async_rebuild_history(hass, coordinator, since, call.data[ATTR_CHUNK_DAYS])
+            except HomeAssistantError as err:
+                _LOGGER.error("History rebuild failed: %s", err)
+                notify_rebuild(hass, coordinator, f"History rebuild failed: {err}")
+            except Exception:
+                _LOGGER.exception("History rebuild failed")
+                notify_rebuild(hass, coordinator, "History rebuild failed, see the log.")
+            finally:
+                coordinator.rebuild_lock.release()
+
+        # Runs in the background so the service call returns at once; progress is
+        # reported through a persistent notification.
+        coordinator.entry.async_create_background_task(
+            hass, _run(), f"{DOMAIN} rebuild_history {coordinator.entry.entry_id}"
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_REBUILD_HISTORY,
+        _async_rebuild_history,
+        schema=REBUILD_HISTORY_SCHEMA,
+    )
+
+    async def _async_verify_history(call: ServiceCall) -> ServiceResponse:
+        # Without an entry every loaded entry is checked, one after another.
+        entry_id = call.data.get(ATTR_CONFIG_ENTRY_ID)
+        if entry_id is not None:
+            coordinators = [_coordinator(hass, entry_id)]
+        else:
+            coordinators = [
+                data["coordinator"]
+                for data in hass.data.get(DOMAIN, {}).values()
+                if isinstance(data, dict) and "coordinator" in data
+            ]
+
+        entries: dict[str, dict] = {}
+        for coordinator in coordinators:
+            entry_id = coordinator.entry.entry_id
+            # Shares the rebuild lock: a check during a rebuild would only see half of it.
+            if coordinator.rebuild_lock.locked():
+                entries[entry_id] = {"error": "A history rebuild or check is running"}
+                continue
+            async with coordinator.rebuild_lock:
+                try:
+                    entries[entry_id] = await async_verify_history(
+                        hass, coordinator, call.data[ATTR_FULL], call.data[ATTR_TOLERANCE]
+                    )
+                except HomeAssistantError as err:
+                    _LOGGER.error("History check of %s failed: %s", coordinator.entry.title, err)
+                    entries[entry_id] = {"error": str(err)}
+        return {"entries": entries}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_VERIFY_HISTORY,
+        _async_verify_history,
+        schema=VERIFY_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+from .energy import WH_PER_KWH, to_kwh, to_wh
+
+# Per-day consistency check of the output statistics against the inputs, shared
+# by the verify_history service and the offline verify script. Like energy.py it
+# only imports the kernel, so the script loads it without Home Assistant.
+
+# kWh. Both sides count whole Wh; this leaves room for statistics written by
+# versions that rounded the kWh totals instead of the hourly inputs.
+VERIFY_TOLERANCE = 0.001
+VERIFY_STATE_VERSION = 1
+# Digits kept in a day signature: enough to see any real change, few enough that
+# a rewrite of identical rows gives the same signature.
+SIGNATURE_DIGITS = 4
+
+
+def signature(values: Iterable[float | None]) -> list[float | None]:
+    return [None if value is None else round(float(value), SIGNATURE_DIGITS) for value in values]
+
+
+def days_to_check(
+    signatures: Mapping[str, list], days: Mapping[str, dict], full: bool = False
+) -> list[str]:
+    # New and changed days, days that diverged last time, and the day after each
+    # changed one: its first hour is compared with the last row of the day before.
+    order = sorted(signatures)
+    check = set()
+    for index, day in enumerate(order):
+        cached = days.get(day)
+        changed = full or cached is None or cached.get("sig") != signatures[day]
+        if changed or cached.get("diverged"):
+            check.add(day)
+        if changed and index + 1 < len(order):
+            check.add(order[index + 1])
+    return [day for day in order if day in check]
+
+
+def day_ranges(days: Sequence[str], is_next, max_days: int) -> list[list[str]]:
+    # Runs of consecutive days, at most max_days long, so each is read in one go.
+    ranges: list[list[str]] = []
+    for day in days:
+        if ranges and len(ranges[-1]) < max_days and is_next(ranges[-1][-1], day):
+            ranges[-1].append(day)
+        else:
+            ranges.append([day])
+    return ranges
+
+
+def first_divergence(
+    hours: Iterable[tuple[Any, Mapping[str, float]]],
+    recorded: Mapping[str, Mapping[Any, float]],
+    previous: Mapping[str, float | None],
+    parts_by_key: Mapping[str, tuple[str, ...]],
+    tolerance: float = VERIFY_TOLERANCE,
+) -> dict[str, Any] | None:
+    # hours: (hour, inputs) in time order. recorded: output key -> {hour: sum},
+    # keyed by the input hour each row carries. previous: output key -> the sum
+    # just before the first hour, or None when there is none to compare with.
+    # An hour without a row (HA was down) is carried by the next row. Compared
+    # in Wh, the unit the totals are accumulated in.
+    last = {key: None if value is None else to_wh(value) for key, value in previous.items()}
+    pending = {key: 0 for key in parts_by_key}
+    limit = tolerance * WH_PER_KWH
+    for hour, inputs in hours:
+        for key, parts in parts_by_key.items():
+            for part in parts:
+                pending[key] += to_wh(inputs.get(part, 0.0))
+            value = recorded.get(key, {}).get(hour)
+            if value is None:
+                continue
+            before = last.get(key)
+            expected = pending[key]
+            last[key] = to_wh(value)
+            pending[key] = 0
+            if before is not None and abs(last[key] - before - expected) > limit:
+                recorded_change = last[key] - before
+                return {
+                    "hour": hour,
+                    "key": key,
+                    "expected": to_kwh(expected),
+                    "recorded": to_kwh(recorded_change),
+                    "delta": to_kwh(recorded_change - expected),
+                }
+    return None
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import rebuild_history_stats_and_storage as rebuild
+
+energy = rebuild.energy
+
+# =========================
+# Defaults (edit if needed)
+# =========================
+CHUNK_DAYS_DEFAULT = 30
+HOUR_S = rebuild.HOUR_S
+
+# Integration total key per rebuild input key (aux_heat -> aux_used_heating_total)
+TOTAL_OF_INPUT = {in_key: total_key for total_key, in_key in rebuild.STORAGE_TOTAL_SOURCES.items()}
+
+# Exported columns, named after the integration's sensors: the energy of the
+# hour (prod_heating), the cumulative total after it (prod_heating_total) and
+# the COP of the hour (cop_heating). Rows are keyed by the UTC hour start of the
+# source statistics, like the recorder.
+OUTPUT_KEYS = list(energy.OUTPUT_PARTS)
+HOURLY_COLUMNS = [key.removesuffix("_total") for key in OUTPUT_KEYS]
+COP_COLUMNS = list(energy.COP_CHANNELS)
+COLUMNS = ["start_ts", *HOURLY_COLUMNS, *OUTPUT_KEYS, *COP_COLUMNS]
+
+SQLITE_TABLE = "hourly"
+CSV_PREFIX = "hourly_"
+CSV_COLUMNS = ["start", *COLUMNS]
+
+# =========================
+# Hourly rows
+# =========================
+def export_rows(src: rebuild.SourceSeries, totals: dict):
+    # The integration's per-hour kernel, so the cumulative columns round exactly
+    # like the total sensors do. The hour is counted in Wh too, so each hourly
+    # column is exactly the step of its total. Returns the rows and the totals
+    # (Wh) after the last one.
+    keys = [(TOTAL_OF_INPUT[in_key], col) for in_key, col in src.columns.items()]
+    rows = []
+    for i, ts in enumerate(src.timeline):
+        inputs = {total_key: col[i] for total_key, col in keys}
+        totals = energy.add_hour(totals, inputs)
+        cops = energy.cop_values(inputs)
+        rows.append((
+            int(ts),
+            *energy.output_values(energy.add_hour({}, inputs)).values(),
+            *energy.output_values(totals).values(),
+            *(cops[channel] for channel in COP_COLUMNS),
+        ))
+    return rows, totals
+
+def totals_of_row(row) -> dict:
+    # Back to the Wh totals the kernel accumulates; the columns hold whole Wh in kWh.
+    values = dict(zip(COLUMNS, row))
+    return {key: energy.to_wh(float(values[key])) for key in energy.TOTAL_KEYS}
+
+# =========================
+# SQLite side store
+# =========================
+class SqliteTarget:
+    # One row per hour under an INTEGER PRIMARY KEY: the start_ts index is the
+    # table itself, so range queries by time need nothing else.
+    name = "sqlite"
+
+    def __init__(self, path: str, full: bool):
+        self.path = path
+        self.con = sqlite3.connect(path, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        if full:
+            self.con.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+        cols = rebuild.table_cols(self.con.cursor(), SQLITE_TABLE)
+        if cols and cols != COLUMNS:
+            raise SystemExit(f"{path}: table '{SQLITE_TABLE}' has other columns; re-export with --full.")
+        defs = ", ".join(["start_ts INTEGER PRIMARY KEY", *(f"{c} REAL NOT NULL" for c in COLUMNS[1:])])
+        self.con.execute(f"CREATE TABLE IF NOT EXISTS {SQLITE_TABLE} ({defs})")
+        self.sql = f"INSERT INTO {SQLITE_TABLE} VALUES ({','.join(['?'] * len(COLUMNS))})"
+
+    def last_row(self):
+        return self.con.execute(f"SELECT * FROM {SQLITE_TABLE} ORDER BY start_ts DESC LIMIT 1").fetchone()
+
+    def write(self, rows: list) -> None:
+        with rebuild.write_transaction(self.con):
+            self.con.executemany(self.sql, rows)
+
+    def close(self) -> None:
+        self.con.close()
+
+# =========================
+# Monthly CSV partitions
+# =========================
+def csv_month(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m")
+
+class CsvTarget:
+    # hourly_YYYY-MM.csv per UTC month; a re-run appends to the newest file.
+    name = "csv"
+
+    def __init__(self, directory: str, full: bool):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if full:
+            for path in self.files():
+                path.unlink()
+
+    def files(self) -> list[Path]:
+        return sorted(self.dir.glob(f"{CSV_PREFIX}[0-9][0-9][0-9][0-9]-[0-9][0-9].csv"))
+
+    def last_row(self):
+        files = self.files()
+        if not files:
+            return None
+        last = None
+        with open(files[-1], newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            if next(reader, None) != CSV_COLUMNS:
+                raise SystemExit(f"{files[-1]}: unexpected header; re-export with --full.")
+            for last in reader:
+                pass
+        if last is None:
+            return None
+        return (int(last[1]), *(float(v) for v in last[2:]))
+
+    def write(self, rows: list) -> None:
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(csv_month(row[0]), []).append(row)
+        for month, month_rows in by_month.items():
+            path = self.dir / f"{CSV_PREFIX}{month}.csv"
+            new = not path.exists() or path.stat().st_size == 0
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(CSV_COLUMNS)
+                writer.writerows((rebuild.utc_iso(row[0]), *row) for row in month_rows)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self) -> None:
+        pass
+
+# =========================
+# Export
+# =========================
+@dataclass
+class ExportResult:
+    hours: int
+    chunks: int
+    first_ts: float | None
+    last_ts: float | None
+    seconds: float
+
+def source_range(con, inputs: dict):
+    cur = con.cursor()
+    mids = list(rebuild.resolve_input_meta_ids(cur, inputs))
+    cur.execute(
+        f"SELECT MIN(start_ts), MAX(start_ts) FROM statistics WHERE metadata_id IN ({','.join(['?']*len(mids))})",
+        tuple(mids),
+    )
+    first, last = (rebuild.parse_num(v) for v in cur.fetchone())
+    if first is None or last is None:
+        return None
+    return rebuild.floor_to(first, HOUR_S), rebuild.floor_to(last, HOUR_S)
+
+def resume_point(targets: list):
+    # Each target resumes after its own last row; reading restarts at the oldest of
+    # them, seeded with that row's totals, so every target gets the same numbers.
+    last_rows = {target.name: target.last_row() for target in targets}
+    last_ts = {name: row[0] if row else None for name, row in last_rows.items()}
+    if any(row is None for row in last_rows.values()):
+        return last_ts, None, {key: 0 for key in energy.TOTAL_KEYS}
+    start = min(last_rows.values(), key=lambda row: row[0])
+    return last_ts, start[0], totals_of_row(start)
+
+def export(con, inputs: dict, stats_cols, targets: list, chunk_days: int = CHUNK_DAYS_DEFAULT) -> ExportResult:
+    t0 = time.perf_counter()
+    last_ts, after_ts, totals = resume_point(targets)
+    span = source_range(con, inputs)
+    if span is None:
+        raise SystemExit("No input statistics in the recorder.")
+    first, last = span
+    chunk_start = first if after_ts is None else max(first, after_ts + HOUR_S)
+    chunk = chunk_days * 24 * HOUR_S
+    hours = chunks = 0
+    first_ts = last_ts_written = None
+
+    # Bounded memory: one chunk of source hours and output rows at a time.
+    while chunk_start <= last:
+        chunk_end = chunk_start + chunk
+        with rebuild.read_snapshot(con):
+            src = rebuild.load_sources(con, inputs, stats_cols, since_ts=chunk_start, until_ts=chunk_end, min_points=0)
+        rows, totals = export_rows(src, totals)
+        if rows:
+            for target in targets:
+                done = last_ts[target.name]
+                target.write(rows if done is None else [row for row in rows if row[0] > done])
+            hours += len(rows)
+            first_ts = rows[0][0] if first_ts is None else first_ts
+            last_ts_written = rows[-1][0]
+            print(f"Exported {rebuild.utc_iso(rows[0][0])} .. {rebuild.utc_iso(rows[-1][0])} ({len(rows)} hours)")
+        chunks += 1
+        chunk_start = chunk_end
+    return ExportResult(hours=hours, chunks=chunks, first_ts=first_ts, last_ts=last_ts_written,
+                        seconds=time.perf_counter() - t0)
+
+# =========================
+# Command line
+# =========================
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Export converted hourly energy, cumulative totals and COP from the recorder "
+                    "into a SQLite file and/or monthly CSV files. Re-runs append only new hours.",
+    )
+    ap.add_argument("--db", default=rebuild.DEFAULT_DB_PATH, help="recorder DB (opened read-only)")
+    ap.add_argument("--sqlite", metavar="PATH", help="SQLite side store to append to")
+    ap.add_argument("--csv-dir", metavar="DIR", help="directory of monthly CSV files to append to")
+    ap.add_argument("--input", action="append", default=[], metavar="KEY=STATISTIC_ID",
+                    help="override a default input statistic_id")
+    ap.add_argument("--chunk-days", type=int, default=CHUNK_DAYS_DEFAULT,
+                    help=f"days of source statistics read per step (default {CHUNK_DAYS_DEFAULT})")
+    ap.add_argument("--full", action="store_true",
+                    help="drop what was exported before and export the whole history again")
+    args = ap.parse_args(argv)
+    if not args.sqlite and not args.csv_dir:
+        ap.error("give --sqlite and/or --csv-dir")
+    if args.chunk_days < 1:
+        ap.error("--chunk-days must be at least 1")
+    if not os.path.isfile(args.db):
+        raise SystemExit(f"DB file not found: {args.db}")
+
+    inputs = dict(rebuild.DEFAULT_INPUTS)
+    for item in args.input:
+        key, _, stat_id = item.partition("=")
+        if key not in inputs or not stat_id:
+            raise SystemExit(f"Bad --input {item!r}; keys: {', '.join(inputs)}")
+        inputs[key] = stat_id
+
+    con = rebuild.connect_db(args.db, readonly=True)
+    con.row_factory = None
+    rebuild.tune_for_read(con)
+    stats_cols = rebuild.table_cols(con.cursor(), "statistics")
+    if not ("metadata_id" in stats_cols and "start_ts" in stats_cols):
+        raise SystemExit("DB schema error: 'statistics' table does not contain metadata_id/start_ts columns.")
+
+    targets = []
+    if args.sqlite:
+        targets.append(SqliteTarget(args.sqlite, args.full))
+    if args.csv_dir:
+        targets.append(CsvTarget(args.csv_dir, args.full))
+    try:
+        result = export(con, inputs, stats_cols, targets, args.chunk_days)
+    finally:
+        for target in targets:
+            target.close()
+        con.close()
+
+    if not result.hours:
+        print("Nothing new to export.")
+        return
+    print(
+        f"\nExported {result.hours} hours ({rebuild.utc_iso(result.first_ts)} .. {rebuild.utc_iso(result.last_ts)}) "
+        f"in {result.chunks} chunk(s), {result.seconds:.2f}s "
+        f"({rebuild.rows_per_sec(result.hours, result.seconds)} hours/s)"
+    )
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nCancelled by user.")
+        sys.exit(1)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from rebuild_history_stats_and_storage import (
+    DEFAULT_INPUTS,
+    DEFAULT_OUTPUTS,
+    HOUR_S,
+    OUTPUT_RULES,
+    SHORT_TERM_STEP_S,
+    STORAGE_KEY_PREFIX,
+    STORAGE_TOTAL_SOURCES,
+    STORAGE_VERSION,
+    energy,
+    utc_iso,
+)
+
+# =========================
+# Defaults (edit if needed)
+# =========================
+YEARS_DEFAULT = 5
+SHORT_TERM_DAYS_DEFAULT = 10
+OTHER_SENSORS_DEFAULT = 40
+ENTRY_ID_DEFAULT = "01JSYNTHETIC0000000000000000"
+SEED_DEFAULT = 1
+
+# Recorder schema (statistics tables as of schema version 50)
+SCHEMA = """
+CREATE TABLE statistics_meta (
+    id INTEGER NOT NULL PRIMARY KEY,
+    statistic_id VARCHAR(255),
+    source VARCHAR(32),
+    unit_of_measurement VARCHAR(255),
+    unit_class VARCHAR(255),
+    has_mean BOOLEAN,
+    has_sum BOOLEAN,
+    name VARCHAR(255),
+    mean_type SMALLINT NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX ix_statistics_meta_statistic_id ON statistics_meta (statistic_id);
+
+CREATE TABLE statistics (
+    id INTEGER NOT NULL PRIMARY KEY,
+    created DATETIME,
+    created_ts FLOAT,
+    metadata_id INTEGER,
+    start DATETIME,
+    start_ts FLOAT,
+    mean FLOAT,
+    mean_weight FLOAT,
+    min FLOAT,
+    max FLOAT,
+    last_reset DATETIME,
+    last_reset_ts FLOAT,
+    state FLOAT,
+    sum FLOAT,
+    FOREIGN KEY(metadata_id) REFERENCES statistics_meta (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_statistics_start_ts ON statistics (start_ts);
+CREATE UNIQUE INDEX ix_statistics_statistic_id_start_ts ON statistics (metadata_id, start_ts);
+
+CREATE TABLE statistics_short_term (
+    id INTEGER NOT NULL PRIMARY KEY,
+    created DATETIME,
+    created_ts FLOAT,
+    metadata_id INTEGER,
+    start DATETIME,
+    start_ts FLOAT,
+    mean FLOAT,
+    mean_weight FLOAT,
+    min FLOAT,
+    max FLOAT,
+    last_reset DATETIME,
+    last_reset_ts FLOAT,
+    state FLOAT,
+    sum FLOAT,
+    FOREIGN KEY(metadata_id) REFERENCES statistics_meta (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_statistics_short_term_start_ts ON statistics_short_term (start_ts);
+CREATE UNIQUE INDEX ix_statistics_short_term_statistic_id_start_ts ON statistics_short_term (metadata_id, start_ts);
+"""
+
+# =========================
+# Synthetic heat pump model
+# =========================
+def outdoor_temp(ts: int, rnd: random.Random) -> float:
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    doy = dt.timetuple().tm_yday
+    seasonal = 7.0 - 11.0 * math.cos(2 * math.pi * (doy - 20) / 365.25)
+    daily = 4.0 * math.cos(2 * math.pi * (dt.hour - 15) / 24)
+    return seasonal + daily + rnd.gauss(0.0, 2.0)
+
+def hour_values(ts: int, rnd: random.Random) -> dict:
+    # Past-hour energies (kWh) as a NIBE energy log would report them, 0.01 resolution.
+    t_out = outdoor_temp(ts, rnd)
+    hour = datetime.fromtimestamp(ts, tz=timezone.utc).hour
+
+    prod_heating = max(0.0, (17.0 - t_out) * 0.32 + rnd.gauss(0.0, 0.15)) if t_out < 17.0 else 0.0
+    cop_heating = min(5.0, max(1.6, 3.1 + 0.07 * t_out))
+    used_heating = prod_heating / cop_heating
+
+    prod_hot_water = 0.0
+    if hour in (5, 6, 17, 18, 19) or rnd.random() < 0.05:
+        prod_hot_water = max(0.0, rnd.gauss(1.4, 0.4))
+    used_hot_water = prod_hot_water / 2.6
+
+    prod_cooling = max(0.0, (t_out - 24.0) * 0.3) if t_out > 24.0 else 0.0
+    used_cooling = prod_cooling / 3.8
+
+    aux_heat = max(0.0, (-9.0 - t_out) * 0.4) if t_out < -9.0 else 0.0
+    aux_hot_water = 0.5 if prod_hot_water > 2.2 and rnd.random() < 0.3 else 0.0
+
+    v = {
+        "prod_cooling": prod_cooling,
+        "prod_heating": prod_heating,
+        "prod_hot_water": prod_hot_water,
+        "aux_heat": aux_heat,
+        "aux_hot_water": aux_hot_water,
+        "used_cooling": used_cooling,
+        "used_heating": used_heating,
+        "used_hot_water": used_hot_water,
+    }
+    return {k: round(x, 2) for k, x in v.items()}
+
+# =========================
+# Writers
+# =========================
+def insert_meta(cur, stat_id: str, unit: str, has_mean: bool, has_sum: bool) -> int:
+    cur.execute(
+        "INSERT INTO statistics_meta (statistic_id, source, unit_of_measurement, unit_class, has_mean, has_sum, name, mean_type) "
+        "VALUES (?, 'recorder', ?, 'energy', ?, ?, NULL, ?)",
+        (stat_id, unit, int(has_mean), int(has_sum), 1 if has_mean else 0),
+    )
+    return int(cur.lastrowid)
+
+def generate(db_path: str, storage_dir: str, years: float, short_term_days: int, other_sensors: int,
+             entry_id: str, seed: int, end_ts: int | None = None) -> dict:
+    rnd = random.Random(seed)
+    if os.path.exists(db_path):
+        raise SystemExit(f"Refusing to overwrite existing DB: {db_path}")
+
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=OFF")
+    con.executescript(SCHEMA)
+    cur = con.cursor()
+
+    if end_ts is None:
+        end_ts = int(datetime.now(tz=timezone.utc).timestamp()) // HOUR_S * HOUR_S - HOUR_S
+    n_hours = int(years * 365.25 * 24)
+    t0 = end_ts - (n_hours - 1) * HOUR_S
+    created_ts = float(end_ts + HOUR_S)
+    created = utc_iso(created_ts)
+
+    in_ids = {k: insert_meta(cur, stat_id, "kWh", True, False) for k, stat_id in DEFAULT_INPUTS.items()}
+    out_ids = {k: insert_meta(cur, stat_id, "kWh", False, True) for k, stat_id in DEFAULT_OUTPUTS.items()}
+    other_ids = [
+        insert_meta(cur, f"sensor.synthetic_other_{i:03d}", "W", True, False) for i in range(other_sensors)
+    ]
+
+    lts_sql = (
+        "INSERT INTO statistics (created, created_ts, metadata_id, start, start_ts, mean, mean_weight, min, max, state, sum) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    sts_sql = lts_sql.replace("INSERT INTO statistics ", "INSERT INTO statistics_short_term ")
+
+    # The recorder samples the cumulative outputs, so their stored history is the
+    # true cumulative shifted by one hour: exactly the error the rebuild corrects.
+    cum = {k: 0.0 for k in OUTPUT_RULES}
+    totals = {k: 0 for k in STORAGE_TOTAL_SOURCES}
+    prev_out = dict(cum)
+    rows = []
+    n_rows = 0
+    for h in range(n_hours):
+        ts = t0 + h * HOUR_S
+        start = utc_iso(ts)
+        vals = hour_values(ts, rnd)
+        for k, v in vals.items():
+            rows.append((created, created_ts, in_ids[k], start, float(ts), v, None, v, v, None, None))
+        for out_key, parts in OUTPUT_RULES.items():
+            rows.append((created, created_ts, out_ids[out_key], start, float(ts), None, None, None, None,
+                         prev_out[out_key], prev_out[out_key]))
+            cum[out_key] += sum(vals[p] for p in parts)
+        prev_out = dict(cum)
+        for total_key, in_key in STORAGE_TOTAL_SOURCES.items():
+            totals[total_key] += energy.to_wh(vals[in_key])
+        for mid in other_ids:
+            w = rnd.uniform(0.0, 3000.0)
+            rows.append((created, created_ts, mid, start, float(ts), w, None, w * 0.5, w * 1.5, None, None))
+        if len(rows) >= 100000:
+            cur.executemany(lts_sql, rows)
+            n_rows += len(rows)
+            rows.clear()
+    cur.executemany(lts_sql, rows)
+    n_rows += len(rows)
+
+    n_sts = 0
+    if short_term_days > 0:
+        sts_rows = []
+        st_from = max(t0, end_ts - short_term_days * 86400)
+        for t_tick in range(st_from, end_ts + HOUR_S, SHORT_TERM_STEP_S):
+            start = utc_iso(t_tick)
+            for out_key in OUTPUT_RULES:
+                v = cum[out_key]
+                sts_rows.append((created, created_ts, out_ids[out_key], start, float(t_tick), None, None, None, None, v, v))
+        cur.executemany(sts_sql, sts_rows)
+        n_sts = len(sts_rows)
+
+    con.commit()
+    con.close()
+
+    Path(storage_dir).mkdir(parents=True, exist_ok=True)
+    storage_path = Path(storage_dir) / f"{STORAGE_KEY_PREFIX}{entry_id}"
+    storage_obj = {
+        "version": STORAGE_VERSION,
+        "minor_version": 1,
+        "key": storage_path.name,
+        "data": {
+            "totals": totals,
+            "last_processed": utc_iso(end_ts),
+            "last_cop": 0.0,
+            "last_cop_total": 0.0,
+            "last_cop_hot_water": 0.0,
+            "last_cop_heating": 0.0,
+            "last_cop_cooling": 0.0,
+        },
+    }
+    storage_path.write_text(json.dumps(storage_obj, indent=4) + "\n", encoding="utf-8")
+
+    return {
+        "db_path": db_path,
+        "storage_file": str(storage_path),
+        "hours": n_hours,
+        "lts_rows": n_rows,
+        "sts_rows": n_sts,
+        "t_start": t0,
+        "t_end": end_ts,
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Generate a synthetic Home Assistant recorder DB with NIBE hourly energy statistics.")
+    ap.add_argument("--db", required=True, help="path of the new home-assistant_v2.db")
+    ap.add_argument("--storage-dir", required=True, help=".storage directory for the integration storage file")
+    ap.add_argument("--years", type=float, default=YEARS_DEFAULT)
+    ap.add_argument("--short-term-days", type=int, default=SHORT_TERM_DAYS_DEFAULT)
+    ap.add_argument("--other-sensors", type=int, default=OTHER_SENSORS_DEFAULT,
+                    help="unrelated hourly statistics to add, so the indexes look like a real install")
+    ap.add_argument("--entry-id", default=ENTRY_ID_DEFAULT)
+    ap.add_argument("--seed", type=int, default=SEED_DEFAULT)
+    args = ap.parse_args(argv)
+
+    info = generate(args.db, args.storage_dir, args.years, args.short_term_days, args.other_sensors, args.entry_id, args.seed)
+    print(f"DB:       {info['db_path']}")
+    print(f"Storage:  {info['storage_file']}")
+    print(f"Hours:    {info['hours']} | {utc_iso(info['t_start'])} .. {utc_iso(info['t_end'])}")
+    print(f"Rows:     statistics={info['lts_rows']} statistics_short_term={info['sts_rows']}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
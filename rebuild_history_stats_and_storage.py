@@ -1,15 +1,46 @@
 #!/usr/bin/env python3
+import argparse
+import importlib
 import sqlite3
 import json
 import glob
+import heapq
 import os
 import sys
 import math
 import subprocess
 import shutil
+import time
+import types
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
 from datetime import datetime, timezone
 
+# =========================
+# Shared energy kernel
+# =========================
+# The channel tables and the compute kernel live in the integration's energy.py,
+# which only needs const.py. Load both as a bare package so the integration's
+# __init__ (and with it Home Assistant) is never imported. Works from a checkout
+# of this repo and from /config, where the integration sits in custom_components.
+KERNEL_PACKAGE = "_nibe_energy_kernel"
+KERNEL_DIR = Path(__file__).resolve().parent / "custom_components" / "nibe_energy_conversion"
+
+def load_kernel(kernel_dir: Path = KERNEL_DIR):
+    if KERNEL_PACKAGE not in sys.modules:
+        if not (kernel_dir / "energy.py").is_file():
+            raise SystemExit(f"Integration energy kernel not found: {kernel_dir / 'energy.py'}")
+        pkg = types.ModuleType(KERNEL_PACKAGE)
+        pkg.__path__ = [str(kernel_dir)]
+        sys.modules[KERNEL_PACKAGE] = pkg
+    return importlib.import_module(f"{KERNEL_PACKAGE}.energy")
+
+energy = load_kernel()
+const = importlib.import_module(f"{KERNEL_PACKAGE}.const")
+
 # =========================
 # Defaults (edit if needed)
 # =========================
@@ -20,6 +51,22 @@ SHORT_TERM_DAYS_DEFAULT = 10
 UNIT_DEFAULT = "kWh"
 SOURCE_TAG_DEFAULT = "rebuild_wizard"
 
+# Source read tuning (0 = leave SQLite default)
+READ_MMAP_SIZE = 256 * 1024 * 1024
+READ_CACHE_SIZE_KIB = 65536
+HOUR_S = 3600
+
+# Bulk write tuning
+WRITE_BATCH_SIZE = 50000
+WRITE_CACHE_SIZE_KIB = 65536
+SHORT_TERM_STEP_S = 300
+
+# Write checkpoint kept next to the DB while the write phase runs
+CHECKPOINT_SUFFIX = ".rebuild_checkpoint.json"
+
+# Dry-run diff: smallest cumulative difference (kWh) reported as a change
+DIFF_TOLERANCE_DEFAULT = 0.001
+
 # Default INPUTS (hourly "past hour" sensors)
 DEFAULT_INPUTS = {
     "prod_cooling": "sensor.energy_log_energy_produced_for_cooling_during_past_hour_32290",
@@ -46,17 +93,49 @@ DEFAULT_OUTPUTS = {
     "vyrobeno_tuv": "sensor.energy_conversion_vyrobeno_tuv_kwh",
 }
 
+# Storage totals are raw per-input cumulatives; this binds them to the input keys above
+STORAGE_TOTAL_SOURCES = {
+    "prod_cooling_total": "prod_cooling",
+    "prod_heating_total": "prod_heating",
+    "prod_hot_water_total": "prod_hot_water",
+    "used_cooling_total": "used_cooling",
+    "used_heating_total": "used_heating",
+    "used_hot_water_total": "used_hot_water",
+    "aux_used_heating_total": "aux_heat",
+    "aux_used_hot_water_total": "aux_hot_water",
+}
+
+# Output -> integration sensor it holds the statistics of
+OUTPUT_SENSORS = {
+    "dohrev_topeni": "aux_used_heating_total",
+    "dohrev_tuv": "aux_used_hot_water_total",
+    "spotreba_energie_celkem": "used_total",
+    "spotreba_chlazeni": "used_cooling_total",
+    "spotreba_topeni": "used_heating_total",
+    "spotreba_tuv": "used_hot_water_total",
+    "vyrobena_energie_celkem": "produced_total",
+    "vyrobeno_chlazeni": "prod_cooling_total",
+    "vyrobeno_topeni": "prod_heating_total",
+    "vyrobeno_tuv": "prod_hot_water_total",
+}
+
+# Hourly output = sum of the (non-negative) hourly inputs, added in this order;
+# composed by the integration's own table, so both sides count the same energy
+OUTPUT_RULES = {
+    out_key: tuple(STORAGE_TOTAL_SOURCES[total_key] for total_key in energy.OUTPUT_PARTS[sensor_key])
+    for out_key, sensor_key in OUTPUT_SENSORS.items()
+}
+
+# Storage file discovery: STORAGE_KEY in const.py, stored as <STORAGE_KEY>_<entry_id>
+STORAGE_KEY_PREFIX = f"{const.STORAGE_KEY}_"
+STORAGE_MIN_TOTAL_HITS = 6
+STORAGE_PROBE_MAX_BYTES = 1024 * 1024
+STORAGE_PROBE_CHUNK = 64 * 1024
+
 # Storage totals keys used by your integration
-STORAGE_TOTAL_KEYS = [
-    "prod_cooling_total",
-    "prod_heating_total",
-    "prod_hot_water_total",
-    "used_cooling_total",
-    "used_heating_total",
-    "used_hot_water_total",
-    "aux_used_heating_total",
-    "aux_used_hot_water_total",
-]
+STORAGE_TOTAL_KEYS = list(energy.TOTAL_KEYS)
+# Totals are integer Wh from storage version 2 on; version 1 kept kWh floats
+STORAGE_VERSION = const.STORAGE_VERSION
 
 # =========================
 # Wizard helpers
@@ -108,6 +187,16 @@ def ask_str(prompt_text: str, default: str) -> str:
 def utc_iso(ts: float) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="seconds")
 
+def parse_since(text: str) -> int:
+    # ISO date/time; naive values are taken as UTC. Floored to the hour.
+    try:
+        dt = datetime.fromisoformat(text.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date/time: {text!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return floor_to(dt.timestamp(), HOUR_S)
+
 def parse_num(v):
     if v is None:
         return None
@@ -126,14 +215,6 @@ def table_cols(cur, table: str):
 def floor_to(ts: float, step_s: int) -> int:
     return int(ts // step_s) * step_s
 
-def value_from_stats_row(row):
-    for k in ("mean", "state", "sum"):
-        if k in row.keys():
-            v = parse_num(row[k])
-            if v is not None:
-                return float(v)
-    return None
-
 def run_cmd(cmd: list[str]) -> None:
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     if p.returncode != 0:
@@ -150,6 +231,19 @@ def backup_file(src_path: str) -> str:
     shutil.copy2(src, dst)
     return str(dst)
 
+def backup_db_online(db_path: str) -> str:
+    # sqlite's backup API copies one consistent snapshot while the recorder keeps
+    # writing (WAL readers don't block it), so Core does not have to be stopped for it.
+    dst = Path(db_path).with_name(Path(db_path).name + f".bak_{now_stamp()}")
+    src_con = connect_db(db_path, readonly=True)
+    dst_con = sqlite3.connect(dst)
+    try:
+        src_con.backup(dst_con)
+    finally:
+        dst_con.close()
+        src_con.close()
+    return str(dst)
+
 def backup_dir(src_dir: str) -> str:
     src = Path(src_dir)
     dst = src.parent / (src.name + f".bak_{now_stamp()}")
@@ -166,22 +260,79 @@ def statistic_id_exists(cur, stat_id: str) -> bool:
 # =========================
 # Storage discovery
 # =========================
+def storage_candidate(path: str):
+    try:
+        obj = json.loads(Path(path).read_text(encoding="utf-8"))
+        totals = obj.get("data", {}).get("totals", {})
+        if not isinstance(totals, dict):
+            return None
+        hits = sum(1 for k in STORAGE_TOTAL_KEYS if k in totals)
+        if hits >= STORAGE_MIN_TOTAL_HITS:
+            return (path, obj, hits)
+    except:
+        return None
+    return None
+
+def stored_totals_wh(obj: dict) -> dict:
+    # The totals of a storage file in Wh, whichever version wrote it.
+    totals = obj.get("data", {}).get("totals", {})
+    if obj.get("version", 1) < 2:
+        return energy.totals_to_wh(totals)
+    return {k: int(v) for k, v in totals.items()}
+
+def storage_probe(path: str, limit: int = STORAGE_PROBE_MAX_BYTES, chunk: int = STORAGE_PROBE_CHUNK) -> bool:
+    # Stream at most `limit` bytes looking for "totals" plus enough total keys before
+    # paying for a full json.loads.
+    marker = b'"totals"'
+    needles = [f'"{k}"'.encode() for k in STORAGE_TOTAL_KEYS]
+    overlap = max(len(n) for n in needles + [marker])
+    found = set()
+    have_marker = False
+    tail = b""
+    read = 0
+    try:
+        with open(path, "rb") as f:
+            while read < limit:
+                buf = f.read(min(chunk, limit - read))
+                if not buf:
+                    break
+                read += len(buf)
+                window = tail + buf
+                have_marker = have_marker or marker in window
+                found.update(n for n in needles if n in window)
+                if have_marker and len(found) >= STORAGE_MIN_TOTAL_HITS:
+                    return True
+                tail = window[-overlap:]
+    except OSError:
+        return False
+    return False
+
 def storage_candidates(storage_dir: str):
+    # Fast path: the integration's own key pattern, no other file is opened.
     cands = []
-    for p in glob.glob(os.path.join(storage_dir, "*")):
-        try:
-            if os.path.isdir(p):
-                continue
-            txt = Path(p).read_text(encoding="utf-8")
-            obj = json.loads(txt)
-            totals = obj.get("data", {}).get("totals", {})
-            if not isinstance(totals, dict):
-                continue
-            hits = sum(1 for k in STORAGE_TOTAL_KEYS if k in totals)
-            if hits >= 6:
-                cands.append((p, obj, hits))
-        except:
+    for p in sorted(glob.glob(os.path.join(glob.escape(storage_dir), STORAGE_KEY_PREFIX + "*"))):
+        if ".bak_" in Path(p).name or not os.path.isfile(p):
             continue
+        c = storage_candidate(p)
+        if c:
+            cands.append(c)
+
+    if not cands:
+        # Fallback: bounded content probe; large files (restore_state, registries,
+        # dashboards) are rejected by size before they are opened.
+        with os.scandir(storage_dir) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                try:
+                    if not entry.is_file() or entry.stat().st_size > STORAGE_PROBE_MAX_BYTES:
+                        continue
+                except OSError:
+                    continue
+                if ".bak_" in entry.name or not storage_probe(entry.path):
+                    continue
+                c = storage_candidate(entry.path)
+                if c:
+                    cands.append(c)
+
     cands.sort(key=lambda x: x[2], reverse=True)
     return cands
 
@@ -211,6 +362,352 @@ def pick_storage_file(storage_dir: str) -> str:
             print("File exists but is not valid JSON. Please choose another file.")
             continue
 
+# =========================
+# Source loading
+# =========================
+@dataclass
+class SourceSeries:
+    # Hour-aligned timeline plus one value column per input key (0.0 where missing).
+    timeline: array
+    columns: dict
+    counts: dict
+
+def tune_for_read(con, mmap_size: int = READ_MMAP_SIZE, cache_size_kib: int = READ_CACHE_SIZE_KIB) -> None:
+    if mmap_size:
+        con.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    if cache_size_kib:
+        con.execute(f"PRAGMA cache_size=-{int(cache_size_kib)}")
+    # Set before any TEMP table exists: changing temp_store drops temp tables.
+    con.execute("PRAGMA temp_store=MEMORY")
+
+def resolve_input_meta_ids(cur, inputs: dict) -> dict:
+    stat_ids = sorted(set(inputs.values()))
+    cur.execute(
+        f"SELECT id, statistic_id FROM statistics_meta WHERE statistic_id IN ({','.join(['?']*len(stat_ids))}) ORDER BY id",
+        tuple(stat_ids),
+    )
+    first_id = {}
+    for mid, stat_id in cur.fetchall():
+        first_id.setdefault(stat_id, int(mid))
+
+    keys_by_mid = {}
+    for in_key, stat_id in inputs.items():
+        if stat_id not in first_id:
+            raise SystemExit(f"Unexpected: source disappeared from statistics_meta: {stat_id}")
+        keys_by_mid.setdefault(first_id[stat_id], []).append(in_key)
+    return keys_by_mid
+
+def load_sources(con, inputs: dict, stats_cols, since_ts: float | None = None, min_points: int = 2,
+                 until_ts: float | None = None) -> SourceSeries:
+    cur = con.cursor()
+    cur.row_factory = None
+    keys_by_mid = resolve_input_meta_ids(cur, inputs)
+
+    value_cols = [c for c in ("mean", "state", "sum") if c in stats_cols]
+    range_sql = ""
+    range_params = []
+    if since_ts is not None:
+        range_sql = "AND start_ts >= ?"
+        range_params.append(float(since_ts))
+    if until_ts is not None:
+        range_sql += " AND start_ts < ?"
+        range_params.append(float(until_ts))
+
+    def input_rows(mid):
+        # The (metadata_id, start_ts) index returns one input already in time
+        # order, so no sort step buffers its history.
+        mid_cur = con.cursor()
+        mid_cur.row_factory = None
+        mid_cur.execute(
+            f"""
+            SELECT start_ts{''.join(', ' + c for c in value_cols)}
+            FROM statistics
+            WHERE metadata_id = ? {range_sql}
+            ORDER BY start_ts ASC
+            """,
+            (mid, *range_params),
+        )
+        for row in mid_cur:
+            ts = parse_num(row[0])
+            if ts is None:
+                continue
+            v = None
+            for raw in row[1:]:
+                v = parse_num(raw)
+                if v is not None:
+                    break
+            if v is None or v < 0:
+                continue
+            yield ts, mid, v
+
+    timeline = array("d")
+    columns = {in_key: array("d") for in_key in inputs}
+    counts = {in_key: 0 for in_key in inputs}
+    all_columns = list(columns.values())
+    last_hour = None
+
+    # One cursor per input, merged lazily by start_ts: memory stays flat however
+    # long the history is (a single IN (...) ORDER BY start_ts query sorts every
+    # row first). Ties keep metadata_id order.
+    streams = [input_rows(mid) for mid in sorted(keys_by_mid)]
+    for ts, mid, v in heapq.merge(*streams, key=lambda item: item[0]):
+        hour = floor_to(ts, HOUR_S)
+        if hour != last_hour:
+            timeline.append(hour)
+            for col in all_columns:
+                col.append(0.0)
+            last_hour = hour
+        for in_key in keys_by_mid[mid]:
+            columns[in_key][-1] = v
+            counts[in_key] += 1
+
+    # Full loads are checked and reported; partial reads (min_points=0) may be empty.
+    if min_points:
+        if not timeline:
+            raise SystemExit("No usable source rows in the selected time range.")
+        for in_key, stat_id in inputs.items():
+            if counts[in_key] < min_points:
+                raise SystemExit(f"Not enough usable points for input '{in_key}' ({stat_id}).")
+            print(f"Loaded {counts[in_key]} points for {in_key}")
+
+    return SourceSeries(timeline=timeline, columns=columns, counts=counts)
+
+# =========================
+# Columnar compute engine
+# =========================
+@dataclass
+class RebuildResult:
+    # cumulative and storage_totals in Wh, final in kWh
+    timeline: array
+    cumulative: dict
+    final: dict
+    storage_totals: dict
+
+def compute_engine_name() -> str:
+    return energy.compute_engine_name()
+
+def storage_seeds(output_seeds: dict) -> dict:
+    # Storage totals are per-input cumulatives. Take them from a single-input output,
+    # or derive them from a composite one minus its other, single-input parts.
+    single = {parts[0]: output_seeds.get(out_key, 0) for out_key, parts in OUTPUT_RULES.items() if len(parts) == 1}
+    seeds = {}
+    for in_key in STORAGE_TOTAL_SOURCES.values():
+        if in_key in single:
+            seeds[in_key] = single[in_key]
+            continue
+        for out_key, parts in OUTPUT_RULES.items():
+            others = [p for p in parts if p != in_key]
+            if in_key in parts and others and all(p in single for p in others):
+                seeds[in_key] = output_seeds.get(out_key, 0) - sum(single[p] for p in others)
+                break
+        else:
+            raise SystemExit(f"Cannot derive a storage seed for input '{in_key}' from the outputs.")
+    return seeds
+
+def compute_outputs(src: SourceSeries, output_seeds: dict | None = None) -> RebuildResult:
+    # One pass per distinct input combination: clip, compose, cumulate, in Wh like the
+    # integration. Single-input outputs and the storage totals share the same column.
+    # output_seeds are Wh.
+    parts_list = list(OUTPUT_RULES.values()) + [(k,) for k in STORAGE_TOTAL_SOURCES.values()]
+    seeds = {}
+    if output_seeds:
+        seeds = {(in_key,): v for in_key, v in storage_seeds(output_seeds).items()}
+        seeds.update({OUTPUT_RULES[out_key]: v for out_key, v in output_seeds.items()})
+    cums = energy.cumulate(src.columns, parts_list, seeds)
+
+    cumulative = {out_key: cums[parts] for out_key, parts in OUTPUT_RULES.items()}
+    final = {out_key: energy.to_kwh(int(cum[-1])) if len(cum) else 0.0 for out_key, cum in cumulative.items()}
+    storage_totals = {}
+    for total_key, in_key in STORAGE_TOTAL_SOURCES.items():
+        cum = cums[(in_key,)]
+        storage_totals[total_key] = int(cum[-1]) if len(cum) else 0
+    return RebuildResult(timeline=src.timeline, cumulative=cumulative, final=final, storage_totals=storage_totals)
+
+def output_points(result: RebuildResult, out_key: str):
+    cum = result.cumulative[out_key]
+    return zip(result.timeline, map(energy.to_kwh, cum.tolist()))
+
+# =========================
+# SQL pushdown engine
+# =========================
+# Same rules as compute_outputs(), evaluated inside SQLite: inputs are pivoted into a
+# TEMP table keyed by hour and each output is written with INSERT ... SELECT using a
+# running SUM() window. The hourly values are cast to integer Wh (half up, as in
+# energy.to_wh()), so the integer sums match the Python engine exactly.
+SQL_HOURLY_TABLE = "temp.rebuild_hourly"
+
+def sql_build_hourly(con, inputs: dict, stats_cols, since_ts: float | None = None, min_points: int = 2):
+    cur = con.cursor()
+    cur.row_factory = None
+    keys_by_mid = resolve_input_meta_ids(cur, inputs)
+    mid_by_key = {in_key: mid for mid, keys in keys_by_mid.items() for in_key in keys}
+    value_cols = [c for c in ("mean", "state", "sum") if c in stats_cols]
+    value_expr = f"COALESCE({','.join(value_cols)})" if len(value_cols) > 1 else value_cols[0]
+
+    cur.execute(f"DROP TABLE IF EXISTS {SQL_HOURLY_TABLE}")
+    cur.execute(
+        f"CREATE TABLE {SQL_HOURLY_TABLE} (hour INTEGER PRIMARY KEY, "
+        + ", ".join(f"c_{in_key} REAL" for in_key in inputs) + ")"
+    )
+    pivot = ", ".join(f"MAX(CASE WHEN metadata_id = {mid_by_key[in_key]} THEN v END)" for in_key in inputs)
+    params = list(keys_by_mid)
+    since_sql = ""
+    if since_ts is not None:
+        since_sql = "AND start_ts >= ?"
+        params.append(float(since_ts))
+    cur.execute(
+        f"""
+        INSERT INTO {SQL_HOURLY_TABLE}
+        SELECT hour, {pivot}
+        FROM (
+            SELECT CAST(start_ts / {HOUR_S} AS INTEGER) * {HOUR_S} AS hour, metadata_id, {value_expr} AS v
+            FROM statistics
+            WHERE metadata_id IN ({','.join(['?']*len(keys_by_mid))}) {since_sql}
+        )
+        WHERE v >= 0
+        GROUP BY hour
+        """,
+        tuple(params),
+    )
+
+    cur.execute(
+        f"SELECT MIN(hour), MAX(hour), COUNT(*), "
+        + ", ".join(f"COUNT(c_{in_key})" for in_key in inputs)
+        + f" FROM {SQL_HOURLY_TABLE}"
+    )
+    row = cur.fetchone()
+    if not row[2]:
+        raise SystemExit("No usable source rows in the selected time range.")
+    for (in_key, stat_id), n in zip(inputs.items(), row[3:]):
+        if n < min_points:
+            raise SystemExit(f"Not enough usable points for input '{in_key}' ({stat_id}).")
+        print(f"Loaded {n} points for {in_key}")
+    return float(row[0]), float(row[1]), int(row[2])
+
+def _sql_hourly_expr(parts) -> str:
+    # Inputs below zero never reach the hourly table, so the CAST truncation is a floor.
+    return " + ".join(f"CAST(COALESCE(c_{p}, 0.0) * {energy.WH_PER_KWH} + 0.5 AS INTEGER)" for p in parts)
+
+def sql_cumulative_select(parts, seed: int = 0):
+    # The seed row (hour -1, Wh) is summed first, like accumulate(initial=seed).
+    return (
+        f"""
+        SELECT ts, v / {float(energy.WH_PER_KWH)} AS v FROM (
+            SELECT hour AS ts, SUM(h) OVER (ORDER BY hour ROWS UNBOUNDED PRECEDING) AS v
+            FROM (
+                SELECT -1 AS hour, ? AS h
+                UNION ALL
+                SELECT hour, {_sql_hourly_expr(parts)} FROM {SQL_HOURLY_TABLE}
+            )
+        ) WHERE ts >= 0
+        """,
+        (int(seed),),
+    )
+
+def sql_short_term_select(meta_id: int, st_from: float, t_end: float, step: int = SHORT_TERM_STEP_S):
+    # Same step-hold as short_term_points(), reading back the freshly written LTS rows.
+    return (
+        """
+        WITH RECURSIVE ticks(t) AS (
+            SELECT ? UNION ALL SELECT t + ? FROM ticks WHERE t + ? <= ?
+        )
+        SELECT t AS ts, COALESCE(
+            (SELECT sum FROM statistics WHERE metadata_id = ? AND start_ts >= ? AND start_ts <= t
+             ORDER BY start_ts DESC LIMIT 1),
+            (SELECT sum FROM statistics WHERE metadata_id = ? AND start_ts >= ?
+             ORDER BY start_ts ASC LIMIT 1)
+        ) AS v
+        FROM ticks
+        """,
+        (floor_to(st_from, step), step, step, floor_to(t_end, step), meta_id, st_from, meta_id, st_from),
+    )
+
+def sql_storage_totals(cur, seeds: dict) -> dict:
+    totals = {}
+    for total_key, in_key in STORAGE_TOTAL_SOURCES.items():
+        cur.execute(
+            f"""
+            SELECT SUM(h) FROM (
+                SELECT -1 AS hour, ? AS h
+                UNION ALL
+                SELECT hour, {_sql_hourly_expr((in_key,))} FROM {SQL_HOURLY_TABLE}
+            )
+            """,
+            (int(seeds.get(in_key, 0)),),
+        )
+        totals[total_key] = int(cur.fetchone()[0])
+    return totals
+
+# =========================
+# Write checkpoint
+# =========================
+class RebuildCheckpoint:
+    # Records which outputs (and how far into their LTS/STS rows) have been committed,
+    # so an interrupted write phase can resume instead of starting over.
+    def __init__(self, path: str | None, signature: dict, units: dict | None = None):
+        self.path = path
+        self.signature = signature
+        self.units = units or {}
+
+    @classmethod
+    def load(cls, path: str):
+        try:
+            obj = json.loads(Path(path).read_text(encoding="utf-8"))
+            return cls(path, obj["signature"], obj.get("units", {}))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def unit(self, out_key: str) -> dict:
+        return self.units.setdefault(out_key, {})
+
+    def update(self, out_key: str, **changes) -> None:
+        self.unit(out_key).update(changes)
+        self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path + ".tmp"
+        Path(tmp).write_text(
+            json.dumps({"signature": self.signature, "units": self.units}, indent=2),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def checkpoint_signature(inputs: dict, outputs: dict, computed, since_ts, short_term_days: int, unit: str, source_tag: str) -> dict:
+    return {
+        "inputs": inputs,
+        "outputs": outputs,
+        "since": since_ts,
+        "engine": computed.engine,
+        "t_start": computed.t_start,
+        "t_end": computed.t_end,
+        "short_term_days": short_term_days,
+        "unit": unit,
+        "source_tag": source_tag,
+    }
+
+def open_checkpoint(db_path: str, signature: dict) -> RebuildCheckpoint:
+    path = db_path + CHECKPOINT_SUFFIX
+    prev = RebuildCheckpoint.load(path)
+    if prev is not None:
+        done = [k for k, u in prev.units.items() if u.get("done")]
+        if prev.signature != signature:
+            print(f"Ignoring checkpoint {path}: it belongs to a different rebuild (inputs/outputs/range changed).")
+        elif ask_yes_no(f"Found an interrupted rebuild ({len(done)}/{len(signature['outputs'])} outputs done). Resume it?"):
+            return prev
+    ck = RebuildCheckpoint(path, signature)
+    ck.save()
+    return ck
+
 # =========================
 # Main rebuild logic
 # =========================
@@ -232,6 +729,25 @@ def delete_all_for_statistic_id(cur, stat_id: str, have_sts: bool):
     n_meta = cur.rowcount
     return (n_stats, n_sts, n_meta)
 
+def delete_from_for_meta_ids(cur, meta_ids: list[int], since_ts: float, have_sts: bool):
+    q = ','.join(['?']*len(meta_ids))
+    cur.execute(f"DELETE FROM statistics WHERE metadata_id IN ({q}) AND start_ts >= ?", (*meta_ids, float(since_ts)))
+    n_stats = cur.rowcount
+    n_sts = 0
+    if have_sts:
+        cur.execute(f"DELETE FROM statistics_short_term WHERE metadata_id IN ({q}) AND start_ts >= ?", (*meta_ids, float(since_ts)))
+        n_sts = cur.rowcount
+    return (n_stats, n_sts, 0)
+
+def seed_before(cur, meta_ids: list[int], since_ts: float) -> float:
+    cur.execute(
+        f"SELECT sum FROM statistics WHERE metadata_id IN ({','.join(['?']*len(meta_ids))}) AND start_ts < ? ORDER BY start_ts DESC LIMIT 1",
+        (*meta_ids, float(since_ts)),
+    )
+    row = cur.fetchone()
+    v = parse_num(row[0]) if row else None
+    return v if v is not None else 0.0
+
 def create_meta(cur, meta_cols, stat_id: str, unit: str, source_tag: str, name: str):
     base = {
         "statistic_id": stat_id,
@@ -246,7 +762,20 @@ def create_meta(cur, meta_cols, stat_id: str, unit: str, source_tag: str, name:
     cur.execute(q, tuple(base[k] for k in keys))
     return int(cur.lastrowid)
 
-def build_insert(cur, table: str, tgt_meta_id: int, now_iso: str, now_ts: float):
+def unique_key_cols(cur, table: str, insert_cols: list[str]):
+    # Conflict target for upserts: the recorder's unique (metadata_id, start_ts) index
+    # (or (metadata_id, start) on old schemas). None if the table has no usable one.
+    cur.execute(f"PRAGMA index_list({table})")
+    for idx in cur.fetchall():
+        if not idx[2]:
+            continue
+        cur.execute(f"PRAGMA index_info({idx[1]})")
+        cols = [r[2] for r in cur.fetchall()]
+        if "metadata_id" in cols and all(c in insert_cols for c in cols):
+            return cols
+    return None
+
+def insert_target(cur, table: str, tgt_meta_id: int, now_iso: str, now_ts: float):
     cols = table_cols(cur, table)
     base_row = {}
     if "created" in cols: base_row["created"] = now_iso
@@ -261,19 +790,523 @@ def build_insert(cur, table: str, tgt_meta_id: int, now_iso: str, now_ts: float)
 
     needed = [c for c in ["start","start_ts","state","sum"] if c in cols]
     insert_cols = list(base_row.keys()) + needed
-    sql = f"INSERT OR REPLACE INTO {table} ({','.join(insert_cols)}) VALUES ({','.join(['?']*len(insert_cols))})"
+    conflict = unique_key_cols(cur, table, insert_cols)
+    if conflict:
+        updates = ",".join(f"{c}=excluded.{c}" for c in insert_cols if c not in conflict)
+        head = f"INSERT INTO {table} ({','.join(insert_cols)})"
+        tail = f" ON CONFLICT({','.join(conflict)}) DO UPDATE SET {updates}"
+    else:
+        head = f"INSERT OR REPLACE INTO {table} ({','.join(insert_cols)})"
+        tail = ""
+    return head, tail, base_row, insert_cols
+
+def build_insert(cur, table: str, tgt_meta_id: int, now_iso: str, now_ts: float):
+    head, tail, base_row, insert_cols = insert_target(cur, table, tgt_meta_id, now_iso, now_ts)
+    sql = f"{head} VALUES ({','.join(['?']*len(insert_cols))}){tail}"
     return sql, base_row, insert_cols
 
-def insert_point(cur, sql, base_row, cols, start_ts, value):
-    row = dict(base_row)
-    if "start" in cols: row["start"] = utc_iso(start_ts)
-    if "start_ts" in cols: row["start_ts"] = float(start_ts)
-    if "state" in cols: row["state"] = float(value)
-    if "sum" in cols: row["sum"] = float(value)
-    cur.execute(sql, [row.get(c) for c in cols])
+def insert_select(cur, table: str, tgt_meta_id: int, now_iso: str, now_ts: float, select_sql: str, params) -> int:
+    # select_sql must yield (ts, v) rows; v goes to both state and sum.
+    head, tail, base_row, insert_cols = insert_target(cur, table, tgt_meta_id, now_iso, now_ts)
+    exprs = []
+    base_params = []
+    for c in insert_cols:
+        if c in base_row:
+            exprs.append("?")
+            base_params.append(base_row[c])
+        elif c == "start":
+            exprs.append("strftime('%Y-%m-%dT%H:%M:%S+00:00', p.ts, 'unixepoch')")
+        elif c == "start_ts":
+            exprs.append("p.ts")
+        else:
+            exprs.append("p.v")
+    # "WHERE true" keeps the upsert's ON CONFLICT from parsing as a join constraint.
+    sql = f"{head} SELECT {','.join(exprs)} FROM ({select_sql}) AS p WHERE true{tail}"
+    cur.execute(sql, (*base_params, *params))
+    return cur.rowcount
+
+def point_rows(base_row, cols, points):
+    template = [base_row.get(c) for c in cols]
+    i_start = cols.index("start") if "start" in cols else None
+    i_start_ts = cols.index("start_ts") if "start_ts" in cols else None
+    i_state = cols.index("state") if "state" in cols else None
+    i_sum = cols.index("sum") if "sum" in cols else None
+    for start_ts, value in points:
+        row = template.copy()
+        if i_start is not None: row[i_start] = utc_iso(start_ts)
+        if i_start_ts is not None: row[i_start_ts] = float(start_ts)
+        if i_state is not None: row[i_state] = float(value)
+        if i_sum is not None: row[i_sum] = float(value)
+        yield row
+
+def short_term_points(points, st_from: float, t_end: float, step: int = SHORT_TERM_STEP_S):
+    # Step-hold the hourly cumulative onto the 5-min grid from st_from to t_end.
+    it = ((ts, v) for ts, v in points if ts >= st_from)
+    pending = next(it, None)
+    if pending is None:
+        return
+    current_v = pending[1]
+    for t_tick in range(floor_to(st_from, step), floor_to(t_end, step) + 1, step):
+        while pending is not None and pending[0] <= t_tick:
+            current_v = pending[1]
+            pending = next(it, None)
+        yield t_tick, current_v
+
+def bulk_write(con, sql, base_row, cols, points, batch_size: int = WRITE_BATCH_SIZE, on_commit=None) -> int:
+    # One transaction per batch keeps the WAL bounded; on_commit(last_ts) lets the
+    # caller checkpoint progress after each durable batch.
+    cur = con.cursor()
+    it = iter(points)
+    n = 0
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return n
+        with write_transaction(con):
+            cur.executemany(sql, point_rows(base_row, cols, batch))
+        n += len(batch)
+        if on_commit is not None:
+            on_commit(batch[-1][0])
+
+def tune_for_bulk_write(con) -> None:
+    # Core is stopped while we write: WAL + synchronous=NORMAL is still crash-safe
+    # for the DB file, and a large page cache keeps the index B-trees in memory.
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"PRAGMA cache_size=-{WRITE_CACHE_SIZE_KIB}")
+    con.execute("PRAGMA temp_store=MEMORY")
+
+@contextmanager
+def write_transaction(con):
+    # Requires the connection in autocommit mode (isolation_level=None).
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+@contextmanager
+def no_phase(name: str):
+    # Default phase hook: compute_rebuild/write_outputs report each phase (with a
+    # {"rows": n} box) to a hook like this one, which the benchmark replaces with a timer.
+    yield {"rows": 0}
+
+def rows_per_sec(n: int, elapsed: float) -> str:
+    return f"{n / elapsed:,.0f}" if elapsed > 0 else "n/a"
+
+@dataclass
+class ComputedRebuild:
+    engine: str
+    src: SourceSeries | None
+    result: RebuildResult | None
+    t_start: float
+    t_end: float
+    n_hours: int
+    storage_totals: dict
+    output_seeds: dict
+
+def connect_db(db_path: str, readonly: bool = False):
+    if readonly:
+        # mode=ro (not immutable=1): still honours the WAL, so a read transaction sees
+        # a consistent snapshot while the recorder keeps writing.
+        con = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, isolation_level=None)
+    else:
+        con = sqlite3.connect(db_path, isolation_level=None)
+    con.row_factory = sqlite3.Row
+    return con
+
+@contextmanager
+def read_snapshot(con):
+    con.execute("BEGIN")
+    try:
+        yield
+    finally:
+        con.execute("COMMIT")
+
+def ask_settings():
+    short_term_days = ask_int("Short-term (5-min) backfill window in days", SHORT_TERM_DAYS_DEFAULT)
+    unit = ask_str("Unit of measurement", UNIT_DEFAULT)
+    source_tag = ask_str("statistics_meta.source tag", SOURCE_TAG_DEFAULT)
+    return short_term_days, unit, source_tag
+
+def stop_core_and_backup(db_path: str, storage_file: str, storage_dir: str, online_backup: bool = False) -> float:
+    # Returns time.monotonic() at the moment Core stopped, for the downtime report.
+    # online_backup (precompute): the DB and .storage copies and all prompts happen
+    # while Core still runs, so only the small storage file is copied after the stop.
+    # Step 5: Stop Core confirmation
+    print("\nStep 5/7: Stop Home Assistant Core\n")
+    while True:
+        if ask_yes_no("Stop Home Assistant Core now (ha core stop)?"):
+            break
+        print("Cannot proceed safely without stopping Core. I will ask again.")
+
+    storage_dir_bak = None
+    if online_backup:
+        print("\nStep 6/7: Create backups (DB and .storage while Core is running)\n")
+        db_bak = backup_db_online(db_path)
+        print(f"DB backup created:       {db_bak}")
+        if ask_yes_no("Also backup the entire .storage directory? (can be large)"):
+            storage_dir_bak = backup_dir(storage_dir)
+
+    # Stop Core
+    run_cmd(["ha", "core", "stop"])
+    t_stopped = time.monotonic()
+    print("Home Assistant Core stopped.\n")
+
+    # Step 6: Backups (DB + chosen storage file; optional whole .storage)
+    if online_backup:
+        # Copied after the stop: Core may have saved it since the snapshot.
+        storage_bak = backup_file(storage_file)
+        print(f"Storage backup created:  {storage_bak}")
+    else:
+        print("Step 6/7: Create backups\n")
+        db_bak = backup_file(db_path)
+        storage_bak = backup_file(storage_file)
+        print(f"DB backup created:       {db_bak}")
+        print(f"Storage backup created:  {storage_bak}")
+        if ask_yes_no("Also backup the entire .storage directory? (can be large)"):
+            storage_dir_bak = backup_dir(storage_dir)
+    if storage_dir_bak is not None:
+        print(f".storage directory backup created: {storage_dir_bak}")
+    print("")
+    return t_stopped
+
+def compute_rebuild(con, inputs: dict, outputs: dict, stats_cols, since_ts: float | None = None, engine: str = "python",
+                    phase=no_phase) -> ComputedRebuild:
+    cur = con.cursor()
+    tune_for_read(con)
+    min_points = 2 if since_ts is None else 1
+    t_compute = time.perf_counter()
+
+    with read_snapshot(con):
+        output_seeds = {}
+        if since_ts is not None:
+            output_seeds = {
+                out_key: energy.to_wh(seed_before(cur, resolve_meta_ids(cur, out_stat_id), since_ts))
+                for out_key, out_stat_id in outputs.items()
+            }
+        if engine == "sql":
+            src = result = None
+            with phase("load") as box:
+                t_start, t_end, n_hours = sql_build_hourly(con, inputs, stats_cols, since_ts=since_ts, min_points=min_points)
+                box["rows"] = n_hours
+            with phase("compute") as box:
+                storage_totals = sql_storage_totals(cur, storage_seeds(output_seeds) if output_seeds else {})
+                box["rows"] = n_hours * len(OUTPUT_RULES)
+            engine_name = "sql"
+        else:
+            with phase("load") as box:
+                src = load_sources(con, inputs, stats_cols, since_ts=since_ts, min_points=min_points)
+                box["rows"] = len(src.timeline)
+            with phase("compute") as box:
+                result = compute_outputs(src, output_seeds)
+                box["rows"] = len(result.timeline) * len(OUTPUT_RULES)
+            t_start, t_end, n_hours = result.timeline[0], result.timeline[-1], len(result.timeline)
+            storage_totals = result.storage_totals
+            engine_name = compute_engine_name()
+
+    print(f"\nTimeline hours: {n_hours} | {utc_iso(t_start)} .. {utc_iso(t_end)}\n")
+    if output_seeds:
+        print("Seeds (existing sum before the start hour):")
+        for out_key, v in output_seeds.items():
+            print(f"  {out_key} = {energy.to_kwh(v)}")
+        print("")
+    print(f"Loaded and computed {len(OUTPUT_RULES)} outputs in {time.perf_counter() - t_compute:.2f}s (engine={engine_name})")
+
+    return ComputedRebuild(
+        engine=engine, src=src, result=result, t_start=t_start, t_end=t_end, n_hours=n_hours,
+        storage_totals=storage_totals, output_seeds=output_seeds,
+    )
+
+def extend_with_tail(con, inputs: dict, stats_cols, computed: ComputedRebuild) -> int:
+    # Re-check the newest source hour after Core stopped and fold in hours the
+    # recorder compiled after the precompute snapshot. Compute is cheap; the load is not.
+    cur = con.cursor()
+    mids = list(resolve_input_meta_ids(cur, inputs))
+    cur.execute(f"SELECT MAX(start_ts) FROM statistics WHERE metadata_id IN ({','.join(['?']*len(mids))})", tuple(mids))
+    latest = parse_num(cur.fetchone()[0])
+    if latest is None or floor_to(latest, HOUR_S) <= computed.t_end:
+        return 0
+
+    tail = load_sources(con, inputs, stats_cols, since_ts=computed.t_end + HOUR_S, min_points=0)
+    src = computed.src
+    src.timeline = src.timeline + tail.timeline
+    for in_key in src.columns:
+        src.columns[in_key] = src.columns[in_key] + tail.columns[in_key]
+        src.counts[in_key] += tail.counts[in_key]
+
+    computed.result = compute_outputs(src, computed.output_seeds)
+    computed.t_end = computed.result.timeline[-1]
+    computed.n_hours = len(computed.result.timeline)
+    computed.storage_totals = computed.result.storage_totals
+    return len(tail.timeline)
+
+def write_outputs(con, outputs: dict, computed: ComputedRebuild, meta_cols, have_sts: bool, short_term_days: int,
+                  unit: str, source_tag: str, since_ts: float | None = None, checkpoint: RebuildCheckpoint | None = None,
+                  phase=no_phase) -> int:
+    cur = con.cursor()
+    result = computed.result
+    t_start, t_end = computed.t_start, computed.t_end
+    now_ts = datetime.now(tz=timezone.utc).timestamp()
+    now_iso = utc_iso(now_ts)
+    if checkpoint is None:
+        checkpoint = RebuildCheckpoint(None, {})
+
+    tune_for_bulk_write(con)
+    t_write = time.perf_counter()
+    total_rows = 0
+
+    for out_key, out_stat_id in outputs.items():
+        t_out = time.perf_counter()
+        state = checkpoint.unit(out_key)
+        if state.get("done"):
+            print(f"OUT {out_key}: already written (checkpoint)")
+            continue
+
+        # Unit step 1: clear the range and settle the target metadata_id.
+        if "meta_id" in state:
+            tgt_meta_id = int(state["meta_id"])
+            ds = dsts = dm = 0
+            print(f"OUT {out_key}: resuming metadata_id={tgt_meta_id}")
+        else:
+            with phase("delete") as box:
+                with write_transaction(con):
+                    if since_ts is not None:
+                        # Keep the existing metadata row so history before --since stays attached.
+                        meta_ids = resolve_meta_ids(cur, out_stat_id)
+                        ds, dsts, dm = delete_from_for_meta_ids(cur, meta_ids, since_ts, have_sts)
+                        tgt_meta_id = meta_ids[0]
+                    else:
+                        ds, dsts, dm = delete_all_for_statistic_id(cur, out_stat_id, have_sts)
+                        tgt_meta_id = create_meta(cur, meta_cols, out_stat_id, unit, source_tag, out_stat_id)
+                checkpoint.update(out_key, meta_id=tgt_meta_id)
+                box["rows"] = ds + dsts
+
+        # Unit step 2: LTS rows, committed in batches; upserts make a replayed batch harmless.
+        lts_until = state.get("lts_until")
+        with phase("insert_lts") as box:
+            if result is not None:
+                sql_lts, base_lts, cols_lts = build_insert(cur, "statistics", tgt_meta_id, now_iso, now_ts)
+                pts = output_points(result, out_key)
+                if lts_until is not None:
+                    pts = ((ts, v) for ts, v in pts if ts > lts_until)
+                lts_count = bulk_write(
+                    con, sql_lts, base_lts, cols_lts, pts,
+                    on_commit=lambda ts, k=out_key: checkpoint.update(k, lts_until=ts),
+                )
+            elif lts_until is None:
+                sel, params = sql_cumulative_select(OUTPUT_RULES[out_key], computed.output_seeds.get(out_key, 0))
+                with write_transaction(con):
+                    lts_count = insert_select(cur, "statistics", tgt_meta_id, now_iso, now_ts, sel, params)
+                checkpoint.update(out_key, lts_until=t_end)
+            else:
+                lts_count = 0
+            box["rows"] = lts_count
+
+        # Unit step 3: STS rows.
+        sts_count = 0
+        if have_sts and short_term_days > 0:
+            st_from = max(t_start, t_end - short_term_days * 86400)
+            sts_until = state.get("sts_until")
+            with phase("insert_sts") as box:
+                if result is not None:
+                    sql_sts, base_sts, cols_sts = build_insert(cur, "statistics_short_term", tgt_meta_id, now_iso, now_ts)
+                    ticks = short_term_points(output_points(result, out_key), st_from, t_end)
+                    if sts_until is not None:
+                        ticks = ((ts, v) for ts, v in ticks if ts > sts_until)
+                    sts_count = bulk_write(
+                        con, sql_sts, base_sts, cols_sts, ticks,
+                        on_commit=lambda ts, k=out_key: checkpoint.update(k, sts_until=ts),
+                    )
+                elif sts_until is None:
+                    sel, params = sql_short_term_select(tgt_meta_id, st_from, t_end)
+                    with write_transaction(con):
+                        sts_count = insert_select(cur, "statistics_short_term", tgt_meta_id, now_iso, now_ts, sel, params)
+                box["rows"] = sts_count
+
+        checkpoint.update(out_key, done=True)
+        # Fold the WAL back into the DB between outputs so it stays bounded.
+        with phase("wal_checkpoint"):
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        n = lts_count + sts_count
+        total_rows += n
+        print(
+            f"OUT {out_key}: deleted stats={ds} sts={dsts} meta={dm} | inserted LTS={lts_count} STS={sts_count}"
+            f" | {rows_per_sec(n, time.perf_counter() - t_out)} rows/s"
+        )
+
+    elapsed = time.perf_counter() - t_write
+    print(f"\nWrote {total_rows} rows in {elapsed:.1f}s ({rows_per_sec(total_rows, elapsed)} rows/s)")
+    return total_rows
+
+def patch_storage(storage_file: str, computed: ComputedRebuild) -> None:
+    storage_path = Path(storage_file)
+    obj = json.loads(storage_path.read_text(encoding="utf-8"))
+    if not isinstance(obj.get("data", {}).get("totals"), dict):
+        raise SystemExit("Storage file does not contain data.totals dict.")
+    # Written in the current format (integer Wh): a version 1 file is converted
+    # the way the integration would migrate it.
+    totals = stored_totals_wh(obj)
+    obj["version"] = STORAGE_VERSION
+
+    obj["data"]["last_processed"] = utc_iso(computed.t_end)
 
-def main():
+    for k, v in computed.storage_totals.items():
+        if k in totals:
+            totals[k] = int(v)
+
+    obj["data"]["totals"] = totals
+    storage_path.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    print("Storage patched:")
+    print("  last_processed =", obj["data"]["last_processed"])
+    for k in STORAGE_TOTAL_KEYS:
+        if k in totals:
+            print(f"  {k} = {energy.to_kwh(totals[k])} kWh")
+
+# =========================
+# Dry-run diff report
+# =========================
+@dataclass
+class OutputDiff:
+    changed: int = 0
+    added: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    first_divergent: float | None = None
+    old_final: float | None = None
+    new_final: float | None = None
+
+    @property
+    def differs(self) -> bool:
+        return bool(self.changed or self.added or self.removed)
+
+def diff_output(cur, meta_ids: list[int], points, since_ts: float | None = None,
+                tolerance: float = DIFF_TOLERANCE_DEFAULT) -> OutputDiff:
+    # Merge-join the existing rows (streamed in start_ts order) against the new points.
+    params = list(meta_ids)
+    since_sql = ""
+    if since_ts is not None:
+        since_sql = "AND start_ts >= ?"
+        params.append(float(since_ts))
+    cur.execute(
+        f"SELECT start_ts, sum FROM statistics WHERE metadata_id IN ({','.join(['?']*len(meta_ids))}) {since_sql} ORDER BY start_ts",
+        tuple(params),
+    )
+    old_it = ((float(r[0]), parse_num(r[1]) or 0.0) for r in cur)
+    new_it = iter(points)
+    d = OutputDiff()
+    o = next(old_it, None)
+    n = next(new_it, None)
+    while o is not None or n is not None:
+        if n is None or (o is not None and o[0] < n[0]):
+            d.removed += 1
+            ts = o[0]
+            d.old_final = o[1]
+            o = next(old_it, None)
+        elif o is None or n[0] < o[0]:
+            d.added += 1
+            ts = n[0]
+            d.new_final = n[1]
+            n = next(new_it, None)
+        else:
+            ts = n[0]
+            d.old_final, d.new_final = o[1], n[1]
+            if abs(o[1] - n[1]) > tolerance:
+                d.changed += 1
+            else:
+                d.unchanged += 1
+                ts = None
+            o = next(old_it, None)
+            n = next(new_it, None)
+        if ts is not None and d.first_divergent is None:
+            d.first_divergent = ts
+    return d
+
+def report_dry_run(con, outputs: dict, computed: ComputedRebuild, storage_file: str,
+                   since_ts: float | None = None, tolerance: float = DIFF_TOLERANCE_DEFAULT) -> bool:
+    cur = con.cursor()
+    cur.row_factory = None
+    any_diff = False
+
+    print("\nDry run: statistics that would change\n")
+    print(f"{'OUTPUT':<26}{'CHANGED':>9}{'ADDED':>8}{'REMOVED':>9}  {'FIRST DIVERGENT HOUR':<27}{'FINAL SUM DELTA':>16}")
+    for out_key, out_stat_id in outputs.items():
+        meta_ids = resolve_meta_ids(cur, out_stat_id)
+        d = diff_output(cur, meta_ids, output_points(computed.result, out_key), since_ts, tolerance)
+        any_diff = any_diff or d.differs
+        first = utc_iso(d.first_divergent) if d.first_divergent is not None else "-"
+        delta = (d.new_final or 0.0) - (d.old_final or 0.0)
+        print(f"{out_key:<26}{d.changed:>9}{d.added:>8}{d.removed:>9}  {first:<27}{delta:>+16.3f}")
+
+    print("\nDry run: storage totals that would change\n")
+    obj = json.loads(Path(storage_file).read_text(encoding="utf-8"))
+    data = obj.get("data", {})
+    totals = stored_totals_wh(obj)
+    new_lp = utc_iso(computed.t_end)
+    print(f"  last_processed: {data.get('last_processed')} -> {new_lp}")
+    for k, v in computed.storage_totals.items():
+        if k not in totals:
+            continue
+        old = energy.to_kwh(totals[k])
+        new = energy.to_kwh(v)
+        delta = new - old
+        if abs(delta) > tolerance:
+            any_diff = True
+        print(f"  {k:<26} {old:>14.3f} -> {new:>14.3f}  ({delta:+.3f})")
+
+    print("")
+    if any_diff:
+        print("Differences found: a rebuild would change the data above.")
+    else:
+        print("No meaningful differences: a rebuild is not needed.")
+    return any_diff
+
+# =========================
+# Command line
+# =========================
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Rebuild NIBE energy conversion statistics and storage totals.")
+    ap.add_argument(
+        "--since", type=parse_since, default=None, metavar="ISO_TIME",
+        help="incremental rebuild: keep statistics before this hour (UTC unless an offset is given) "
+             "and rewrite only from it onward, seeded with the existing cumulative sum",
+    )
+    ap.add_argument(
+        "--engine", choices=("python", "sql"), default="python",
+        help="python: load and compute in this process; sql: compose and cumulate inside SQLite "
+             "(low-RAM hosts)",
+    )
+    ap.add_argument(
+        "--precompute", action="store_true",
+        help="read a snapshot and compute while Core is still running, then stop Core only to apply",
+    )
+    ap.add_argument(
+        "--dry-run", action="store_true",
+        help="compute everything, report what would change against the current statistics and storage, "
+             "write nothing and leave Core running",
+    )
+    ap.add_argument(
+        "--tolerance", type=float, default=DIFF_TOLERANCE_DEFAULT, metavar="KWH",
+        help=f"dry run: smallest cumulative difference counted as a change (default {DIFF_TOLERANCE_DEFAULT})",
+    )
+    args = ap.parse_args(argv)
+    if args.precompute and args.engine == "sql":
+        ap.error("--precompute needs --engine python (the sql engine computes inside the live DB)")
+    if args.dry_run and args.engine == "sql":
+        ap.error("--dry-run needs --engine python")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
     print("\n=== Home Assistant Statistics Rebuilder Wizard (English) ===\n")
+    if args.since is not None:
+        print(f"Incremental mode: rebuilding from {utc_iso(args.since)}\n")
+    if args.precompute:
+        print("Precompute mode: reading and computing while Core is running; Core is stopped only to apply.\n")
 
     db_path = ask_str("Database path", DEFAULT_DB_PATH)
     if not os.path.isfile(db_path):
@@ -285,8 +1318,7 @@ def main():
         print(".storage directory not found.")
         storage_dir = ask_path_until_exists("Enter full path to the .storage directory: ", must_be_file=False)
 
-    con = sqlite3.connect(db_path)
-    con.row_factory = sqlite3.Row
+    con = connect_db(db_path, readonly=args.precompute or args.dry_run)
     cur = con.cursor()
 
     meta_cols = table_cols(cur, "statistics_meta")
@@ -341,212 +1373,56 @@ def main():
             break
         print("OK, not starting yet. I will ask again.")
 
-    # Step 5: Stop Core confirmation
-    print("\nStep 5/7: Stop Home Assistant Core\n")
-    while True:
-        if ask_yes_no("Stop Home Assistant Core now (ha core stop)?"):
-            break
-        print("Cannot proceed safely without stopping Core. I will ask again.")
-
-    # Stop Core
-    run_cmd(["ha", "core", "stop"])
-    print("Home Assistant Core stopped.\n")
+    if args.dry_run:
+        print("\nLoading source long-term statistics (hourly)...\n")
+        computed = compute_rebuild(con, inputs, outputs, stats_cols, since_ts=args.since, engine=args.engine)
+        with read_snapshot(con):
+            report_dry_run(con, outputs, computed, storage_file, since_ts=args.since, tolerance=args.tolerance)
+        con.close()
+        print("\nDry run complete: nothing was written and Core was not stopped.")
+        return
 
-    # Step 6: Backups (DB + chosen storage file; optional whole .storage)
-    print("Step 6/7: Create backups\n")
-    db_bak = backup_file(db_path)
-    storage_bak = backup_file(storage_file)
-    print(f"DB backup created:       {db_bak}")
-    print(f"Storage backup created:  {storage_bak}")
-
-    if ask_yes_no("Also backup the entire .storage directory? (can be large)"):
-        storage_dir_bak = backup_dir(storage_dir)
-        print(f".storage directory backup created: {storage_dir_bak}")
-    print("")
-
-    # Settings
-    short_term_days = ask_int("Short-term (5-min) backfill window in days", SHORT_TERM_DAYS_DEFAULT)
-    unit = ask_str("Unit of measurement", UNIT_DEFAULT)
-    source_tag = ask_str("statistics_meta.source tag", SOURCE_TAG_DEFAULT)
+    if not args.precompute:
+        stop_core_and_backup(db_path, storage_file, storage_dir)
+    short_term_days, unit, source_tag = ask_settings()
 
     # Load sources from LTS
     print("\nLoading source long-term statistics (hourly)...\n")
-    sel = ["start_ts"]
-    if "mean" in stats_cols: sel.append("mean")
-    if "state" in stats_cols: sel.append("state")
-    if "sum" in stats_cols: sel.append("sum")
-
-    src_points = {}
-    all_ts = set()
-
-    for in_key, stat_id in inputs.items():
-        cur.execute("SELECT id FROM statistics_meta WHERE statistic_id = ? LIMIT 1", (stat_id,))
-        m = cur.fetchone()
-        if not m:
-            raise SystemExit(f"Unexpected: source disappeared from statistics_meta: {stat_id}")
-        mid = int(m["id"])
-
-        cur.execute(f"""
-            SELECT {",".join(sel)}
-            FROM statistics
-            WHERE metadata_id = ?
-            ORDER BY start_ts ASC
-        """, (mid,))
-        rows = cur.fetchall()
-
-        d = {}
-        for r in rows:
-            ts = parse_num(r["start_ts"])
-            v = value_from_stats_row(r)
-            if ts is None or v is None:
-                continue
-            if v < 0:
-                continue
-            ts = float(ts)
-            d[ts] = float(v)
-            all_ts.add(ts)
-
-        if len(d) < 2:
-            raise SystemExit(f"Not enough usable points for input '{in_key}' ({stat_id}).")
-        src_points[in_key] = d
-        print(f"Loaded {len(d)} points for {in_key}")
-
-    timeline = sorted(all_ts)
-    t_start, t_end = timeline[0], timeline[-1]
-    print(f"\nTimeline hours: {len(timeline)} | {utc_iso(t_start)} .. {utc_iso(t_end)}\n")
-
-    def getv(in_key, ts):
-        return src_points.get(in_key, {}).get(ts, 0.0)
-
-    # Compute hourly per rules
-    out_hourly = {stat_id: {} for stat_id in outputs.values()}
-
-    for ts in timeline:
-        prod_cooling = getv("prod_cooling", ts)
-        prod_heating = getv("prod_heating", ts)
-        prod_hot_water = getv("prod_hot_water", ts)
-
-        aux_heat = getv("aux_heat", ts)
-        aux_hot_water = getv("aux_hot_water", ts)
-
-        used_cooling = getv("used_cooling", ts)
-        used_heating = getv("used_heating", ts)
-        used_hot_water = getv("used_hot_water", ts)
-
-        out_hourly[outputs["dohrev_topeni"]][ts] = aux_heat
-        out_hourly[outputs["dohrev_tuv"]][ts] = aux_hot_water
-
-        out_hourly[outputs["spotreba_chlazeni"]][ts] = used_cooling
-        out_hourly[outputs["spotreba_topeni"]][ts] = used_heating + aux_heat
-        out_hourly[outputs["spotreba_tuv"]][ts] = used_hot_water + aux_hot_water
-        out_hourly[outputs["spotreba_energie_celkem"]][ts] = used_cooling + used_heating + used_hot_water + aux_heat + aux_hot_water
-
-        out_hourly[outputs["vyrobeno_chlazeni"]][ts] = prod_cooling
-        out_hourly[outputs["vyrobeno_topeni"]][ts] = prod_heating
-        out_hourly[outputs["vyrobeno_tuv"]][ts] = prod_hot_water
-        out_hourly[outputs["vyrobena_energie_celkem"]][ts] = prod_cooling + prod_heating + prod_hot_water
-
-    # Cumulative points
-    out_points = {}
-    last_cum = {}
-    for stat_id, hourly_map in out_hourly.items():
-        cum = 0.0
-        pts = []
-        for ts in timeline:
-            h = float(hourly_map.get(ts, 0.0))
-            if h < 0:
-                h = 0.0
-            cum += h
-            pts.append((ts, cum))
-        out_points[stat_id] = pts
-        last_cum[stat_id] = cum
-
-    # Raw cumulatives WITHOUT aux for storage used_* totals
-    raw_used_heating_cum = 0.0
-    raw_used_hot_water_cum = 0.0
-    for ts in timeline:
-        raw_used_heating_cum += max(0.0, getv("used_heating", ts))
-        raw_used_hot_water_cum += max(0.0, getv("used_hot_water", ts))
+    computed = compute_rebuild(con, inputs, outputs, stats_cols, since_ts=args.since, engine=args.engine)
+    if args.precompute:
+        # Core is stopped inside this call; only the tail check and the writes remain after it.
+        con.close()
+        t_stopped = stop_core_and_backup(db_path, storage_file, storage_dir, online_backup=True)
+        con = connect_db(db_path)
+        n_tail = extend_with_tail(con, inputs, stats_cols, computed)
+        if n_tail:
+            print(f"Folded in {n_tail} source hour(s) recorded after the precompute snapshot.")
+
+    checkpoint = open_checkpoint(
+        db_path, checkpoint_signature(inputs, outputs, computed, args.since, short_term_days, unit, source_tag),
+    )
 
     # Rebuild outputs in DB
     print("\nRebuilding output statistics in DB...\n")
-    now_ts = datetime.now(tz=timezone.utc).timestamp()
-    now_iso = utc_iso(now_ts)
-
-    for out_key, out_stat_id in outputs.items():
-        ds, dsts, dm = delete_all_for_statistic_id(cur, out_stat_id, have_sts)
-        tgt_meta_id = create_meta(cur, meta_cols, out_stat_id, unit, source_tag, out_stat_id)
-
-        sql_lts, base_lts, cols_lts = build_insert(cur, "statistics", tgt_meta_id, now_iso, now_ts)
-        for ts, v in out_points[out_stat_id]:
-            insert_point(cur, sql_lts, base_lts, cols_lts, ts, v)
-
-        sts_count = 0
-        if have_sts and short_term_days > 0:
-            st_from = max(t_start, t_end - short_term_days * 86400)
-            pts2 = [(ts, v) for ts, v in out_points[out_stat_id] if ts >= st_from]
-            if pts2:
-                sql_sts, base_sts, cols_sts = build_insert(cur, "statistics_short_term", tgt_meta_id, now_iso, now_ts)
-                STEP = 300
-                t0 = floor_to(st_from, STEP)
-                t1 = floor_to(t_end, STEP)
-                i = 0
-                current_v = pts2[0][1]
-                for t_tick in range(t0, t1 + 1, STEP):
-                    while i < len(pts2) and pts2[i][0] <= t_tick:
-                        current_v = pts2[i][1]
-                        i += 1
-                    insert_point(cur, sql_sts, base_sts, cols_sts, t_tick, current_v)
-                    sts_count += 1
-
-        print(f"OUT {out_key}: deleted stats={ds} sts={dsts} meta={dm} | inserted LTS={len(out_points[out_stat_id])} STS={sts_count}")
-
-    con.commit()
+    write_outputs(
+        con, outputs, computed, meta_cols, have_sts, short_term_days, unit, source_tag,
+        since_ts=args.since, checkpoint=checkpoint,
+    )
 
     # Patch storage
     print("\nPatching storage file totals + last_processed...\n")
-    storage_path = Path(storage_file)
-    obj = json.loads(storage_path.read_text(encoding="utf-8"))
-    totals = obj.get("data", {}).get("totals", {})
-    if not isinstance(totals, dict):
-        raise SystemExit("Storage file does not contain data.totals dict.")
-
-    last_ts = timeline[-1]
-    obj["data"]["last_processed"] = utc_iso(last_ts)
-
-    mapping = {
-        "prod_cooling_total": outputs["vyrobeno_chlazeni"],
-        "prod_heating_total": outputs["vyrobeno_topeni"],
-        "prod_hot_water_total": outputs["vyrobeno_tuv"],
-        "used_cooling_total": outputs["spotreba_chlazeni"],
-        "aux_used_heating_total": outputs["dohrev_topeni"],
-        "aux_used_hot_water_total": outputs["dohrev_tuv"],
-    }
-
-    for k, out_stat_id in mapping.items():
-        if k in totals:
-            totals[k] = round(float(last_cum[out_stat_id]), 3)
-
-    if "used_heating_total" in totals:
-        totals["used_heating_total"] = round(float(raw_used_heating_cum), 3)
-    if "used_hot_water_total" in totals:
-        totals["used_hot_water_total"] = round(float(raw_used_hot_water_cum), 3)
-
-    obj["data"]["totals"] = totals
-    storage_path.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
-    print("Storage patched:")
-    print("  last_processed =", obj["data"]["last_processed"])
-    for k in STORAGE_TOTAL_KEYS:
-        if k in totals:
-            print(f"  {k} = {totals[k]}")
+    patch_storage(storage_file, computed)
+    checkpoint.remove()
 
     con.close()
 
     # Start Core
     print("\nStep 7/7: Start Home Assistant Core\n")
     run_cmd(["ha", "core", "start"])
-    print("Home Assistant Core started.\nDONE.")
+    print("Home Assistant Core started.")
+    if args.precompute:
+        print(f"Core downtime: {time.monotonic() - t_stopped:.1f}s")
+    print("DONE.")
 
 if __name__ == "__main__":
     try:
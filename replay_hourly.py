@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+import argparse
+import cProfile
+import csv
+import importlib
+import json
+import pstats
+import random
+import sqlite3
+import sys
+import time
+from array import array
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import rebuild_history_stats_and_storage as rebuild
+from generate_synthetic_recorder_db import hour_values
+
+energy = rebuild.energy
+const = importlib.import_module(f"{rebuild.KERNEL_PACKAGE}.const")
+rolling = importlib.import_module(f"{rebuild.KERNEL_PACKAGE}.rolling")
+
+# =========================
+# Defaults (edit if needed)
+# =========================
+UPDATE_MINUTE_DEFAULT = const.DEFAULT_UPDATE_MINUTE
+TIME_ZONE_DEFAULT = "UTC"
+STORE_SAVE_DELAY_S = const.STORAGE_SAVE_DELAY
+HOUR_S = rebuild.HOUR_S
+
+# Integration total key per rebuild input key (aux_heat -> aux_used_heating_total)
+TOTAL_OF_INPUT = {in_key: total_key for total_key, in_key in rebuild.STORAGE_TOTAL_SOURCES.items()}
+
+# =========================
+# Fake Home Assistant pieces
+# =========================
+class FakeClock:
+    def __init__(self, ts: float = 0.0):
+        self.ts = ts
+
+    def now(self) -> float:
+        return self.ts
+
+    def advance_to(self, ts: float) -> None:
+        self.ts = max(self.ts, ts)
+
+class MemoryStore:
+    # Stand-in for helpers.storage.Store: async_delay_save() re-arms the delay and
+    # keeps the newest data function; once the fake clock passes it, the data
+    # function runs (on the event loop in HA) and the data is serialized to JSON
+    # (in the executor in HA), which is timed separately.
+    def __init__(self, clock: FakeClock, version: int = const.STORAGE_VERSION):
+        self.clock = clock
+        self.version = version
+        self.text = None
+        self.saves = 0
+        self.bytes = 0
+        self.write_seconds = 0.0
+        self._data_func = None
+        self._due = None
+
+    def async_delay_save(self, data_func, delay: float) -> None:
+        self._data_func = data_func
+        self._due = self.clock.now() + delay
+
+    def flush_due(self) -> None:
+        if self._data_func is not None and self.clock.now() >= self._due:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._data_func is None:
+            return
+        data = self._data_func()
+        t0 = time.perf_counter()
+        self.text = json.dumps({"version": self.version, "data": data})
+        self.write_seconds += time.perf_counter() - t0
+        self.saves += 1
+        self.bytes += len(self.text)
+        self._data_func = None
+        self._due = None
+
+    def load(self) -> dict | None:
+        return json.loads(self.text)["data"] if self.text else None
+
+class ReplayCoordinator:
+    # The hourly path of NibeEnergyCoordinator.async_process_tick() on a fake
+    # clock: the last_processed guard, _apply_hour (totals, last-hour COP, the
+    # integration's own RollingCop and CalendarRollup), the rolling and period
+    # values derived per update, the sensor values, and the delayed save of the
+    # same payload as _data_to_store. Not replayed: HA's state machine and
+    # listeners, recorder catch-up and external statistics.
+    def __init__(self, clock: FakeClock, store: MemoryStore, time_zone):
+        self.clock = clock
+        self.store = store
+        self.time_zone = time_zone
+        self.totals = {k: 0 for k in energy.TOTAL_KEYS}
+        self.cops = {channel: 0.0 for channel in energy.COP_CHANNELS}
+        self.rolling = rolling.RollingCop()
+        self.periods = rolling.CalendarRollup()
+        self.rolling_cop = {}
+        self.period_values = {}
+        self.values = {}
+        self.last_processed = None
+        self.ticks = 0
+        self.skipped = 0
+
+    def process_tick(self, inputs: dict) -> None:
+        hour_end = self.clock.now() // HOUR_S * HOUR_S
+        if self.last_processed == hour_end:
+            self.skipped += 1
+            return
+        hour_end_dt = datetime.fromtimestamp(hour_end, tz=timezone.utc)
+        row = energy.cop_row(inputs)
+        self.rolling.add_hour(hour_end_dt, row, self.time_zone)
+        self.periods.add_hour(hour_end_dt, row, self.time_zone)
+        self.totals = energy.add_hour(self.totals, inputs)
+        self.cops = energy.cop_values(inputs)
+        self.last_processed = hour_end
+        self.rolling_cop = self.rolling.cop_values()
+        self.period_values = self.periods.values()
+        self.values = energy.output_values(self.totals)
+        self.ticks += 1
+        self.store.async_delay_save(self._data_to_store, STORE_SAVE_DELAY_S)
+
+    def _data_to_store(self) -> dict:
+        cops = self.cops
+        return {
+            "totals": self.totals,
+            "last_processed": rebuild.utc_iso(self.last_processed),
+            "last_cop": cops[const.COP_TOTAL],
+            "last_cop_total": cops[const.COP_TOTAL],
+            "last_cop_hot_water": cops[const.COP_HOT_WATER],
+            "last_cop_heating": cops[const.COP_HEATING],
+            "last_cop_cooling": cops[const.COP_COOLING],
+            "rolling": self.rolling.as_dict(),
+            "periods": self.periods.as_dict(),
+        }
+
+# =========================
+# Hourly input sources
+# =========================
+# All sources end up as rebuild.SourceSeries (columns keyed by rebuild input key),
+# which the batch engine of the rebuild script takes as well.
+def empty_series() -> rebuild.SourceSeries:
+    return rebuild.SourceSeries(
+        timeline=array("d"),
+        columns={in_key: array("d") for in_key in TOTAL_OF_INPUT},
+        counts={in_key: 0 for in_key in TOTAL_OF_INPUT},
+    )
+
+def parse_start(text: str) -> float:
+    value = rebuild.parse_num(text)
+    if value is not None:
+        return float(value)
+    dt = datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def series_from_csv(path: str) -> rebuild.SourceSeries:
+    # Columns: start (ISO time or epoch seconds) plus one column per input, named
+    # by rebuild input key (aux_heat) or integration total key. Rows are hourly.
+    in_key_of = {**{k: k for k in TOTAL_OF_INPUT}, **rebuild.STORAGE_TOTAL_SOURCES}
+    src = empty_series()
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = [name for name in reader.fieldnames or [] if name in in_key_of]
+        if "start" not in (reader.fieldnames or []) or not fields:
+            raise SystemExit("CSV needs a 'start' column and at least one input column.")
+        last_hour = None
+        for row in reader:
+            hour = rebuild.floor_to(parse_start(row["start"]), HOUR_S)
+            if hour != last_hour:
+                if last_hour is not None and hour < last_hour:
+                    raise SystemExit(f"CSV rows are not in time order at {row['start']}")
+                src.timeline.append(hour)
+                for col in src.columns.values():
+                    col.append(0.0)
+                last_hour = hour
+            for name in fields:
+                v = rebuild.parse_num(row[name])
+                if v is None or v < 0:
+                    continue
+                in_key = in_key_of[name]
+                src.columns[in_key][-1] = v
+                src.counts[in_key] += 1
+    if not src.timeline:
+        raise SystemExit("No rows in CSV.")
+    return src
+
+def series_from_db(db_path: str, inputs: dict) -> rebuild.SourceSeries:
+    con = rebuild.connect_db(db_path, readonly=True)
+    try:
+        rebuild.tune_for_read(con)
+        return rebuild.load_sources(con, inputs, rebuild.table_cols(con.cursor(), "statistics"), min_points=1)
+    finally:
+        con.close()
+
+def series_synthetic(years: float, seed: int) -> rebuild.SourceSeries:
+    rnd = random.Random(seed)
+    n_hours = int(years * 365.25 * 24)
+    end_ts = int(datetime.now(tz=timezone.utc).timestamp()) // HOUR_S * HOUR_S - HOUR_S
+    t0 = end_ts - (n_hours - 1) * HOUR_S
+    src = empty_series()
+    for h in range(n_hours):
+        ts = t0 + h * HOUR_S
+        src.timeline.append(ts)
+        for in_key, v in hour_values(ts, rnd).items():
+            src.columns[in_key].append(v)
+            src.counts[in_key] += 1
+    return src
+
+# =========================
+# Replay
+# =========================
+@dataclass
+class ReplayResult:
+    hours: int
+    ticks: int
+    skipped: int
+    store_saves: int
+    store_bytes: int
+    seconds: float
+    store_write_seconds: float
+    hours_per_s: float
+    us_per_tick: float
+    totals: dict
+    outputs: dict
+
+def hour_rows(src: rebuild.SourceSeries):
+    keys = [(TOTAL_OF_INPUT[in_key], col) for in_key, col in src.columns.items()]
+    for i, ts in enumerate(src.timeline):
+        yield ts, {total_key: col[i] for total_key, col in keys}
+
+def replay(src: rebuild.SourceSeries, update_minute: int = UPDATE_MINUTE_DEFAULT, profile: bool = False,
+           time_zone=timezone.utc) -> ReplayResult:
+    # Rows are materialized first so only the tick path is timed.
+    rows = list(hour_rows(src))
+    clock = FakeClock(rows[0][0] if rows else 0.0)
+    store = MemoryStore(clock)
+    coordinator = ReplayCoordinator(clock, store, time_zone)
+    offset = update_minute * 60
+
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    t0 = time.perf_counter()
+    for start_ts, inputs in rows:
+        # The tick for hour end K runs at K + update_minute and adds the values
+        # recorded at K; the save of the previous tick is due well before that.
+        clock.advance_to(start_ts + offset)
+        store.flush_due()
+        coordinator.process_tick(inputs)
+    store.flush()
+    # The JSON write runs in the executor in HA; the tick path is the rest.
+    elapsed = time.perf_counter() - t0 - store.write_seconds
+    if profiler:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+    stored = store.load() or {}
+    totals = stored.get("totals", coordinator.totals)
+    return ReplayResult(
+        hours=len(rows),
+        ticks=coordinator.ticks,
+        skipped=coordinator.skipped,
+        store_saves=store.saves,
+        store_bytes=store.bytes,
+        seconds=elapsed,
+        store_write_seconds=store.write_seconds,
+        hours_per_s=len(rows) / elapsed if elapsed > 0 else 0.0,
+        us_per_tick=elapsed / len(rows) * 1e6 if rows else 0.0,
+        totals=totals,
+        outputs=energy.output_values(totals),
+    )
+
+# =========================
+# Comparison with the rebuild script
+# =========================
+def compare_with_rebuild(src: rebuild.SourceSeries, result: ReplayResult) -> list[dict]:
+    # Final value and largest hourly difference per output, replay (the per-hour
+    # kernel of the integration) vs the script's batch engine. Both count integer
+    # Wh, so any difference is a bug rather than rounding.
+    batch = rebuild.compute_outputs(src)
+    cum_by_out = {
+        out_key: [energy.to_kwh(v) for v in batch.cumulative[out_key].tolist()] for out_key in rebuild.OUTPUT_RULES
+    }
+    drift = {out_key: (0.0, None) for out_key in rebuild.OUTPUT_RULES}
+    totals = {k: 0 for k in energy.TOTAL_KEYS}
+    for i, (ts, inputs) in enumerate(hour_rows(src)):
+        totals = energy.add_hour(totals, inputs)
+        values = energy.output_values(totals)
+        for out_key, sensor_key in rebuild.OUTPUT_SENSORS.items():
+            d = abs(values[sensor_key] - cum_by_out[out_key][i])
+            if d > drift[out_key][0]:
+                drift[out_key] = (d, ts)
+
+    report = []
+    for out_key, sensor_key in rebuild.OUTPUT_SENSORS.items():
+        max_diff, at = drift[out_key]
+        report.append({
+            "output": out_key,
+            "sensor": sensor_key,
+            "replay": result.outputs[sensor_key],
+            "rebuild": batch.final[out_key],
+            "diff": result.outputs[sensor_key] - batch.final[out_key],
+            "max_hourly_diff": max_diff,
+            "max_at": rebuild.utc_iso(at) if at is not None else None,
+        })
+    return report
+
+def compare_with_storage(storage_file: str, result: ReplayResult) -> list[dict]:
+    # Reported in kWh; the totals themselves are Wh on both sides.
+    obj = json.loads(Path(storage_file).read_text(encoding="utf-8"))
+    stored = rebuild.stored_totals_wh(obj)
+    replayed = {k: result.totals.get(k, 0) for k in energy.TOTAL_KEYS}
+    return [
+        {"total": k, "replay": energy.to_kwh(replayed[k]),
+         "storage": energy.to_kwh(stored[k]) if k in stored else None,
+         "diff": energy.to_kwh(replayed[k] - stored[k]) if k in stored else None}
+        for k in energy.TOTAL_KEYS
+    ]
+
+def print_result(result: ReplayResult, label: str) -> None:
+    print(f"\n=== Replay: {label} ===\n")
+    print(f"Hours:        {result.hours} (ticks {result.ticks}, skipped {result.skipped})")
+    if result.store_saves:
+        print(f"Store saves:  {result.store_saves} ({result.store_bytes / result.store_saves:.0f} bytes each, "
+              f"{result.store_write_seconds / result.store_saves * 1e6:.2f} us JSON write each)")
+    print(f"Tick path:    {result.seconds:.3f}s | {result.hours_per_s:,.0f} hours/s | {result.us_per_tick:.2f} us/tick")
+    print("\nTotals:")
+    for k, v in result.outputs.items():
+        print(f"  {k:<28}{v:>16.3f}")
+
+def print_rebuild_report(report: list[dict], tolerance: float) -> bool:
+    print(f"\n{'OUTPUT':<26}{'REPLAY':>16}{'REBUILD':>16}{'DIFF':>12}{'MAX HOURLY':>12}  AT")
+    ok = True
+    for r in report:
+        ok = ok and abs(r["diff"]) <= tolerance
+        print(f"{r['output']:<26}{r['replay']:>16.3f}{r['rebuild']:>16.3f}{r['diff']:>12.6f}"
+              f"{r['max_hourly_diff']:>12.6f}  {r['max_at'] or '-'}")
+    return ok
+
+def print_storage_report(report: list[dict], tolerance: float) -> bool:
+    print(f"\n{'TOTAL':<28}{'REPLAY':>16}{'STORAGE':>16}{'DIFF':>12}")
+    ok = True
+    for r in report:
+        if r["storage"] is None:
+            print(f"{r['total']:<28}{r['replay']:>16.3f}{'-':>16}{'-':>12}")
+            continue
+        ok = ok and abs(r["diff"]) <= tolerance
+        print(f"{r['total']:<28}{r['replay']:>16.3f}{r['storage']:>16.3f}{r['diff']:>12.6f}")
+    return ok
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Replay hourly input rows through the integration's tick logic without Home Assistant.",
+    )
+    src_group = ap.add_mutually_exclusive_group(required=True)
+    src_group.add_argument("--csv", help="CSV with a 'start' column and one column per input")
+    src_group.add_argument("--db", help="recorder DB to read the input statistics from (opened read-only)")
+    src_group.add_argument("--generate-years", type=float, metavar="N", help="replay N years of synthetic hours")
+    ap.add_argument("--input", action="append", default=[], metavar="KEY=STATISTIC_ID",
+                    help="override a default input statistic_id for --db")
+    ap.add_argument("--seed", type=int, default=1, help="random seed for --generate-years")
+    ap.add_argument("--update-minute", type=int, default=UPDATE_MINUTE_DEFAULT)
+    ap.add_argument("--time-zone", default=TIME_ZONE_DEFAULT,
+                    help="HA time zone for the local days of the rolling and period sums (e.g. Europe/Prague)")
+    ap.add_argument("--compare", action="store_true", help="compare with the rebuild script's batch engine")
+    ap.add_argument("--storage-file", help="compare the replayed totals with this storage file")
+    ap.add_argument("--tolerance", type=float, default=rebuild.DIFF_TOLERANCE_DEFAULT,
+                    help="largest final difference (kWh) still accepted; exit status 1 above it")
+    ap.add_argument("--profile", action="store_true", help="profile the replay loop")
+    ap.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    args = ap.parse_args(argv)
+
+    try:
+        time_zone = ZoneInfo(args.time_zone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise SystemExit(f"Unknown time zone: {args.time_zone}")
+
+    t0 = time.perf_counter()
+    if args.csv:
+        src, label = series_from_csv(args.csv), f"csv={args.csv}"
+    elif args.db:
+        inputs = dict(rebuild.DEFAULT_INPUTS)
+        for item in args.input:
+            key, _, stat_id = item.partition("=")
+            if key not in inputs or not stat_id:
+                raise SystemExit(f"Bad --input {item!r}; keys: {', '.join(inputs)}")
+            inputs[key] = stat_id
+        try:
+            src, label = series_from_db(args.db, inputs), f"db={args.db}"
+        except sqlite3.Error as err:
+            raise SystemExit(f"Cannot read {args.db}: {err}")
+    else:
+        src, label = series_synthetic(args.generate_years, args.seed), f"synthetic years={args.generate_years}"
+    print(f"Loaded {len(src.timeline)} hours in {time.perf_counter() - t0:.2f}s")
+
+    result = replay(src, args.update_minute, profile=args.profile, time_zone=time_zone)
+    print_result(result, label)
+
+    ok = True
+    out = {"label": label, "replay": asdict(result)}
+    if args.compare:
+        report = compare_with_rebuild(src, result)
+        ok = print_rebuild_report(report, args.tolerance) and ok
+        out["rebuild"] = report
+    if args.storage_file:
+        report = compare_with_storage(args.storage_file, result)
+        ok = print_storage_report(report, args.tolerance) and ok
+        out["storage"] = report
+    if args.json:
+        Path(args.json).write_text(json.dumps(out, indent=2) + "\n", encoding="utf-8")
+    if not ok:
+        print(f"\nDifferences above {args.tolerance} kWh.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import rebuild_history_stats_and_storage as rebuild
+
+energy = rebuild.energy
+verify = importlib.import_module(f"{rebuild.KERNEL_PACKAGE}.verify")
+
+# =========================
+# Defaults (edit if needed)
+# =========================
+HOUR_S = rebuild.HOUR_S
+DAY_S = 24 * HOUR_S
+CHECK_RUN_DAYS = 30
+
+# Day signatures and results kept next to the DB between runs
+STATE_SUFFIX = ".verify_state.json"
+
+# Storage total -> the output holding its statistics
+OUTPUT_OF_TOTAL = {
+    sensor_key: out_key
+    for out_key, sensor_key in rebuild.OUTPUT_SENSORS.items()
+    if sensor_key in rebuild.STORAGE_TOTAL_SOURCES
+}
+
+# =========================
+# Day signatures
+# =========================
+# Computed inside SQLite from the (metadata_id, start_ts) index: row count, value
+# total and an hour-weighted total per UTC day. Outputs use the spread of the
+# cumulative sum within the day, so a rebuilt earlier day does not change later ones.
+def utc_day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
+
+def day_start(day: str) -> int:
+    return int(datetime.combine(date.fromisoformat(day), datetime.min.time(), timezone.utc).timestamp())
+
+def is_next_day(day: str, other: str) -> bool:
+    return date.fromisoformat(other) - date.fromisoformat(day) == timedelta(days=1)
+
+def value_expr(stats_cols) -> str:
+    cols = [c for c in ("mean", "state", "sum") if c in stats_cols]
+    return f"COALESCE({', '.join(cols)})" if len(cols) > 1 else cols[0]
+
+def day_signatures(cur, input_mids: list[int], output_mids: list[int], stats_cols) -> dict:
+    ids = [("in", mid) for mid in input_mids] + [("out", mid) for mid in output_mids]
+    by_day = {}
+    queries = (
+        ("in", input_mids, f"""
+            SELECT metadata_id, CAST(start_ts / {DAY_S} AS INTEGER), COUNT(*), TOTAL(v),
+                   TOTAL(v * ((start_ts % {DAY_S}) / {HOUR_S} + 1))
+            FROM (SELECT metadata_id, start_ts, {value_expr(stats_cols)} AS v FROM statistics
+                  WHERE metadata_id IN ({','.join(['?'] * len(input_mids))}))
+            GROUP BY 1, 2
+        """),
+        ("out", output_mids, f"""
+            SELECT metadata_id, CAST(start_ts / {DAY_S} AS INTEGER), COUNT(*), MAX(sum) - MIN(sum),
+                   TOTAL(sum * ((start_ts % {DAY_S}) / {HOUR_S} + 1))
+                   - MIN(sum) * TOTAL((start_ts % {DAY_S}) / {HOUR_S} + 1)
+            FROM statistics
+            WHERE metadata_id IN ({','.join(['?'] * len(output_mids))}) AND sum IS NOT NULL
+            GROUP BY 1, 2
+        """),
+    )
+    for kind, mids, sql in queries:
+        cur.execute(sql, tuple(mids))
+        for mid, day_index, *values in cur.fetchall():
+            day = utc_day(day_index * DAY_S)
+            by_day.setdefault(day, {})[(kind, mid)] = verify.signature(values)
+    return {day: [sigs.get(key) for key in ids] for day, sigs in by_day.items()}
+
+# =========================
+# Hourly comparison
+# =========================
+def output_sums(cur, mid: int, since_ts: float, until_ts: float, column: str = "sum") -> dict:
+    cur.execute(
+        f"SELECT start_ts, {column} FROM statistics WHERE metadata_id = ? AND start_ts >= ? AND start_ts < ? "
+        f"AND {column} IS NOT NULL ORDER BY start_ts",
+        (mid, float(since_ts), float(until_ts)),
+    )
+    return {rebuild.floor_to(ts, HOUR_S): float(v) for ts, v in cur.fetchall()}
+
+def check_days(con, inputs: dict, output_mids: dict, stats_cols, days: list, tolerance: float) -> dict:
+    # First divergent hour per day for one run of consecutive days; the rebuild
+    # script writes the row of input hour K at K.
+    start = day_start(days[0])
+    end = day_start(days[-1]) + DAY_S
+    src = rebuild.load_sources(con, inputs, stats_cols, since_ts=start, until_ts=end, min_points=0)
+    by_day = {}
+    for i, ts in enumerate(src.timeline):
+        by_day.setdefault(utc_day(ts), []).append((int(ts), {in_key: col[i] for in_key, col in src.columns.items()}))
+    cur = con.cursor()
+    recorded = {out_key: output_sums(cur, mid, start - HOUR_S, end) for out_key, mid in output_mids.items()}
+    parts_by_key = {out_key: rebuild.OUTPUT_RULES[out_key] for out_key in output_mids}
+
+    results = {}
+    for day in days:
+        before = day_start(day) - HOUR_S
+        divergence = verify.first_divergence(
+            by_day.get(day, []), recorded, {key: rows.get(before) for key, rows in recorded.items()},
+            parts_by_key, tolerance,
+        )
+        if divergence is not None:
+            divergence["hour"] = rebuild.utc_iso(divergence["hour"])
+        results[day] = divergence
+    return results
+
+# =========================
+# Storage check
+# =========================
+def check_storage(con, inputs: dict, output_mids: dict, stats_cols, storage_file: str, tolerance: float) -> list:
+    # Stored totals against the last output state at or before last_processed,
+    # plus the input hours between the two.
+    with open(storage_file, "r", encoding="utf-8") as f:
+        obj = json.load(f)
+    data = obj.get("data", {})
+    stored_totals = rebuild.stored_totals_wh(obj)
+    processed = data.get("last_processed")
+    if not processed:
+        return []
+    last = rebuild.floor_to(datetime.fromisoformat(processed).timestamp(), HOUR_S)
+    cur = con.cursor()
+    latest = {}
+    for total_key, out_key in OUTPUT_OF_TOTAL.items():
+        if out_key not in output_mids:
+            continue
+        cur.execute(
+            "SELECT start_ts, state FROM statistics WHERE metadata_id = ? AND start_ts <= ? AND state IS NOT NULL "
+            "ORDER BY start_ts DESC LIMIT 1",
+            (output_mids[out_key], float(last)),
+        )
+        row = cur.fetchone()
+        if row is not None:
+            latest[total_key] = (rebuild.floor_to(row[0], HOUR_S), energy.to_wh(float(row[1])))
+    if not latest:
+        return []
+
+    first = min(row_hour for row_hour, _ in latest.values()) + HOUR_S
+    src = rebuild.load_sources(con, inputs, stats_cols, since_ts=first, until_ts=last + HOUR_S, min_points=0)
+    missing = (last + HOUR_S - first) // HOUR_S - len(src.timeline)
+    # In Wh, the unit the integration accumulates in.
+    results = []
+    for total_key, (row_hour, state) in latest.items():
+        in_key = rebuild.STORAGE_TOTAL_SOURCES[total_key]
+        expected = state
+        for i, ts in enumerate(src.timeline):
+            if ts > row_hour:
+                expected += energy.to_wh(src.columns[in_key][i])
+        stored = stored_totals.get(total_key, 0)
+        delta = energy.to_kwh(stored - expected)
+        results.append({
+            "key": total_key,
+            "store": energy.to_kwh(stored),
+            "expected": energy.to_kwh(expected),
+            "delta": delta,
+            "recorded_hour": rebuild.utc_iso(row_hour),
+            "missing_hours": missing,
+            "diverged": missing == 0 and abs(delta) > tolerance,
+        })
+    return results
+
+# =========================
+# Verify
+# =========================
+def load_state(path: str, config: dict) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if state.get("version") != verify.VERIFY_STATE_VERSION or state.get("config") != config:
+        print("Inputs, outputs or state format changed: checking every day.")
+        return {}
+    return state
+
+def save_state(path: str, state: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def run_verify(con, inputs: dict, outputs: dict, state_path: str, full: bool, tolerance: float) -> dict:
+    cur = con.cursor()
+    stats_cols = rebuild.table_cols(cur, "statistics")
+    input_mids = sorted(rebuild.resolve_input_meta_ids(cur, inputs))
+    missing = [out_key for out_key, stat_id in outputs.items() if not rebuild.statistic_id_exists(cur, stat_id)]
+    for out_key in missing:
+        print(f"No statistics for output '{out_key}' ({outputs[out_key]}); skipped.")
+    output_mids = {}
+    present = {out_key: stat_id for out_key, stat_id in outputs.items() if out_key not in missing}
+    for mid, out_keys in (rebuild.resolve_input_meta_ids(cur, present) if present else {}).items():
+        for out_key in out_keys:
+            output_mids[out_key] = mid
+
+    config = {"inputs": inputs, "outputs": outputs}
+    state = load_state(state_path, config)
+    days = state.get("days", {})
+
+    t0 = time.perf_counter()
+    with rebuild.read_snapshot(con):
+        signatures = day_signatures(cur, input_mids, sorted(set(output_mids.values())), stats_cols)
+    t_sig = time.perf_counter() - t0
+    check = verify.days_to_check(signatures, days, full)
+    for run in verify.day_ranges(check, is_next_day, CHECK_RUN_DAYS):
+        with rebuild.read_snapshot(con):
+            results = check_days(con, inputs, output_mids, stats_cols, run, tolerance)
+        for day in run:
+            days[day] = {"sig": signatures[day], "diverged": results[day]}
+    days = {day: days[day] for day in sorted(signatures) if day in days}
+    save_state(state_path, {"version": verify.VERIFY_STATE_VERSION, "config": config, "days": days})
+
+    diverged = [day for day, result in days.items() if result["diverged"]]
+    return {
+        "days": len(days),
+        "checked_days": len(check),
+        "divergent_days": len(diverged),
+        "first_divergence": days[diverged[0]]["diverged"] if diverged else None,
+        "signature_seconds": round(t_sig, 3),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "output_mids": output_mids,
+    }
+
+# =========================
+# Command line
+# =========================
+def parse_overrides(items: list, defaults: dict, flag: str) -> dict:
+    values = dict(defaults)
+    for item in items:
+        key, _, stat_id = item.partition("=")
+        if key not in values or not stat_id:
+            raise SystemExit(f"Bad {flag} {item!r}; keys: {', '.join(values)}")
+        values[key] = stat_id
+    return values
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Check the output statistics (and optionally the storage totals) against the input "
+                    "statistics. Only days whose per-day checksum changed since the last run are compared.",
+    )
+    ap.add_argument("--db", default=rebuild.DEFAULT_DB_PATH, help="recorder DB (opened read-only)")
+    ap.add_argument("--storage-file", help="also check the totals of this integration storage file")
+    ap.add_argument("--state", help=f"day checksum file (default: the DB path + {STATE_SUFFIX})")
+    ap.add_argument("--input", action="append", default=[], metavar="KEY=STATISTIC_ID",
+                    help="override a default input statistic_id")
+    ap.add_argument("--output", action="append", default=[], metavar="KEY=STATISTIC_ID",
+                    help="override a default output statistic_id")
+    ap.add_argument("--full", action="store_true", help="compare every day, not only the changed ones")
+    ap.add_argument("--tolerance", type=float, default=verify.VERIFY_TOLERANCE, metavar="KWH",
+                    help=f"largest hourly difference counted as equal (default {verify.VERIFY_TOLERANCE})")
+    ap.add_argument("--json", metavar="PATH", help="write the report as JSON")
+    args = ap.parse_args(argv)
+    if not os.path.isfile(args.db):
+        raise SystemExit(f"DB file not found: {args.db}")
+
+    inputs = parse_overrides(args.input, rebuild.DEFAULT_INPUTS, "--input")
+    outputs = parse_overrides(args.output, rebuild.DEFAULT_OUTPUTS, "--output")
+    con = rebuild.connect_db(args.db, readonly=True)
+    con.row_factory = None
+    rebuild.tune_for_read(con)
+    try:
+        report = run_verify(con, inputs, outputs, args.state or args.db + STATE_SUFFIX, args.full, args.tolerance)
+        output_mids = report.pop("output_mids")
+        if args.storage_file:
+            with rebuild.read_snapshot(con):
+                report["store"] = check_storage(
+                    con, inputs, output_mids, rebuild.table_cols(con.cursor(), "statistics"),
+                    args.storage_file, args.tolerance,
+                )
+    finally:
+        con.close()
+
+    print(f"Days: {report['days']}, compared hour by hour: {report['checked_days']} "
+          f"(checksums {report['signature_seconds']:.2f}s, total {report['seconds']:.2f}s)")
+    first = report["first_divergence"]
+    if first:
+        print(f"Divergent days: {report['divergent_days']}; first at {first['hour']}: {first['key']} "
+              f"expected {first['expected']:.3f} kWh, recorded {first['recorded']:.3f} kWh ({first['delta']:+.3f})")
+    else:
+        print("Output statistics match the inputs.")
+    store_bad = [item for item in report.get("store", []) if item["diverged"]]
+    for item in report.get("store", []):
+        flag = "DIFF" if item["diverged"] else "ok"
+        print(f"  store {item['key']:<28} {item['store']:>14.3f} expected {item['expected']:>14.3f} "
+              f"({item['delta']:+.3f}) {flag}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if first or store_bad:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nCancelled by user.")
+        sys.exit(1)